@@ -5,12 +5,18 @@ Returns: HTTP response with created item or error
 """
 import json
 import os
+import hashlib
 import psycopg2
 import jwt
 from psycopg2.extras import RealDictCursor
+from shared.write_helpers import (
+    purge_expired_idempotency_keys, claim_idempotency_key, save_idempotent_response, idempotent_replay_response,
+    normalize_photo_urls
+)
 
 JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-change-in-production')
 SCHEMA = 't_p8942561_contractor_control_s'
+IDEMPOTENCY_SCOPE = 'create-data'
 
 def verify_jwt_token(token):
     try:
@@ -29,7 +35,7 @@ def handler(event, context):
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-User-Id, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -68,7 +74,8 @@ def handler(event, context):
                 'body': json.dumps({'success': False, 'error': f'Invalid token: {str(e)}'})
             }
         
-        body = json.loads(event.get('body', '{}'))
+        raw_body = event.get('body') or '{}'
+        body = json.loads(raw_body)
         item_type = body.get('type', '').lower()
         data = body.get('data', {})
         
@@ -81,11 +88,31 @@ def handler(event, context):
                 'body': json.dumps({'success': False, 'error': 'Type and data required'})
             }
         
+        idempotency_key = headers.get('Idempotency-Key') or headers.get('idempotency-key')
+        if idempotency_key and len(idempotency_key) > 255:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'success': False, 'error': 'Idempotency-Key is too long'})
+            }
+        
         dsn = os.environ.get('DATABASE_URL')
         conn = psycopg2.connect(dsn)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         try:
+            if idempotency_key:
+                purge_expired_idempotency_keys(cur)
+                conn.commit()
+                
+                request_hash = hashlib.sha256(raw_body.encode('utf-8')).hexdigest()
+                stored = claim_idempotency_key(cur, IDEMPOTENCY_SCOPE, idempotency_key, user_id_int, request_hash)
+                if stored:
+                    conn.rollback()
+                    cur.close()
+                    conn.close()
+                    return idempotent_replay_response(stored, request_hash, {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'})
+            
             if item_type == 'project':
                 title = data.get('title', '').replace("'", "''")
                 description = data.get('description', '').replace("'", "''")
@@ -97,7 +124,6 @@ def handler(event, context):
                     RETURNING id, title, description, status, created_at
                 """)
                 result = cur.fetchone()
-                conn.commit()
                 
             elif item_type == 'object':
                 title = data.get('title', '').replace("'", "''")
@@ -116,7 +142,6 @@ def handler(event, context):
                         RETURNING id
                     """)
                     project_row = cur.fetchone()
-                    conn.commit()
                 
                 project_id = project_row['id']
                 
@@ -139,7 +164,6 @@ def handler(event, context):
                     RETURNING id, title, address, description, status, client_id, created_at, updated_at
                 """)
                 result = cur.fetchone()
-                conn.commit()
                 
             elif item_type == 'work':
                 object_id = int(data.get('object_id', 0))
@@ -174,15 +198,13 @@ def handler(event, context):
                     RETURNING id, title, description, object_id, contractor_id, status, planned_start_date, planned_end_date, completion_percentage
                 """)
                 result = cur.fetchone()
-                conn.commit()
                 
             elif item_type == 'work_log':
                 work_id = int(data.get('work_id', 0))
                 description = data.get('description', '').replace("'", "''")
                 volume = data.get('volume', '').replace("'", "''") if data.get('volume') else None
                 materials = data.get('materials', '').replace("'", "''") if data.get('materials') else None
-                photo_urls_raw = data.get('photo_urls', '')
-                photo_urls = photo_urls_raw.replace("'", "''") if photo_urls_raw else None
+                photo_urls = normalize_photo_urls(data.get('photo_urls'))
                 is_work_start = data.get('is_work_start', False)
                 inspection_id = data.get('inspection_id')
                 defects_count = data.get('defects_count')
@@ -201,8 +223,9 @@ def handler(event, context):
                     values.append(f"'{materials}'")
                 
                 if photo_urls:
+                    photo_urls_json = json.dumps(photo_urls, ensure_ascii=False).replace("'", "''")
                     fields.append('photo_urls')
-                    values.append(f"'{photo_urls}'")
+                    values.append(f"'{photo_urls_json}'::jsonb")
                 
                 if is_work_start:
                     fields.append('is_work_start')
@@ -229,7 +252,6 @@ def handler(event, context):
                     RETURNING id, work_id, description, volume, materials, photo_urls, created_at, created_by
                 """)
                 result = cur.fetchone()
-                conn.commit()
                 
             elif item_type == 'inspection':
                 work_id = int(data.get('work_id', 0))
@@ -263,20 +285,20 @@ def handler(event, context):
                     RETURNING id, work_id, inspection_number, type, status, scheduled_date, created_by, created_at
                 """)
                 result = cur.fetchone()
-                conn.commit()
                 
             elif item_type == 'chat_message':
                 work_id = int(data.get('work_id', 0))
                 message = data.get('message', '').replace("'", "''")
                 message_type = data.get('message_type', 'text')
-                photo_urls = data.get('photo_urls', '').replace("'", "''") if data.get('photo_urls') else None
+                photo_urls = normalize_photo_urls(data.get('photo_urls'))
                 
                 fields = ['work_id', 'message', 'message_type', 'created_by', 'created_at']
                 values = [str(work_id), f"'{message}'", f"'{message_type}'", str(user_id_int), 'NOW()']
                 
                 if photo_urls:
+                    photo_urls_json = json.dumps(photo_urls, ensure_ascii=False).replace("'", "''")
                     fields.append('photo_urls')
-                    values.append(f"'{photo_urls}'")
+                    values.append(f"'{photo_urls_json}'::jsonb")
                 
                 fields_str = ', '.join(fields)
                 values_str = ', '.join(values)
@@ -287,7 +309,6 @@ def handler(event, context):
                     RETURNING id, work_id, message, message_type, photo_urls, created_at, created_by
                 """)
                 result = cur.fetchone()
-                conn.commit()
                 
             else:
                 cur.close()
@@ -305,13 +326,20 @@ def handler(event, context):
                 if hasattr(value, 'isoformat'):
                     result_dict[key] = value.isoformat()
             
+            response_body = json.dumps({'success': True, 'data': result_dict})
+            
+            # Ответ сохраняется в той же транзакции, что и сами записи
+            if idempotency_key:
+                save_idempotent_response(cur, IDEMPOTENCY_SCOPE, idempotency_key, user_id_int, 201, response_body)
+            
+            conn.commit()
             cur.close()
             conn.close()
             
             return {
                 'statusCode': 201,
                 'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                'body': json.dumps({'success': True, 'data': result_dict})
+                'body': response_body
             }
             
         except Exception as e:
@@ -0,0 +1,260 @@
+'''
+Business: Аналитика дефектов по подрядчикам, объектам, работам и критичности за неделю или месяц
+Args: event with httpMethod GET (headers X-Auth-Token, queryStringParameters groupBy, period, from, to,
+      objectId, contractorId, workId, severity) или POST ?action=refresh (по таймеру, X-Worker-Token)
+Returns: JSON со строками отчёта (количество дефектов, устранений, среднее и перцентили времени) и refreshedAt
+'''
+
+import json
+import os
+import time
+import psycopg2
+import jwt
+from datetime import date, timedelta
+from typing import Dict, Any, Optional
+from psycopg2.extras import RealDictCursor
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-change-in-production')
+SCHEMA = 't_p8942561_contractor_control_s'
+ANALYTICS_VIEWS = ('defect_analytics_rollup', 'defect_remediation_facts')
+ANALYTICS_PERIODS = ('week', 'month')
+# Глубина отчёта по умолчанию, в периодах
+ANALYTICS_DEFAULT_SPAN = {'week': 12, 'month': 12}
+CRITICAL_SEVERITY = 'Критический'
+
+# Колонка представлений и подпись группы для каждого разреза
+GROUPINGS = {
+    'contractor': ('contractor_id', f"(SELECT name FROM {SCHEMA}.contractors WHERE id::text = g.key)"),
+    'object': ('object_id', f"(SELECT title FROM {SCHEMA}.objects WHERE id::text = g.key)"),
+    'work': ('work_id', f"(SELECT title FROM {SCHEMA}.works WHERE id::text = g.key)"),
+    'severity': ('severity', "NULLIF(g.key, '')"),
+}
+
+def get_db_connection():
+    conn = psycopg2.connect(DATABASE_URL)
+    return conn
+
+def verify_jwt_token(token: str) -> Dict[str, Any]:
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        raise ValueError('Token expired')
+    except jwt.InvalidTokenError:
+        raise ValueError('Invalid token')
+
+def json_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(body, ensure_ascii=False, default=str)
+    }
+
+def scope_sql(cur, role: str, user_id: int) -> Optional[str]:
+    '''
+    Условие на строки представлений: админ видит всё, заказчик - свои объекты,
+    подрядчик - свои работы. None - пользователю не видно ничего.
+    '''
+    if role == 'admin':
+        return 'TRUE'
+    if role == 'contractor':
+        cur.execute(f"SELECT id FROM {SCHEMA}.contractors WHERE user_id = {int(user_id)}")
+        contractor = cur.fetchone()
+        if not contractor:
+            return None
+        return f"contractor_id = {int(contractor['id'])}"
+    return f"client_id = {int(user_id)}"
+
+def refresh_views(conn) -> Dict[str, int]:
+    '''
+    REFRESH ... CONCURRENTLY не блокирует чтение отчётов на время пересчёта.
+    Каждое представление коммитится отдельно, чтобы сбой второго не откатывал первое.
+    '''
+    durations = {}
+    with conn.cursor() as cur:
+        for view in ANALYTICS_VIEWS:
+            started = time.monotonic()
+            cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {SCHEMA}.{view}")
+            duration_ms = int((time.monotonic() - started) * 1000)
+            cur.execute(f"""
+                INSERT INTO {SCHEMA}.analytics_refreshes (view_name, refreshed_at, duration_ms)
+                VALUES ('{view}', NOW(), {duration_ms})
+                ON CONFLICT (view_name) DO UPDATE
+                SET refreshed_at = EXCLUDED.refreshed_at, duration_ms = EXCLUDED.duration_ms
+            """)
+            conn.commit()
+            durations[view] = duration_ms
+    return durations
+
+def build_report_sql(group_by: str, period: str, filters: str, date_from: date, date_to: date) -> str:
+    '''
+    Найденные дефекты суммируются из defect_analytics_rollup, устранения и их длительности
+    считаются по defect_remediation_facts; обе части соединяются по (группа, начало периода).
+    '''
+    column, label_sql = GROUPINGS[group_by]
+    return f"""
+        WITH found AS (
+            SELECT {column}::text AS key, period_start,
+                   SUM(defects_found) AS defects_found,
+                   COALESCE(SUM(defects_found) FILTER (WHERE severity = '{CRITICAL_SEVERITY}'), 0) AS critical_defects
+            FROM {SCHEMA}.defect_analytics_rollup
+            WHERE period = '{period}' AND {filters}
+              AND period_start >= date_trunc('{period}', '{date_from.isoformat()}'::date)::date
+              AND period_start < '{date_to.isoformat()}'::date
+            GROUP BY 1, 2
+        ),
+        remediated AS (
+            SELECT {column}::text AS key, date_trunc('{period}', created_at)::date AS period_start,
+                   COUNT(*) AS remediations,
+                   COUNT(*) FILTER (WHERE hours_to_complete IS NOT NULL) AS completed,
+                   COUNT(*) FILTER (WHERE hours_to_verify IS NOT NULL) AS verified,
+                   AVG(hours_to_complete) AS avg_hours_to_complete,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY hours_to_complete) AS p50_hours_to_complete,
+                   percentile_cont(0.9) WITHIN GROUP (ORDER BY hours_to_complete) AS p90_hours_to_complete,
+                   AVG(hours_to_verify) AS avg_hours_to_verify,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY hours_to_verify) AS p50_hours_to_verify,
+                   percentile_cont(0.9) WITHIN GROUP (ORDER BY hours_to_verify) AS p90_hours_to_verify
+            FROM {SCHEMA}.defect_remediation_facts
+            WHERE {filters}
+              AND created_at >= date_trunc('{period}', '{date_from.isoformat()}'::date)
+              AND created_at < '{date_to.isoformat()}'::date
+            GROUP BY 1, 2
+        ),
+        g AS (
+            SELECT COALESCE(f.key, r.key) AS key, COALESCE(f.period_start, r.period_start) AS period_start,
+                   COALESCE(f.defects_found, 0) AS defects_found, COALESCE(f.critical_defects, 0) AS critical_defects,
+                   COALESCE(r.remediations, 0) AS remediations, COALESCE(r.completed, 0) AS completed,
+                   COALESCE(r.verified, 0) AS verified,
+                   r.avg_hours_to_complete, r.p50_hours_to_complete, r.p90_hours_to_complete,
+                   r.avg_hours_to_verify, r.p50_hours_to_verify, r.p90_hours_to_verify
+            FROM found f
+            FULL JOIN remediated r ON f.key = r.key AND f.period_start = r.period_start
+        )
+        SELECT g.*, {label_sql} AS label
+        FROM g
+        ORDER BY g.period_start DESC, g.defects_found DESC, g.key
+    """
+
+def round_hours(value: Any) -> Optional[float]:
+    return round(float(value), 1) if value is not None else None
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Worker-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    headers = event.get('headers', {}) or {}
+    params = event.get('queryStringParameters', {}) or {}
+
+    if method == 'POST':
+        if params.get('action') != 'refresh':
+            return json_response(400, {'error': 'Unknown action'})
+        worker_token = os.environ.get('ANALYTICS_WORKER_TOKEN')
+        if not worker_token or (headers.get('X-Worker-Token') or headers.get('x-worker-token')) != worker_token:
+            return json_response(401, {'error': 'Unauthorized'})
+        conn = get_db_connection()
+        try:
+            return json_response(200, {'success': True, 'durationsMs': refresh_views(conn)})
+        finally:
+            conn.close()
+
+    if method != 'GET':
+        return json_response(405, {'error': 'Method not allowed'})
+
+    auth_header = headers.get('X-Auth-Token') or headers.get('x-auth-token')
+    if not auth_header:
+        return json_response(401, {'error': 'No token provided'})
+
+    try:
+        payload = verify_jwt_token(auth_header)
+        user_id = int(payload['user_id'])
+    except ValueError as e:
+        return json_response(401, {'error': str(e)})
+    except Exception:
+        return json_response(401, {'error': 'Invalid token'})
+
+    group_by = params.get('groupBy', 'contractor')
+    period = params.get('period', 'month')
+    if group_by not in GROUPINGS:
+        return json_response(400, {'error': f"groupBy must be one of: {', '.join(GROUPINGS)}"})
+    if period not in ANALYTICS_PERIODS:
+        return json_response(400, {'error': f"period must be one of: {', '.join(ANALYTICS_PERIODS)}"})
+
+    try:
+        date_to = date.fromisoformat(params['to']) + timedelta(days=1) if params.get('to') else date.today() + timedelta(days=1)
+        if params.get('from'):
+            date_from = date.fromisoformat(params['from'])
+        else:
+            span = ANALYTICS_DEFAULT_SPAN[period]
+            date_from = date_to - (timedelta(weeks=span) if period == 'week' else timedelta(days=31 * span))
+        id_filters = {
+            column: int(params[param])
+            for param, column in (('objectId', 'object_id'), ('contractorId', 'contractor_id'), ('workId', 'work_id'))
+            if params.get(param)
+        }
+    except ValueError:
+        return json_response(400, {'error': 'Invalid date or id filter'})
+
+    if date_from >= date_to:
+        return json_response(400, {'error': 'from must not be after to'})
+
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+
+        cur.execute(f"SELECT role, is_active FROM {SCHEMA}.users WHERE id = {user_id}")
+        user = cur.fetchone()
+        if not user or not user['is_active']:
+            return json_response(401, {'error': 'User not found or inactive'})
+
+        scope = scope_sql(cur, user['role'], user_id)
+        if scope is None:
+            return json_response(200, {'groupBy': group_by, 'period': period, 'rows': [], 'refreshedAt': None})
+
+        filters = [scope] + [f"{column} = {value}" for column, value in id_filters.items()]
+        if params.get('severity'):
+            severity_safe = params['severity'].replace("'", "''")
+            filters.append(f"severity = '{severity_safe}'")
+
+        cur.execute(build_report_sql(group_by, period, ' AND '.join(filters), date_from, date_to))
+        rows = cur.fetchall()
+
+        cur.execute(f"SELECT MIN(refreshed_at) AS refreshed_at FROM {SCHEMA}.analytics_refreshes")
+        refreshed = cur.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+
+    return json_response(200, {
+        'groupBy': group_by,
+        'period': period,
+        'from': date_from.isoformat(),
+        'to': (date_to - timedelta(days=1)).isoformat(),
+        'refreshedAt': refreshed['refreshed_at'].isoformat() if refreshed and refreshed['refreshed_at'] else None,
+        'rows': [{
+            'key': r['key'],
+            'label': r['label'],
+            'periodStart': r['period_start'].isoformat(),
+            'defectsFound': int(r['defects_found']),
+            'criticalDefects': int(r['critical_defects']),
+            'remediations': int(r['remediations']),
+            'completed': int(r['completed']),
+            'verified': int(r['verified']),
+            'avgHoursToComplete': round_hours(r['avg_hours_to_complete']),
+            'p50HoursToComplete': round_hours(r['p50_hours_to_complete']),
+            'p90HoursToComplete': round_hours(r['p90_hours_to_complete']),
+            'avgHoursToVerify': round_hours(r['avg_hours_to_verify']),
+            'p50HoursToVerify': round_hours(r['p50_hours_to_verify']),
+            'p90HoursToVerify': round_hours(r['p90_hours_to_verify'])
+        } for r in rows]
+    })
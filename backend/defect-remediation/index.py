@@ -1,22 +1,260 @@
 '''
 Business: Manage defect remediation by contractors
-Args: event with httpMethod, body, headers; context with request_id
+Args: event with httpMethod, body, headers, queryStringParameters (report_id or status, object_id, from, to, limit, cursor, count); context with request_id
 Returns: HTTP response with remediation data or error
 '''
 
 import json
 import os
-from datetime import datetime
-from typing import Dict, Any
+from datetime import datetime, date
+from typing import Dict, Any, Optional, Tuple
 import psycopg2
 
 SCHEMA = 't_p8942561_contractor_control_s'
+BULK_VERIFY_MAX_ITEMS = 500
+INBOX_PAGE_SIZE = 50
+INBOX_MAX_PAGE_SIZE = 200
+# Remediation status set by the client's verification action
+VERIFY_ACTIONS = {'verify': 'verified', 'reject': 'rejected'}
 
 def get_db_connection():
     conn = psycopg2.connect(os.environ['DATABASE_URL'])
     conn.set_session(autocommit=False)
     return conn
 
+def json_response(status_code: int, body: Any) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(body),
+        'isBase64Encoded': False
+    }
+
+def remediation_bucket_sql(column: str) -> str:
+    '''Counter bucket of a remediation status: completed, verified, everything else is pending'''
+    return f"CASE WHEN {column} = 'completed' THEN 'completed' WHEN {column} = 'verified' THEN 'verified' ELSE 'pending' END"
+
+def report_counters_sql(changes: str) -> str:
+    '''
+    UPDATE for a data-modifying CTE: applies status transitions from the CTE `changes`
+    (defect_report_id, old_status, new_status) to the report counters and derives the report status:
+    active - something is still open, remediated - everything awaits verification, closed - all verified.
+    '''
+    deltas = ',\n'.join(
+        f"SUM((CASE WHEN {remediation_bucket_sql('new_status')} = '{bucket}' THEN 1 ELSE 0 END)"
+        f" - (CASE WHEN {remediation_bucket_sql('old_status')} = '{bucket}' THEN 1 ELSE 0 END)) AS {bucket}"
+        for bucket in ('pending', 'completed', 'verified')
+    )
+    return f"""
+        UPDATE {SCHEMA}.defect_reports rep
+        SET pending_remediations = rep.pending_remediations + d.pending,
+            completed_remediations = rep.completed_remediations + d.completed,
+            verified_remediations = rep.verified_remediations + d.verified,
+            status = CASE
+                WHEN rep.pending_remediations + d.pending > 0 THEN 'active'
+                WHEN rep.completed_remediations + d.completed > 0 THEN 'remediated'
+                ELSE 'closed'
+            END
+        FROM (
+            SELECT defect_report_id, {deltas}
+            FROM {changes}
+            GROUP BY defect_report_id
+        ) d
+        WHERE rep.id = d.defect_report_id
+    """
+
+def verify_remediations_bulk(cur, conn, user_id: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Bulk verify/reject of completed remediations, selected by remediation_ids or a whole
+    defect_report_id. One set-based UPDATE; the parent report status is rolled up in the same transaction.
+    '''
+    new_status = VERIFY_ACTIONS.get(body.get('action'))
+    if not new_status:
+        return json_response(400, {'error': f"action must be one of: {', '.join(VERIFY_ACTIONS)}"})
+
+    remediation_ids = body.get('remediation_ids')
+    report_id = body.get('defect_report_id')
+    try:
+        if remediation_ids is not None:
+            if not isinstance(remediation_ids, list) or not remediation_ids:
+                raise ValueError
+            remediation_ids = sorted({int(rid) for rid in remediation_ids})
+            if len(remediation_ids) > BULK_VERIFY_MAX_ITEMS:
+                return json_response(400, {'error': f'Too many remediation_ids (max {BULK_VERIFY_MAX_ITEMS})'})
+            selector = f"r.id IN ({', '.join(str(rid) for rid in remediation_ids)})"
+        elif report_id is not None:
+            selector = f"r.defect_report_id = {int(report_id)}"
+        else:
+            return json_response(400, {'error': 'remediation_ids or defect_report_id is required'})
+    except (ValueError, TypeError):
+        return json_response(400, {'error': 'Invalid remediation_ids or defect_report_id'})
+
+    notes = body.get('verification_notes')
+    notes_sql = "'" + str(notes).replace("'", "''") + "'" if notes else 'NULL'
+
+    cur.execute(f"SELECT role FROM {SCHEMA}.users WHERE id = {int(user_id)}")
+    user = cur.fetchone()
+    if not user:
+        return json_response(401, {'error': 'Unauthorized'})
+    access_sql = 'TRUE' if user[0] == 'admin' else f"o.client_id = {int(user_id)}"
+
+    # Only completed remediations on the caller's objects are verified; the rest are reported as skipped
+    cur.execute(f"""
+        WITH target AS (
+            SELECT r.id, r.status AS old_status
+            FROM {SCHEMA}.defect_remediations r
+            JOIN {SCHEMA}.defect_reports rep ON r.defect_report_id = rep.id
+            JOIN {SCHEMA}.objects o ON rep.object_id = o.id
+            WHERE {selector} AND r.status = 'completed' AND {access_sql}
+            FOR UPDATE OF r
+        ),
+        updated AS (
+            UPDATE {SCHEMA}.defect_remediations r
+            SET status = '{new_status}', verified_by = {int(user_id)}, verified_at = CURRENT_TIMESTAMP,
+                verification_notes = {notes_sql}, updated_at = CURRENT_TIMESTAMP
+            FROM target
+            WHERE r.id = target.id
+            RETURNING r.id, r.defect_report_id, target.old_status, r.status AS new_status
+        ),
+        reports AS ({report_counters_sql('updated')})
+        SELECT id, defect_report_id FROM updated
+    """)
+    updated = cur.fetchall()
+
+    reports = []
+    if updated:
+        report_ids_sql = ', '.join(sorted({str(row[1]) for row in updated}))
+        cur.execute(f"""
+            SELECT id, status, pending_remediations, completed_remediations, verified_remediations
+            FROM {SCHEMA}.defect_reports
+            WHERE id IN ({report_ids_sql})
+        """)
+        reports = [{
+            'id': row[0],
+            'status': row[1],
+            'pending_remediations': row[2],
+            'completed_remediations': row[3],
+            'verified_remediations': row[4]
+        } for row in cur.fetchall()]
+    conn.commit()
+
+    updated_ids = sorted(row[0] for row in updated)
+    skipped = sorted(set(remediation_ids or []) - set(updated_ids))
+    return json_response(200, {
+        'success': True,
+        'status': new_status,
+        'updated': updated_ids,
+        'skipped': skipped,
+        'reports': reports
+    })
+
+def parse_inbox_cursor(cursor: Optional[str]) -> Tuple[Optional[datetime], Optional[int]]:
+    '''Inbox page cursor: "<created_at ISO>|<id>" of the last remediation on the previous page'''
+    if not cursor:
+        return None, None
+    created_at, _, remediation_id = cursor.rpartition('|')
+    return datetime.fromisoformat(created_at), int(remediation_id)
+
+def get_contractor_inbox(cur, contractor_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Contractor remediation inbox: status/object/date filters with keyset pagination on
+    (created_at, id), served by idx_defect_remediations_contractor_status_created.
+    count=1 returns only per-status counts for badges.
+    '''
+    try:
+        limit = max(1, min(int(params.get('limit', INBOX_PAGE_SIZE)), INBOX_MAX_PAGE_SIZE))
+        cursor_created_at, cursor_id = parse_inbox_cursor(params.get('cursor'))
+        object_id = int(params['object_id']) if params.get('object_id') else None
+        date_from = date.fromisoformat(params['from']) if params.get('from') else None
+        date_to = date.fromisoformat(params['to']) if params.get('to') else None
+    except ValueError:
+        return json_response(400, {'error': 'Invalid limit, cursor, object_id or date'})
+
+    filters = [f"dr.contractor_id = {int(contractor_id)}"]
+    statuses = [st.replace("'", "''") for st in (params.get('status') or '').split(',') if st]
+    if statuses:
+        filters.append('dr.status IN (' + ', '.join(f"'{st}'" for st in statuses) + ')')
+    if date_from:
+        filters.append(f"dr.created_at >= '{date_from.isoformat()}'::date")
+    if date_to:
+        filters.append(f"dr.created_at < '{date_to.isoformat()}'::date + 1")
+    if object_id is not None:
+        filters.append(f"rep.object_id = {object_id}")
+    report_join = f"JOIN {SCHEMA}.defect_reports rep ON dr.defect_report_id = rep.id" if object_id is not None else ''
+
+    if params.get('count') in ('1', 'true'):
+        cur.execute(f"""
+            SELECT dr.status, COUNT(*)
+            FROM {SCHEMA}.defect_remediations dr
+            {report_join}
+            WHERE {' AND '.join(filters)}
+            GROUP BY dr.status
+        """)
+        counts = {row[0]: row[1] for row in cur.fetchall()}
+        return json_response(200, {'counts': counts, 'total': sum(counts.values())})
+
+    if cursor_id is not None:
+        filters.append(f"(dr.created_at, dr.id) < ('{cursor_created_at.isoformat()}'::timestamp, {cursor_id})")
+
+    # Page rows are picked from the index first; reports, works and objects are joined only for them
+    cur.execute(f"""
+        WITH page AS (
+            SELECT dr.*
+            FROM {SCHEMA}.defect_remediations dr
+            {report_join}
+            WHERE {' AND '.join(filters)}
+            ORDER BY dr.created_at DESC, dr.id DESC
+            LIMIT {limit + 1}
+        )
+        SELECT dr.id, dr.defect_report_id, dr.defect_id, dr.contractor_id,
+               dr.status, dr.remediation_description, dr.remediation_photos,
+               dr.completed_at, dr.verified_at, dr.verified_by, dr.verification_notes,
+               dr.created_at, dr.updated_at,
+               rep.report_number,
+               rep.work_id,
+               w.title as work_title,
+               o.title as object_title,
+               v.name as verified_by_name,
+               rep.object_id
+        FROM page dr
+        JOIN {SCHEMA}.defect_reports rep ON dr.defect_report_id = rep.id
+        JOIN {SCHEMA}.works w ON rep.work_id = w.id
+        JOIN {SCHEMA}.objects o ON rep.object_id = o.id
+        LEFT JOIN {SCHEMA}.users v ON dr.verified_by = v.id
+        ORDER BY dr.created_at DESC, dr.id DESC
+    """)
+    rows = cur.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    remediations = [{
+        'id': row[0],
+        'defect_report_id': row[1],
+        'defect_id': row[2],
+        'contractor_id': row[3],
+        'status': row[4],
+        'remediation_description': row[5],
+        'remediation_photos': row[6],
+        'completed_at': row[7].isoformat() if row[7] else None,
+        'verified_at': row[8].isoformat() if row[8] else None,
+        'verified_by': row[9],
+        'verification_notes': row[10],
+        'created_at': row[11].isoformat() if row[11] else None,
+        'updated_at': row[12].isoformat() if row[12] else None,
+        'report_number': row[13],
+        'work_id': row[14],
+        'work_title': row[15],
+        'object_title': row[16],
+        'verified_by_name': row[17],
+        'object_id': row[18]
+    } for row in rows]
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = f"{rows[-1][11].isoformat()}|{rows[-1][0]}"
+
+    return json_response(200, {'remediations': remediations, 'nextCursor': next_cursor})
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -69,85 +307,55 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             # Get remediations for contractor or specific report
             params = event.get('queryStringParameters', {}) or {}
             report_id = params.get('report_id')
-            contractor_id = params.get('contractor_id', user_id)
-            
-            if report_id:
-                # Get all remediations for report
-                cur.execute(f"""
-                    SELECT dr.id, dr.defect_report_id, dr.defect_id, dr.contractor_id,
-                           dr.status, dr.remediation_description, dr.remediation_photos,
-                           dr.completed_at, dr.verified_at, dr.verified_by, dr.verification_notes,
-                           dr.created_at, dr.updated_at,
-                           u.name as contractor_name,
-                           v.name as verified_by_name
-                    FROM {SCHEMA}.defect_remediations dr
-                    LEFT JOIN {SCHEMA}.users u ON dr.contractor_id = u.id
-                    LEFT JOIN {SCHEMA}.users v ON dr.verified_by = v.id
-                    WHERE dr.defect_report_id = {report_id}
-                    ORDER BY dr.created_at
-                """)
-            else:
-                # Get remediations for contractor
-                cur.execute(f"""
-                    SELECT dr.id, dr.defect_report_id, dr.defect_id, dr.contractor_id,
-                           dr.status, dr.remediation_description, dr.remediation_photos,
-                           dr.completed_at, dr.verified_at, dr.verified_by, dr.verification_notes,
-                           dr.created_at, dr.updated_at,
-                           rep.report_number,
-                           rep.work_id,
-                           w.title as work_title,
-                           o.title as object_title,
-                           v.name as verified_by_name
-                    FROM {SCHEMA}.defect_remediations dr
-                    JOIN {SCHEMA}.defect_reports rep ON dr.defect_report_id = rep.id
-                    JOIN {SCHEMA}.works w ON rep.work_id = w.id
-                    JOIN {SCHEMA}.objects o ON rep.object_id = o.id
-                    LEFT JOIN {SCHEMA}.users v ON dr.verified_by = v.id
-                    WHERE dr.contractor_id = {contractor_id}
-                    ORDER BY dr.created_at DESC
-                """)
+            
+            if not report_id:
+                # The inbox belongs to the authenticated contractor; only admins may open someone else's
+                contractor_id = int(user_id)
+                requested_id = params.get('contractor_id')
+                if requested_id and not str(requested_id).isdigit():
+                    return json_response(400, {'error': 'Invalid contractor_id'})
+                if requested_id and int(requested_id) != contractor_id:
+                    cur.execute(f"SELECT role FROM {SCHEMA}.users WHERE id = {int(user_id)}")
+                    user = cur.fetchone()
+                    if not user or user[0] != 'admin':
+                        return json_response(403, {'error': 'Access denied'})
+                    contractor_id = int(requested_id)
+                return get_contractor_inbox(cur, contractor_id, params)
+            
+            # Get all remediations for report
+            cur.execute(f"""
+                SELECT dr.id, dr.defect_report_id, dr.defect_id, dr.contractor_id,
+                       dr.status, dr.remediation_description, dr.remediation_photos,
+                       dr.completed_at, dr.verified_at, dr.verified_by, dr.verification_notes,
+                       dr.created_at, dr.updated_at,
+                       u.name as contractor_name,
+                       v.name as verified_by_name
+                FROM {SCHEMA}.defect_remediations dr
+                LEFT JOIN {SCHEMA}.users u ON dr.contractor_id = u.id
+                LEFT JOIN {SCHEMA}.users v ON dr.verified_by = v.id
+                WHERE dr.defect_report_id = {report_id}
+                ORDER BY dr.created_at
+            """)
             
             remediations = []
             for row in cur.fetchall():
-                if report_id:
-                    remediations.append({
-                        'id': row[0],
-                        'defect_report_id': row[1],
-                        'defect_id': row[2],
-                        'contractor_id': row[3],
-                        'status': row[4],
-                        'remediation_description': row[5],
-                        'remediation_photos': row[6],
-                        'completed_at': row[7].isoformat() if row[7] else None,
-                        'verified_at': row[8].isoformat() if row[8] else None,
-                        'verified_by': row[9],
-                        'verification_notes': row[10],
-                        'created_at': row[11].isoformat() if row[11] else None,
-                        'updated_at': row[12].isoformat() if row[12] else None,
-                        'contractor_name': row[13],
-                        'verified_by_name': row[14]
-                    })
-                else:
-                    remediations.append({
-                        'id': row[0],
-                        'defect_report_id': row[1],
-                        'defect_id': row[2],
-                        'contractor_id': row[3],
-                        'status': row[4],
-                        'remediation_description': row[5],
-                        'remediation_photos': row[6],
-                        'completed_at': row[7].isoformat() if row[7] else None,
-                        'verified_at': row[8].isoformat() if row[8] else None,
-                        'verified_by': row[9],
-                        'verification_notes': row[10],
-                        'created_at': row[11].isoformat() if row[11] else None,
-                        'updated_at': row[12].isoformat() if row[12] else None,
-                        'report_number': row[13],
-                        'work_id': row[14],
-                        'work_title': row[15],
-                        'object_title': row[16],
-                        'verified_by_name': row[17]
-                    })
+                remediations.append({
+                    'id': row[0],
+                    'defect_report_id': row[1],
+                    'defect_id': row[2],
+                    'contractor_id': row[3],
+                    'status': row[4],
+                    'remediation_description': row[5],
+                    'remediation_photos': row[6],
+                    'completed_at': row[7].isoformat() if row[7] else None,
+                    'verified_at': row[8].isoformat() if row[8] else None,
+                    'verified_by': row[9],
+                    'verification_notes': row[10],
+                    'created_at': row[11].isoformat() if row[11] else None,
+                    'updated_at': row[12].isoformat() if row[12] else None,
+                    'contractor_name': row[13],
+                    'verified_by_name': row[14]
+                })
             
             return {
                 'statusCode': 200,
@@ -157,8 +365,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             }
         
         elif method == 'PUT':
-            # Update remediation status
             body_data = json.loads(event.get('body', '{}'))
+            
+            # Bulk verify/reject by the client: {action, remediation_ids | defect_report_id, verification_notes}
+            if 'action' in body_data:
+                return verify_remediations_bulk(cur, conn, int(user_id), body_data)
+            
+            # Update remediation status
             remediation_id = int(body_data.get('remediation_id', 0))
             status = body_data.get('status', '').replace("'", "''")
             description = body_data.get('remediation_description', '').replace("'", "''")
@@ -178,6 +391,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 update_parts.append(f"status = '{status}'")
                 if status == 'completed':
                     update_parts.append('completed_at = CURRENT_TIMESTAMP')
+                elif status in VERIFY_ACTIONS.values():
+                    notes = (body_data.get('verification_notes') or '').replace("'", "''")
+                    update_parts.append(f"verified_by = {int(user_id)}")
+                    update_parts.append('verified_at = CURRENT_TIMESTAMP')
+                    update_parts.append(f"verification_notes = '{notes}'" if notes else 'verification_notes = NULL')
             
             if description:
                 update_parts.append(f"remediation_description = '{description}'")
@@ -188,13 +406,28 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             update_sql = ', '.join(update_parts)
             
+            # The report counters move in the same statement, so the report status never lags behind
             cur.execute(f"""
-                UPDATE {SCHEMA}.defect_remediations
-                SET {update_sql}
-                WHERE id = {remediation_id}
-                RETURNING id, defect_report_id, defect_id, contractor_id, status,
-                          remediation_description, remediation_photos, completed_at,
-                          verified_at, verified_by, verification_notes, created_at, updated_at
+                WITH previous AS (
+                    SELECT id, status FROM {SCHEMA}.defect_remediations
+                    WHERE id = {remediation_id}
+                    FOR UPDATE
+                ),
+                updated AS (
+                    UPDATE {SCHEMA}.defect_remediations r
+                    SET {update_sql}
+                    FROM previous
+                    WHERE r.id = previous.id
+                    RETURNING r.id, r.defect_report_id, r.defect_id, r.contractor_id, r.status,
+                              r.remediation_description, r.remediation_photos, r.completed_at,
+                              r.verified_at, r.verified_by, r.verification_notes, r.created_at, r.updated_at,
+                              previous.status AS old_status, r.status AS new_status
+                ),
+                reports AS ({report_counters_sql('updated')})
+                SELECT id, defect_report_id, defect_id, contractor_id, status,
+                       remediation_description, remediation_photos, completed_at,
+                       verified_at, verified_by, verification_notes, created_at, updated_at
+                FROM updated
             """)
             
             row = cur.fetchone()
@@ -6,11 +6,16 @@ Returns: HTTP response with defect report data or error
 
 import json
 import os
+import hashlib
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import psycopg2
+from shared.write_helpers import (
+    purge_expired_idempotency_keys, claim_idempotency_key, save_idempotent_response, idempotent_replay_response
+)
 
 SCHEMA = 't_p8942561_contractor_control_s'
+IDEMPOTENCY_SCOPE = 'defect-reports'
 
 def get_db_connection():
     conn = psycopg2.connect(os.environ['DATABASE_URL'])
@@ -22,6 +27,14 @@ def generate_report_number(inspection_id: int, work_id: int) -> str:
     timestamp = datetime.now().strftime('%Y%m%d')
     return f"DR-{work_id}-{inspection_id}-{timestamp}"
 
+def enqueue_pdf_render(cur, entity_type: str, entity_id: int) -> None:
+    """Queue a PDF render for the pdf-render worker (no-op if one is already pending)"""
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.pdf_render_jobs (entity_type, entity_id)
+        VALUES ('{entity_type}', {int(entity_id)})
+        ON CONFLICT (entity_type, entity_id) WHERE status IN ('pending', 'processing') DO NOTHING
+    """)
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -32,7 +45,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-User-Id, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -79,11 +92,38 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            # Get inspection with defects
+            idempotency_key = headers.get('Idempotency-Key') or headers.get('idempotency-key')
+            if idempotency_key:
+                if len(idempotency_key) > 255:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'success': False, 'error': 'Idempotency-Key is too long'}),
+                        'isBase64Encoded': False
+                    }
+                
+                purge_expired_idempotency_keys(cur)
+                conn.commit()
+                
+                # Replay the stored report instead of creating duplicate report and remediations
+                request_hash = hashlib.sha256((event.get('body') or '{}').encode('utf-8')).hexdigest()
+                stored = claim_idempotency_key(cur, IDEMPOTENCY_SCOPE, idempotency_key, int(user_id), request_hash)
+                if stored:
+                    conn.rollback()
+                    return idempotent_replay_response(stored, request_hash, {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'})
+            
+            # Get inspection with its defects rows; the report keeps a frozen snapshot in report_data
             print(f"Fetching inspection data...")
             schema = SCHEMA
             cur.execute(f"""
-                SELECT i.id, i.work_id, i.inspection_number, i.created_by, i.created_at, i.defects,
+                SELECT i.id, i.work_id, i.inspection_number, i.created_by, i.created_at,
+                       (SELECT COALESCE(jsonb_agg(
+                                   df.extra || jsonb_strip_nulls(jsonb_build_object(
+                                       'id', df.defect_id, 'description', df.description, 'location', df.location,
+                                       'severity', df.severity, 'status', df.status, 'responsible', df.responsible,
+                                       'deadline', df.deadline, 'photo_urls', df.photo_urls))
+                                   ORDER BY df.position, df.id), '[]'::jsonb)::text
+                        FROM {schema}.defects df WHERE df.inspection_id = i.id),
                        w.object_id, w.title as work_title,
                        o.title as object_title, o.address
                 FROM {schema}.inspections i
@@ -151,17 +191,37 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             report_data_json = json.dumps(report_data, ensure_ascii=False).replace("'", "''")
             
-            # Create defect report
+            # Create defect report and its remediation rows in one statement:
+            # one pending remediation per defect, assigned to the work's contractor (if any).
+            # pending_remediations starts at the number of rows the second INSERT creates.
             print(f"Inserting defect report...")
             cur.execute(f"""
-                INSERT INTO {schema}.defect_reports 
-                (inspection_id, report_number, work_id, object_id, created_by, 
-                 status, total_defects, critical_defects, report_data, notes)
-                VALUES ({inspection_id}, '{report_number}', {inspection['work_id']}, 
-                        {inspection['object_id']}, {user_id}, 'active', {len(defects)}, 
-                        {critical_count}, '{report_data_json}'::jsonb, '{notes}')
-                RETURNING id, inspection_id, report_number, work_id, object_id, created_by, 
-                          created_at, status, total_defects, critical_defects
+                WITH report AS (
+                    INSERT INTO {schema}.defect_reports 
+                    (inspection_id, report_number, work_id, object_id, created_by, 
+                     status, total_defects, critical_defects, report_data, notes, pending_remediations)
+                    VALUES ({inspection_id}, '{report_number}', {inspection['work_id']}, 
+                            {inspection['object_id']}, {user_id}, 'active', {len(defects)}, 
+                            {critical_count}, '{report_data_json}'::jsonb, '{notes}',
+                            (SELECT CASE WHEN contractor_id IS NOT NULL THEN {len(defects)} ELSE 0 END
+                             FROM {schema}.works WHERE id = {inspection['work_id']}))
+                    RETURNING id, inspection_id, report_number, work_id, object_id, created_by, 
+                              created_at, status, total_defects, critical_defects, report_data
+                ),
+                remediations AS (
+                    INSERT INTO {schema}.defect_remediations
+                    (defect_report_id, defect_id, contractor_id, status)
+                    SELECT r.id, COALESCE(d->>'id', ''), w.contractor_id, 'pending'
+                    FROM report r
+                    JOIN {schema}.works w ON w.id = r.work_id
+                    CROSS JOIN jsonb_array_elements(r.report_data->'defects') d
+                    WHERE w.contractor_id IS NOT NULL
+                    RETURNING id
+                )
+                SELECT id, inspection_id, report_number, work_id, object_id, created_by, 
+                       created_at, status, total_defects, critical_defects,
+                       (SELECT COUNT(*) FROM remediations) AS remediations_created
+                FROM report
             """)
             
             report_row = cur.fetchone()
@@ -175,25 +235,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'created_at': report_row[6].isoformat() if report_row[6] else None,
                 'status': report_row[7],
                 'total_defects': report_row[8],
-                'critical_defects': report_row[9]
+                'critical_defects': report_row[9],
+                'remediations_created': report_row[10]
             }
             
-            # Get contractor for work
-            print(f"Fetching contractor...")
-            cur.execute(f"SELECT contractor_id FROM {schema}.works WHERE id = {inspection['work_id']}")
-            print(f"Contractor query executed")
-            contractor_row = cur.fetchone()
-            contractor_id = contractor_row[0] if contractor_row else None
+            # The printable PDF is rendered later by the pdf-render worker
+            enqueue_pdf_render(cur, 'defect_report', report['id'])
             
-            # Create remediation records for each defect
-            if contractor_id:
-                for defect in defects:
-                    defect_id = str(defect.get('id', '')).replace("'", "''")
-                    cur.execute(f"""
-                        INSERT INTO {schema}.defect_remediations
-                        (defect_report_id, defect_id, contractor_id, status)
-                        VALUES ({report['id']}, '{defect_id}', {contractor_id}, 'pending')
-                    """)
+            response_body = json.dumps({'success': True, 'data': report})
+            if idempotency_key:
+                save_idempotent_response(cur, IDEMPOTENCY_SCOPE, idempotency_key, int(user_id), 201, response_body)
             
             print(f"Committing transaction...")
             conn.commit()
@@ -202,7 +253,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 201,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True, 'data': report}),
+                'body': response_body,
                 'isBase64Encoded': False
             }
         
@@ -212,6 +263,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             report_id = params.get('id')
             work_id = params.get('work_id')
             inspection_id = params.get('inspection_id')
+            status_filter = params.get('status')
             
             if report_id:
                 schema = SCHEMA
@@ -219,7 +271,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     SELECT dr.id, dr.inspection_id, dr.report_number, dr.work_id, dr.object_id,
                            dr.created_by, dr.created_at, dr.status, dr.total_defects, dr.critical_defects,
                            dr.report_data, dr.pdf_url, dr.notes,
-                           u.name as author_name
+                           u.name as author_name,
+                           dr.pending_remediations, dr.completed_remediations, dr.verified_remediations
                     FROM {schema}.defect_reports dr
                     LEFT JOIN {schema}.users u ON dr.created_by = u.id
                     WHERE dr.id = {report_id}
@@ -248,7 +301,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'report_data': row[10],
                     'pdf_url': row[11],
                     'notes': row[12],
-                    'author_name': row[13]
+                    'author_name': row[13],
+                    'pending_remediations': row[14],
+                    'completed_remediations': row[15],
+                    'verified_remediations': row[16]
                 }
                 
                 return {
@@ -261,11 +317,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             elif work_id or inspection_id:
                 schema = SCHEMA
                 where_clause = f"dr.work_id = {work_id}" if work_id else f"dr.inspection_id = {inspection_id}"
+                # The status is maintained from remediation counters, so filtering needs no remediation scan
+                if status_filter:
+                    statuses = ', '.join("'" + st.replace("'", "''") + "'" for st in status_filter.split(',') if st)
+                    where_clause += f" AND dr.status IN ({statuses})"
                 
                 cur.execute(f"""
                     SELECT dr.id, dr.inspection_id, dr.report_number, dr.work_id, dr.object_id,
                            dr.created_by, dr.created_at, dr.status, dr.total_defects, dr.critical_defects,
-                           u.name as author_name
+                           u.name as author_name,
+                           dr.pending_remediations, dr.completed_remediations, dr.verified_remediations
                     FROM {schema}.defect_reports dr
                     LEFT JOIN {schema}.users u ON dr.created_by = u.id
                     WHERE {where_clause}
@@ -286,7 +347,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'status': row[7],
                         'total_defects': row[8],
                         'critical_defects': row[9],
-                        'author_name': row[10]
+                        'author_name': row[10],
+                        'pending_remediations': row[11],
+                        'completed_remediations': row[12],
+                        'verified_remediations': row[13]
                     })
                 
                 return {
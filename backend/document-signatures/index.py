@@ -13,6 +13,16 @@ from datetime import datetime
 
 DSN = os.environ.get('DATABASE_URL')
 SCHEMA = 't_p8942561_contractor_control_s'
+MAX_BATCH_SIGNATURES = 200
+INBOX_PAGE_SIZE = 50
+INBOX_MAX_PAGE_SIZE = 200
+
+def parse_inbox_cursor(cursor):
+    '''Курсор входящих подписей: "<created_at ISO>|<id>" последней подписи предыдущей страницы'''
+    if not cursor:
+        return None, None
+    created_at, _, signature_id = cursor.rpartition('|')
+    return datetime.fromisoformat(created_at), int(signature_id)
 
 def handler(event: dict, context: any) -> dict:
     method = event.get('httpMethod', 'GET')
@@ -99,22 +109,27 @@ def create_signature_request(cursor, conn, user_id: str, event: dict) -> dict:
     
     org_clause = f"{signer['organization_id']}" if signer and signer['organization_id'] else "NULL"
     
+    signature_type_safe = signature_type.replace("'", "''")
+    # Счётчик pending_signatures меняется тем же запросом, что и создаёт подпись
     cursor.execute(f"""
-        INSERT INTO {SCHEMA}.document_signatures
-        (document_id, signer_id, organization_id, signature_type, status)
-        VALUES ({document_id}, {signer_id}, {org_clause}, '{signature_type}', 'pending')
-        RETURNING id, document_id, signer_id, signature_type, status, created_at
+        WITH inserted AS (
+            INSERT INTO {SCHEMA}.document_signatures
+            (document_id, signer_id, organization_id, signature_type, status)
+            VALUES ({int(document_id)}, {int(signer_id)}, {org_clause}, '{signature_type_safe}', 'pending')
+            RETURNING id, document_id, signer_id, signature_type, status, created_at
+        ),
+        document_updated AS (
+            UPDATE {SCHEMA}.documents
+            SET status = 'pending_signature',
+                pending_signatures = pending_signatures + 1,
+                updated_at = NOW()
+            WHERE id = {int(document_id)}
+        )
+        SELECT * FROM inserted
     """)
     
     signature = cursor.fetchone()
     
-    cursor.execute(f"""
-        UPDATE {SCHEMA}.documents
-        SET status = 'pending_signature',
-            updated_at = '{datetime.now().isoformat()}'
-        WHERE id = {document_id}
-    """)
-    
     conn.commit()
     
     return {
@@ -124,125 +139,246 @@ def create_signature_request(cursor, conn, user_id: str, event: dict) -> dict:
         'body': json.dumps({'signature': dict(signature)}, default=str)
     }
 
+def json_response(status_code: int, body: dict) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': json.dumps(body, default=str)
+    }
+
+def process_signature_actions(cursor, user_id: int, items: list) -> list:
+    '''
+    Подписывает/отклоняет набор запросов на подпись в текущей транзакции.
+    Строки блокируются FOR UPDATE SKIP LOCKED: запрос, который сейчас обрабатывает
+    другой вызов, получает статус locked и не может быть обработан дважды.
+    Возвращает результат по каждому элементу в исходном порядке.
+    '''
+    results = [{'signature_id': item.get('signature_id'), 'status': 'invalid'} for item in items]
+    valid = {}
+    for index, item in enumerate(items):
+        try:
+            signature_id = int(item.get('signature_id'))
+        except (TypeError, ValueError):
+            continue
+        if item.get('action') not in ('sign', 'reject') or signature_id in valid:
+            continue
+        valid[signature_id] = index
+    
+    if not valid:
+        return results
+    
+    ids_sql = ', '.join(str(sid) for sid in valid)
+    cursor.execute(f"""
+        SELECT id, document_id, signer_id, status
+        FROM {SCHEMA}.document_signatures
+        WHERE id IN ({ids_sql})
+        FOR UPDATE SKIP LOCKED
+    """)
+    locked = {row['id']: row for row in cursor.fetchall()}
+    
+    if len(locked) < len(valid):
+        cursor.execute(f"SELECT id FROM {SCHEMA}.document_signatures WHERE id IN ({ids_sql})")
+        existing = {row['id'] for row in cursor.fetchall()}
+    else:
+        existing = set(locked)
+    
+    values = []
+    for signature_id, index in valid.items():
+        item = items[index]
+        row = locked.get(signature_id)
+        if signature_id not in existing:
+            results[index]['status'] = 'not_found'
+        elif row is None:
+            results[index]['status'] = 'locked'
+        elif row['signer_id'] != user_id:
+            results[index]['status'] = 'forbidden'
+        elif row['status'] != 'pending':
+            results[index]['status'] = 'already_processed'
+        else:
+            new_status = 'signed' if item['action'] == 'sign' else 'rejected'
+            data_safe = str(item.get('signature_data') or '').strip().replace("'", "''")
+            reason_safe = str(item.get('rejection_reason') or '').strip().replace("'", "''")
+            values.append(f"({signature_id}, '{new_status}', '{data_safe}', '{reason_safe}')")
+    
+    if not values:
+        return results
+    
+    # Подписи, счётчики и статусы документов обновляются одним запросом на весь пакет:
+    # документ с отклонением - rejected, при обнулении pending_signatures - signed.
+    # Счётчики считаются от текущего значения строки, поэтому параллельные пакеты их не теряют
+    cursor.execute(f"""
+        WITH actions AS (
+            SELECT * FROM (VALUES {', '.join(values)}) AS v(id, status, signature_data, rejection_reason)
+        ),
+        updated AS (
+            UPDATE {SCHEMA}.document_signatures s
+            SET status = a.status,
+                signature_data = CASE WHEN a.status = 'signed' THEN a.signature_data ELSE s.signature_data END,
+                signed_at = CASE WHEN a.status = 'signed' THEN NOW() ELSE s.signed_at END,
+                rejection_reason = CASE WHEN a.status = 'rejected' THEN a.rejection_reason ELSE s.rejection_reason END,
+                rejected_at = CASE WHEN a.status = 'rejected' THEN NOW() ELSE s.rejected_at END
+            FROM actions a
+            WHERE s.id = a.id
+            RETURNING s.*
+        ),
+        per_document AS (
+            SELECT document_id,
+                   COUNT(*) AS processed,
+                   COUNT(*) FILTER (WHERE status = 'signed') AS signed,
+                   COUNT(*) FILTER (WHERE status = 'rejected') AS rejected
+            FROM updated
+            GROUP BY document_id
+        ),
+        documents_updated AS (
+            UPDATE {SCHEMA}.documents d
+            SET pending_signatures = GREATEST(d.pending_signatures - p.processed, 0),
+                signed_signatures = d.signed_signatures + p.signed,
+                status = CASE
+                    WHEN p.rejected > 0 THEN 'rejected'
+                    WHEN d.pending_signatures - p.processed <= 0 THEN 'signed'
+                    ELSE d.status
+                END,
+                updated_at = NOW()
+            FROM per_document p
+            WHERE d.id = p.document_id
+            RETURNING d.id, d.status, d.pending_signatures, d.signed_signatures
+        ),
+        pdf_jobs AS (
+            INSERT INTO {SCHEMA}.pdf_render_jobs (entity_type, entity_id)
+            SELECT 'document', id FROM documents_updated WHERE status = 'signed'
+            ON CONFLICT (entity_type, entity_id) WHERE status IN ('pending', 'processing') DO NOTHING
+        )
+        SELECT u.*, du.status AS document_status,
+               du.pending_signatures AS document_pending_signatures,
+               du.signed_signatures AS document_signed_signatures
+        FROM updated u
+        LEFT JOIN documents_updated du ON du.id = u.document_id
+    """)
+    
+    for row in cursor.fetchall():
+        index = valid[row['id']]
+        document_status = row.pop('document_status')
+        pending_signatures = row.pop('document_pending_signatures')
+        signed_signatures = row.pop('document_signed_signatures')
+        results[index] = {
+            'signature_id': row['id'],
+            'status': row['status'],
+            'document_id': row['document_id'],
+            'document_status': document_status,
+            'pending_signatures': pending_signatures,
+            'signed_signatures': signed_signatures,
+            'signature': dict(row)
+        }
+    return results
+
 def sign_document(cursor, conn, user_id: str, event: dict) -> dict:
     body = json.loads(event.get('body', '{}'))
     
+    if 'items' in body:
+        return sign_documents_batch(cursor, conn, user_id, body)
+    
     signature_id = body.get('signature_id')
     action = body.get('action', '').strip()
-    signature_data = body.get('signature_data', '').strip()
-    rejection_reason = body.get('rejection_reason', '').strip()
     
     if not signature_id or action not in ['sign', 'reject']:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': 'signature_id and valid action are required'})
-        }
+        return json_response(400, {'error': 'signature_id and valid action are required'})
     
-    cursor.execute(f"""
-        SELECT * FROM {SCHEMA}.document_signatures WHERE id = {signature_id}
-    """)
-    signature = cursor.fetchone()
+    result = process_signature_actions(cursor, int(user_id), [{
+        'signature_id': signature_id,
+        'action': action,
+        'signature_data': body.get('signature_data', ''),
+        'rejection_reason': body.get('rejection_reason', '')
+    }])[0]
     
-    if not signature:
-        return {
-            'statusCode': 404,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Signature request not found'})
-        }
+    errors = {
+        'invalid': (400, 'signature_id and valid action are required'),
+        'not_found': (404, 'Signature request not found'),
+        'forbidden': (403, 'Only assigned signer can perform this action'),
+        'already_processed': (400, 'Signature already processed'),
+        'locked': (409, 'Signature is being processed by another request')
+    }
+    if result['status'] in errors:
+        conn.rollback()
+        status_code, message = errors[result['status']]
+        return json_response(status_code, {'error': message})
     
-    if signature['signer_id'] != int(user_id):
-        return {
-            'statusCode': 403,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Only assigned signer can perform this action'})
-        }
+    conn.commit()
+    return json_response(200, {'signature': result['signature']})
+
+def sign_documents_batch(cursor, conn, user_id: str, body: dict) -> dict:
+    items = body.get('items')
     
-    if signature['status'] != 'pending':
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Signature already processed'})
-        }
+    if not isinstance(items, list) or not items:
+        return json_response(400, {'error': 'items must be a non-empty list'})
     
-    if action == 'sign':
-        cursor.execute(f"""
-            UPDATE {SCHEMA}.document_signatures
-            SET status = 'signed',
-                signature_data = '{signature_data}',
-                signed_at = '{datetime.now().isoformat()}'
-            WHERE id = {signature_id}
-            RETURNING *
-        """)
-        
-        cursor.execute(f"""
-            SELECT COUNT(*) as pending FROM {SCHEMA}.document_signatures
-            WHERE document_id = {signature['document_id']} AND status = 'pending'
-        """)
-        pending_count = cursor.fetchone()['pending']
-        
-        if pending_count == 0:
-            cursor.execute(f"""
-                UPDATE {SCHEMA}.documents
-                SET status = 'signed',
-                    updated_at = '{datetime.now().isoformat()}'
-                WHERE id = {signature['document_id']}
-            """)
-    else:
-        rejection_reason_safe = rejection_reason.replace("'", "''")
-        cursor.execute(f"""
-            UPDATE {SCHEMA}.document_signatures
-            SET status = 'rejected',
-                rejection_reason = '{rejection_reason_safe}',
-                rejected_at = '{datetime.now().isoformat()}'
-            WHERE id = {signature_id}
-            RETURNING *
-        """)
-        
-        cursor.execute(f"""
-            UPDATE {SCHEMA}.documents
-            SET status = 'rejected',
-                updated_at = '{datetime.now().isoformat()}'
-            WHERE id = {signature['document_id']}
-        """)
+    if len(items) > MAX_BATCH_SIGNATURES:
+        return json_response(413, {'error': f'Too many items, max {MAX_BATCH_SIGNATURES}'})
     
-    updated_signature = cursor.fetchone()
+    if not all(isinstance(item, dict) for item in items):
+        return json_response(400, {'error': 'Each item must be an object'})
+    
+    results = process_signature_actions(cursor, int(user_id), items)
     conn.commit()
     
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'isBase64Encoded': False,
-        'body': json.dumps({'signature': dict(updated_signature)}, default=str)
-    }
+    processed = sum(1 for r in results if r['status'] in ('signed', 'rejected'))
+    return json_response(200, {
+        'processed': processed,
+        'failed': len(results) - processed,
+        'results': results
+    })
 
 def get_pending_signatures(cursor, user_id: str, event: dict) -> dict:
+    params = event.get('queryStringParameters', {}) or {}
+    status = params.get('status', 'pending')
+    
+    if status not in ('pending', 'signed', 'rejected'):
+        return json_response(400, {'error': 'status must be pending, signed or rejected'})
+    
+    try:
+        limit = max(1, min(int(params.get('limit', INBOX_PAGE_SIZE)), INBOX_MAX_PAGE_SIZE))
+        cursor_created_at, cursor_id = parse_inbox_cursor(params.get('cursor'))
+    except ValueError:
+        return json_response(400, {'error': 'Invalid limit or cursor'})
+    
+    cursor_sql = ''
+    if cursor_id is not None:
+        cursor_sql = f"AND (s.created_at, s.id) < ('{cursor_created_at.isoformat()}'::timestamp, {cursor_id})"
+    
+    # Страница выбирается по индексу (signer_id, status, created_at, id), соединения - только для неё
     cursor.execute(f"""
         SELECT s.*,
                d.document_number,
                d.title as document_title,
                d.document_type,
+               d.pending_signatures,
+               d.signed_signatures,
                w.title as work_title,
                o.title as object_title,
                u.name as requester_name
-        FROM {SCHEMA}.document_signatures s
+        FROM (
+            SELECT * FROM {SCHEMA}.document_signatures s
+            WHERE s.signer_id = {int(user_id)} AND s.status = '{status}' {cursor_sql}
+            ORDER BY s.created_at DESC, s.id DESC
+            LIMIT {limit + 1}
+        ) s
         JOIN {SCHEMA}.documents d ON s.document_id = d.id
         JOIN {SCHEMA}.works w ON d.work_id = w.id
         JOIN {SCHEMA}.objects o ON w.object_id = o.id
         LEFT JOIN {SCHEMA}.users u ON d.created_by = u.id
-        WHERE s.signer_id = {user_id} AND s.status = 'pending'
-        ORDER BY s.created_at DESC
+        ORDER BY s.created_at DESC, s.id DESC
     """)
     
     signatures = cursor.fetchall()
+    has_more = len(signatures) > limit
+    signatures = signatures[:limit]
     
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'isBase64Encoded': False,
-        'body': json.dumps({'pending_signatures': [dict(sig) for sig in signatures]}, default=str)
-    }
+    next_cursor = None
+    if has_more and signatures:
+        last = signatures[-1]
+        next_cursor = f"{last['created_at'].isoformat()}|{last['id']}"
+    
+    return json_response(200, {
+        'pending_signatures': [dict(sig) for sig in signatures],
+        'nextCursor': next_cursor
+    })
@@ -111,10 +111,12 @@ def get_templates(cursor, user_id: str, event: dict) -> dict:
     if template_id:
         cursor.execute(f"""
             SELECT t.*,
-                   u.name as created_by_name
+                   u.name as created_by_name,
+                   (t.is_system = true AND t.source_template_id IS NULL
+                    AND t.client_id IS DISTINCT FROM {int(user_id)}) AS is_shared
             FROM {SCHEMA}.document_templates t
             LEFT JOIN {SCHEMA}.users u ON t.client_id = u.id
-            WHERE t.id = {template_id}
+            WHERE t.id = {int(template_id)}
         """)
         template = cursor.fetchone()
         
@@ -126,14 +128,11 @@ def get_templates(cursor, user_id: str, event: dict) -> dict:
                 'body': json.dumps({'error': 'Template not found'})
             }
         
-        cursor.execute(f"""
-            SELECT COUNT(*) as usage_count FROM {SCHEMA}.documents
-            WHERE template_id = {template_id}
-        """)
-        usage = cursor.fetchone()
-        
         template = dict(template)
-        template['usage_count'] = usage['usage_count']
+        if template.pop('is_shared'):
+            # Тот же вид, что и в списке: эталон без личной копии отдаётся как копия
+            template['source_template_id'] = template['id']
+            template['is_system'] = False
         
         if isinstance(template.get('content'), str):
             template['content'] = json.loads(template['content'])
@@ -145,26 +144,39 @@ def get_templates(cursor, user_id: str, event: dict) -> dict:
             'body': json.dumps({'template': template}, default=str)
         }
     else:
+        type_filter = f"AND t.template_type = '{template_type.replace(chr(39), chr(39) * 2)}'" if template_type else ''
+        
+        # Свои шаблоны пользователя + эталоны, которые он ещё не переопределил своей копией
         query = f"""
             SELECT t.*,
                    u.name as created_by_name,
-                   (SELECT COUNT(*) FROM {SCHEMA}.documents WHERE template_id = t.id) as usage_count
+                   t.client_id IS DISTINCT FROM {int(user_id)} AS is_shared
             FROM {SCHEMA}.document_templates t
             LEFT JOIN {SCHEMA}.users u ON t.client_id = u.id
-            WHERE (t.client_id = {user_id} OR t.is_system = true) AND t.is_active = true
+            WHERE t.is_active = true {type_filter}
+              AND (
+                  t.client_id = {int(user_id)}
+                  OR (
+                      t.is_system = true AND t.source_template_id IS NULL
+                      AND NOT EXISTS (
+                          SELECT 1 FROM {SCHEMA}.document_templates o
+                          WHERE o.client_id = {int(user_id)} AND o.source_template_id = t.id
+                      )
+                  )
+              )
+            ORDER BY t.is_system DESC, t.created_at DESC
         """
         
-        if template_type:
-            query += f" AND t.template_type = '{template_type}'"
-        
-        query += " ORDER BY t.is_system DESC, t.created_at DESC"
-        
         cursor.execute(query)
         templates = cursor.fetchall()
         
         templates_list = []
         for t in templates:
             template_dict = dict(t)
+            if template_dict.pop('is_shared'):
+                # Эталон без личной копии отдаётся как копия: копия создаётся только при первом изменении
+                template_dict['source_template_id'] = template_dict['id']
+                template_dict['is_system'] = False
             if isinstance(template_dict.get('content'), str):
                 template_dict['content'] = json.loads(template_dict['content'])
             templates_list.append(template_dict)
@@ -176,6 +188,34 @@ def get_templates(cursor, user_id: str, event: dict) -> dict:
             'body': json.dumps({'templates': templates_list}, default=str)
         }
 
+def materialize_template_copy(cursor, master_id: int, user_id: int) -> dict:
+    '''Создаёт личную копию эталона (или возвращает уже существующую)'''
+    cursor.execute(f"""
+        INSERT INTO {SCHEMA}.document_templates
+        (client_id, name, description, template_type, content, is_system, version, is_active,
+         source_template_id, system_key)
+        SELECT {user_id}, m.name, m.description, m.template_type, m.content, false, 1, m.is_active,
+               m.id, m.system_key
+        FROM {SCHEMA}.document_templates m
+        WHERE m.id = {master_id}
+          AND NOT EXISTS (
+              SELECT 1 FROM {SCHEMA}.document_templates o
+              WHERE o.client_id = {user_id} AND o.source_template_id = m.id
+          )
+        RETURNING *
+    """)
+    copy = cursor.fetchone()
+    if copy:
+        return copy
+    
+    cursor.execute(f"""
+        SELECT * FROM {SCHEMA}.document_templates
+        WHERE client_id = {user_id} AND source_template_id = {master_id}
+        ORDER BY id
+        LIMIT 1
+    """)
+    return cursor.fetchone()
+
 def update_template(cursor, conn, user_id: str, event: dict) -> dict:
     body = json.loads(event.get('body', '{}'))
     template_id = body.get('id')
@@ -190,7 +230,8 @@ def update_template(cursor, conn, user_id: str, event: dict) -> dict:
     
     cursor.execute(f"""
         SELECT * FROM {SCHEMA}.document_templates 
-        WHERE id = {template_id} AND client_id = {user_id}
+        WHERE id = {int(template_id)}
+          AND (client_id = {int(user_id)} OR (is_system = true AND source_template_id IS NULL))
     """)
     template = cursor.fetchone()
     
@@ -202,6 +243,13 @@ def update_template(cursor, conn, user_id: str, event: dict) -> dict:
             'body': json.dumps({'error': 'Template not found or access denied'})
         }
     
+    materialized_from = None
+    if template['client_id'] != int(user_id):
+        # Copy-on-write: личная копия эталона появляется только при первом изменении
+        materialized_from = template['id']
+        template = materialize_template_copy(cursor, template['id'], int(user_id))
+        template_id = template['id']
+    
     updates = []
     
     if 'name' in body and body['name'].strip():
@@ -243,6 +291,8 @@ def update_template(cursor, conn, user_id: str, event: dict) -> dict:
     template_dict = dict(updated_template)
     if isinstance(template_dict.get('content'), str):
         template_dict['content'] = json.loads(template_dict['content'])
+    if materialized_from:
+        template_dict['materialized_from'] = materialized_from
     
     return {
         'statusCode': 200,
@@ -1,8 +1,422 @@
 import json
 import os
-from typing import Dict, Any
+import hashlib
+import html as html_lib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, List
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from shared.write_helpers import (
+    purge_expired_idempotency_keys, claim_idempotency_key, save_idempotent_response,
+    release_idempotency_key, idempotent_replay_response
+)
+from shared.template_render import compile_template, render_compiled_template, render_template_source
+
+SCHEMA = 't_p8942561_contractor_control_s'
+IDEMPOTENCY_SCOPE = 'documents'
+DOCUMENTS_PAGE_SIZE = 100
+DOCUMENTS_MAX_PAGE_SIZE = 500
+# Каждая N-я ревизия хранится целиком, остальные - дельтой к предыдущей
+DOCUMENT_SNAPSHOT_INTERVAL = int(os.environ.get('DOCUMENT_SNAPSHOT_INTERVAL', '20'))
+TEMPLATE_CACHE_SIZE = int(os.environ.get('TEMPLATE_CACHE_SIZE', '128'))
+BULK_MAX_WORKS = 500
+# Документы пакета вставляются порциями в одной транзакции, после каждой обновляется прогресс задачи
+BULK_CHUNK_SIZE = 100
+
+# Скомпилированные шаблоны живут между вызовами в рамках одного инстанса функции
+_compiled_templates: 'OrderedDict[Tuple[Any, ...], List[Tuple[str, Optional[str]]]]' = OrderedDict()
+
+def store_html_body(cur, html: str) -> Optional[str]:
+    '''
+    Сохраняет HTML документа в document_bodies по SHA-256 и возвращает хеш.
+    Одинаковые тела (например, из одного шаблона) хранятся один раз.
+    '''
+    if not html:
+        return None
+    content_hash = hashlib.sha256(html.encode('utf-8')).hexdigest()
+    html_safe = html.replace("'", "''")
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.document_bodies (content_hash, html, size_bytes)
+        VALUES ('{content_hash}', '{html_safe}', {len(html.encode('utf-8'))})
+        ON CONFLICT (content_hash) DO NOTHING
+    """)
+    return content_hash
+
+def enqueue_pdf_render(cur, entity_type: str, entity_id: int) -> None:
+    '''Ставит PDF в очередь функции pdf-render; рендеринг выполняется вне пути запроса'''
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.pdf_render_jobs (entity_type, entity_id)
+        VALUES ('{entity_type}', {int(entity_id)})
+        ON CONFLICT (entity_type, entity_id) WHERE status IN ('pending', 'processing') DO NOTHING
+    """)
+
+def get_compiled_template(cache_key: Tuple[Any, ...], load_source) -> List[Tuple[str, Optional[str]]]:
+    '''LRU-кеш скомпилированных шаблонов; load_source вызывается только при промахе'''
+    parts = _compiled_templates.get(cache_key)
+    if parts is not None:
+        _compiled_templates.move_to_end(cache_key)
+        return parts
+    parts = compile_template(load_source() or '')
+    _compiled_templates[cache_key] = parts
+    if len(_compiled_templates) > TEMPLATE_CACHE_SIZE:
+        _compiled_templates.popitem(last=False)
+    return parts
+
+def load_template_html(cur, template_id: int) -> Optional[str]:
+    cur.execute(f"SELECT content->>'html' AS html FROM {SCHEMA}.document_templates WHERE id = {int(template_id)}")
+    row = cur.fetchone()
+    return row['html'] if row else None
+
+def render_template(cur, template_id: int, data: Dict[str, Any]) -> Optional[str]:
+    '''
+    Рендерит шаблон document_templates с contentData. Кеш по (id, version):
+    при попадании из БД читается только версия, HTML шаблона не загружается.
+    '''
+    cur.execute(f"SELECT version FROM {SCHEMA}.document_templates WHERE id = {int(template_id)}")
+    row = cur.fetchone()
+    if not row:
+        return None
+    parts = get_compiled_template(('template', int(template_id), row['version']),
+                                  lambda: load_template_html(cur, template_id))
+    return render_compiled_template(parts, data)
+
+def render_document_body(html_hash: Optional[str], source: str, data: Dict[str, Any]) -> str:
+    '''Рендерит HTML документа; тела в document_bodies неизменяемы, поэтому ключ кеша - их хеш'''
+    if not html_hash:
+        return render_template_source(source, data)
+    parts = get_compiled_template(('body', html_hash), lambda: source)
+    return render_compiled_template(parts, data)
+
+def bulk_generate_documents(conn, body_data: Dict[str, Any], user_id: int, cors_headers: Dict[str, str]) -> Dict[str, Any]:
+    '''
+    Создаёт документы по одному шаблону для списка работ.
+    contentData общий для всех, perWork[work_id] дополняет его для конкретной работы;
+    title и поля шаблона могут ссылаться на work_title, object_name, object_address, contractor_name.
+    '''
+    template_id = body_data.get('templateId')
+    work_ids = body_data.get('workIds') or []
+    shared_data = {k: v for k, v in (body_data.get('contentData') or {}).items() if k != 'html'}
+    per_work = body_data.get('perWork') or {}
+    title_source = body_data.get('title') or 'Новый документ'
+    status = str(body_data.get('status', 'draft')).replace("'", "''")
+    client_job_id = body_data.get('jobId')
+    
+    try:
+        template_id = int(template_id)
+        work_ids = list(dict.fromkeys(int(w) for w in work_ids))
+    except (TypeError, ValueError):
+        return {
+            'statusCode': 400,
+            'headers': cors_headers,
+            'body': json.dumps({'error': 'templateId and workIds must be integers'}),
+            'isBase64Encoded': False
+        }
+    
+    if not work_ids:
+        return {
+            'statusCode': 400,
+            'headers': cors_headers,
+            'body': json.dumps({'error': 'workIds is required'}),
+            'isBase64Encoded': False
+        }
+    
+    if len(work_ids) > BULK_MAX_WORKS:
+        return {
+            'statusCode': 413,
+            'headers': cors_headers,
+            'body': json.dumps({'error': f'Too many works, max {BULK_MAX_WORKS}'}),
+            'isBase64Encoded': False
+        }
+    
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"SELECT version, content->>'html' AS html FROM {SCHEMA}.document_templates WHERE id = {template_id}")
+        template = cur.fetchone()
+        if not template:
+            return {
+                'statusCode': 404,
+                'headers': cors_headers,
+                'body': json.dumps({'error': 'Template not found'}),
+                'isBase64Encoded': False
+            }
+        
+        ids_sql = ', '.join(str(w) for w in work_ids)
+        cur.execute(f"""
+            SELECT w.id, w.title, ob.title as object_title, ob.address, org.name as contractor_name
+            FROM {SCHEMA}.works w
+            LEFT JOIN {SCHEMA}.objects ob ON w.object_id = ob.id
+            LEFT JOIN {SCHEMA}.organizations org ON w.contractor_id = org.id
+            WHERE w.id IN ({ids_sql})
+        """)
+        works = {row['id']: row for row in cur.fetchall()}
+        missing = [w for w in work_ids if w not in works]
+        if missing:
+            return {
+                'statusCode': 404,
+                'headers': cors_headers,
+                'body': json.dumps({'error': 'Works not found', 'workIds': missing}),
+                'isBase64Encoded': False
+            }
+        
+        job_key_sql = "'" + str(client_job_id).replace("'", "''") + "'" if client_job_id else 'NULL'
+        if client_job_id:
+            # Повтор с тем же jobId ждёт завершения первого запроса и не создаёт документы второй раз
+            cur.execute(f"SELECT pg_advisory_xact_lock(hashtext({job_key_sql}), {int(user_id)})")
+            cur.execute(f"""
+                SELECT id FROM {SCHEMA}.document_bulk_jobs
+                WHERE client_job_id = {job_key_sql} AND created_by = {int(user_id)} AND status = 'completed'
+                LIMIT 1
+            """)
+            if cur.fetchone():
+                conn.rollback()
+                return {
+                    'statusCode': 409,
+                    'headers': cors_headers,
+                    'body': json.dumps({'error': 'Bulk job with this jobId is already completed'}),
+                    'isBase64Encoded': False
+                }
+        
+        # Документы пакета вставляются одной транзакцией, а задача и прогресс пишутся через отдельное
+        # соединение в autocommit: клиент видит processed по jobId, пока идёт запрос
+        progress_conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        progress_conn.autocommit = True
+        progress = progress_conn.cursor(cursor_factory=RealDictCursor)
+        
+        try:
+            progress.execute(f"""
+                INSERT INTO {SCHEMA}.document_bulk_jobs (client_job_id, template_id, total, created_by)
+                VALUES ({job_key_sql}, {template_id}, {len(work_ids)}, {int(user_id)})
+                RETURNING id
+            """)
+            job_id = progress.fetchone()['id']
+            
+            # Документы хранят исходник шаблона и свой contentData и рендерятся при чтении, как и созданные по одному:
+            # тело общее для всего пакета, а правка contentData меняет документ без пересохранения HTML
+            html_source = template['html'] or ''
+            html_hash = store_html_body(cur, html_source)
+            html_hash_sql = f"'{html_hash}'" if html_hash else 'NULL'
+            parts = get_compiled_template(('template', template_id, template['version']), lambda: html_source)
+            title_parts = compile_template(title_source)
+            documents: List[Dict[str, Any]] = []
+            
+            try:
+                for offset in range(0, len(work_ids), BULK_CHUNK_SIZE):
+                    chunk = work_ids[offset:offset + BULK_CHUNK_SIZE]
+                    datas = []
+                    for work_id in chunk:
+                        work = works[work_id]
+                        data = {
+                            'work_title': work['title'],
+                            'object_name': work['object_title'],
+                            'object_address': work['address'],
+                            'contractor_name': work['contractor_name'],
+                            **shared_data,
+                            **(per_work.get(str(work_id)) or {})
+                        }
+                        datas.append({k: v for k, v in data.items() if k != 'html'})
+                    
+                    titles = [html_lib.unescape(render_compiled_template(title_parts, data)) for data in datas]
+                    
+                    values_sql = ', '.join(
+                        f"({index}, {work_id}, '{title.replace(chr(39), chr(39) * 2)}', "
+                        f"'{json.dumps(data, ensure_ascii=False).replace(chr(39), chr(39) * 2)}'::jsonb)"
+                        for index, (work_id, title, data) in enumerate(zip(chunk, titles, datas))
+                    )
+                    # Одна вставка на порцию: номера документов и первые ревизии считаются в том же запросе
+                    cur.execute(f"""
+                        WITH rows AS (
+                            SELECT nextval(pg_get_serial_sequence('{SCHEMA}.documents', 'id')) AS id, v.*
+                            FROM (VALUES {values_sql}) AS v(ord, work_id, title, content)
+                        ),
+                        inserted AS (
+                            INSERT INTO {SCHEMA}.documents
+                            (id, title, work_id, template_id, document_type, content, html_hash, status, created_by, document_number)
+                            SELECT id, title, work_id, {template_id}, 'custom', content, {html_hash_sql}, '{status}', {int(user_id)},
+                                   'DOC-{template_id}-' || id
+                            FROM rows
+                            RETURNING id, work_id, title, content, status, document_number, created_at, updated_at
+                        ),
+                        revisions AS (
+                            INSERT INTO {SCHEMA}.document_versions
+                            (document_id, version, is_snapshot, content, changed_by, change_description)
+                            SELECT id, 1, TRUE,
+                                   jsonb_build_object('title', title, 'status', status, 'contentData', content,
+                                                      'html_hash', {html_hash_sql}::text),
+                                   {int(user_id)}, 'Документ создан (пакетная генерация)'
+                            FROM inserted
+                        ),
+                        template_usage AS (
+                            UPDATE {SCHEMA}.document_templates
+                            SET usage_count = usage_count + (SELECT COUNT(*) FROM inserted)
+                            WHERE id = {template_id}
+                        )
+                        SELECT i.* FROM inserted i JOIN rows r ON r.id = i.id ORDER BY r.ord
+                    """)
+                    for doc, data in zip(cur.fetchall(), datas):
+                        item = {
+                            'id': doc['id'],
+                            'work_id': doc['work_id'],
+                            'title': doc['title'],
+                            'templateId': template_id,
+                            'document_number': doc['document_number'],
+                            'status': doc['status'],
+                            'contentData': doc['content'] or {},
+                            'version': 1,
+                            'createdAt': doc['created_at'].isoformat() if doc['created_at'] else None,
+                            'updatedAt': doc['updated_at'].isoformat() if doc['updated_at'] else None
+                        }
+                        if body_data.get('render'):
+                            item['renderedHtml'] = render_compiled_template(parts, data)
+                        documents.append(item)
+                    
+                    progress.execute(f"""
+                        UPDATE {SCHEMA}.document_bulk_jobs
+                        SET processed = {len(documents)}, updated_at = NOW()
+                        WHERE id = {job_id}
+                    """)
+                
+                # Статус completed фиксируется вместе с документами
+                cur.execute(f"""
+                    UPDATE {SCHEMA}.document_bulk_jobs
+                    SET status = 'completed', processed = {len(documents)}, updated_at = NOW()
+                    WHERE id = {job_id}
+                """)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                error_safe = str(e)[:1000].replace("'", "''")
+                progress.execute(f"""
+                    UPDATE {SCHEMA}.document_bulk_jobs
+                    SET status = 'failed', processed = 0, error = '{error_safe}', updated_at = NOW()
+                    WHERE id = {job_id}
+                """)
+                raise
+        finally:
+            progress.close()
+            progress_conn.close()
+    
+    return {
+        'statusCode': 201,
+        'headers': cors_headers,
+        'isBase64Encoded': False,
+        'body': json.dumps({
+            'jobId': job_id,
+            'total': len(work_ids),
+            'documents': documents
+        }, ensure_ascii=False)
+    }
+
+def diff_revision_state(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Дельта между двумя состояниями документа {title, status, contentData, html_hash}.
+    contentData сравнивается по ключам верхнего уровня (set/unset). Тело хранится в document_bodies,
+    поэтому ревизия ссылается на него хешем, а не копирует HTML.
+    '''
+    delta: Dict[str, Any] = {}
+    for field in ('title', 'status'):
+        if old.get(field) != new.get(field):
+            delta[field] = new.get(field)
+    
+    old_data = old.get('contentData') or {}
+    new_data = new.get('contentData') or {}
+    changed = {k: v for k, v in new_data.items() if old_data.get(k) != v or k not in old_data}
+    removed = [k for k in old_data if k not in new_data]
+    if changed or removed:
+        delta['contentData'] = {'set': changed, 'unset': removed}
+    
+    if old.get('html_hash') != new.get('html_hash'):
+        delta['html_hash'] = new.get('html_hash')
+    return delta
+
+def apply_revision_delta(state: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    result = dict(state)
+    for field in ('title', 'status'):
+        if field in delta:
+            result[field] = delta[field]
+    if 'contentData' in delta:
+        content_data = dict(result.get('contentData') or {})
+        content_data.update(delta['contentData'].get('set', {}))
+        for key in delta['contentData'].get('unset', []):
+            content_data.pop(key, None)
+        result['contentData'] = content_data
+    if 'html_hash' in delta:
+        result['html_hash'] = delta['html_hash']
+    return result
+
+def insert_revision(cur, doc_id: int, version: int, is_snapshot: bool, payload: Dict[str, Any],
+                    user_id: int, description: Optional[str]) -> None:
+    payload_json = json.dumps(payload, ensure_ascii=False).replace("'", "''")
+    description_sql = "'" + description.replace("'", "''") + "'" if description else 'NULL'
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.document_versions
+        (document_id, version, is_snapshot, content, changed_by, change_description)
+        VALUES ({int(doc_id)}, {int(version)}, {'TRUE' if is_snapshot else 'FALSE'}, '{payload_json}'::jsonb,
+                {int(user_id)}, {description_sql})
+    """)
+
+def record_revision(cur, doc_id: int, old_state: Optional[Dict[str, Any]], new_state: Dict[str, Any],
+                    user_id: int, description: Optional[str] = None) -> Optional[int]:
+    '''
+    Записывает ревизию документа и возвращает её номер (None, если изменений нет).
+    Вызывать под блокировкой строки документа, иначе номера версий могут совпасть.
+    '''
+    cur.execute(f"SELECT MAX(version) AS version FROM {SCHEMA}.document_versions WHERE document_id = {int(doc_id)}")
+    last_version = cur.fetchone()['version']
+    
+    if last_version is None and old_state is not None:
+        # Документ создан до появления истории - фиксируем исходное состояние как базовый снимок
+        insert_revision(cur, doc_id, 1, True, old_state, user_id, 'Исходная версия')
+        last_version = 1
+    
+    version = (last_version or 0) + 1
+    if old_state is None or (version - 1) % DOCUMENT_SNAPSHOT_INTERVAL == 0:
+        insert_revision(cur, doc_id, version, True, new_state, user_id, description)
+        return version
+    
+    delta = diff_revision_state(old_state, new_state)
+    if not delta:
+        return None
+    insert_revision(cur, doc_id, version, False, delta, user_id, description)
+    return version
+
+def reconstruct_revision(cur, doc_id: int, version: int) -> Optional[Dict[str, Any]]:
+    '''
+    Восстанавливает состояние документа на указанную версию: ближайший снимок
+    не новее версии плюс не более DOCUMENT_SNAPSHOT_INTERVAL - 1 дельт.
+    '''
+    cur.execute(f"""
+        SELECT version, is_snapshot, content
+        FROM {SCHEMA}.document_versions
+        WHERE document_id = {int(doc_id)}
+          AND version <= {int(version)}
+          AND version >= (
+              SELECT COALESCE(MAX(version), 1) FROM {SCHEMA}.document_versions
+              WHERE document_id = {int(doc_id)} AND is_snapshot AND version <= {int(version)}
+          )
+        ORDER BY version
+    """)
+    rows = cur.fetchall()
+    if not rows or rows[-1]['version'] != int(version) or not rows[0]['is_snapshot']:
+        return None
+    
+    state = rows[0]['content']
+    for row in rows[1:]:
+        state = apply_revision_delta(state, row['content'])
+    
+    html_hash = state.get('html_hash')
+    state['html'] = None
+    if html_hash:
+        cur.execute(f"SELECT html FROM {SCHEMA}.document_bodies WHERE content_hash = '{html_hash}'")
+        body = cur.fetchone()
+        state['html'] = body['html'] if body else None
+    return state
+
+def parse_list_cursor(cursor: Optional[str]) -> Tuple[Optional[datetime], Optional[int]]:
+    '''Курсор списка документов: "<created_at ISO>|<id>" последнего документа предыдущей страницы'''
+    if not cursor:
+        return None, None
+    created_at, _, doc_id = cursor.rpartition('|')
+    return datetime.fromisoformat(created_at), int(doc_id)
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -16,7 +430,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     cors_headers = {
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, X-Session-Id',
+        'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, X-Session-Id, Idempotency-Key',
         'Content-Type': 'application/json'
     }
     
@@ -38,22 +452,156 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     conn = psycopg2.connect(database_url)
-    schema = 't_p8942561_contractor_control_s'
+    schema = SCHEMA
     
     try:
         if method == 'GET':
             query_params = event.get('queryStringParameters', {}) or {}
             doc_id = query_params.get('id')
             
+            if query_params.get('bulkJob'):
+                headers = event.get('headers', {}) or {}
+                user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+                if not user_id:
+                    return {
+                        'statusCode': 401,
+                        'headers': cors_headers,
+                        'body': json.dumps({'error': 'X-User-Id is required'}),
+                        'isBase64Encoded': False
+                    }
+                
+                job_key = query_params['bulkJob'].replace("'", "''")
+                job_filter = f"id = {int(job_key)}" if job_key.isdigit() else f"client_job_id = '{job_key}'"
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(f"""
+                        SELECT id, client_job_id, template_id, total, processed, status, error, created_at, updated_at
+                        FROM {schema}.document_bulk_jobs
+                        WHERE {job_filter} AND created_by = {int(user_id)}
+                        ORDER BY id DESC
+                        LIMIT 1
+                    """)
+                    job = cur.fetchone()
+                
+                if not job:
+                    return {
+                        'statusCode': 404,
+                        'headers': cors_headers,
+                        'body': json.dumps({'error': 'Bulk job not found'}),
+                        'isBase64Encoded': False
+                    }
+                
+                return {
+                    'statusCode': 200,
+                    'headers': cors_headers,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'jobId': job['id'],
+                        'clientJobId': job['client_job_id'],
+                        'templateId': job['template_id'],
+                        'total': job['total'],
+                        'processed': job['processed'],
+                        'status': job['status'],
+                        'error': job['error'],
+                        'createdAt': job['created_at'].isoformat() if job['created_at'] else None,
+                        'updatedAt': job['updated_at'].isoformat() if job['updated_at'] else None
+                    }, ensure_ascii=False)
+                }
+            
+            if doc_id and query_params.get('revisions'):
+                try:
+                    limit = max(1, min(int(query_params.get('limit', DOCUMENTS_PAGE_SIZE)), DOCUMENTS_MAX_PAGE_SIZE))
+                    before = int(query_params['before']) if query_params.get('before') else None
+                    doc_id = int(doc_id)
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': cors_headers,
+                        'body': json.dumps({'error': 'Invalid id, limit or before'}),
+                        'isBase64Encoded': False
+                    }
+                
+                before_sql = f"AND v.version < {before}" if before else ""
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(f"""
+                        SELECT v.version, v.is_snapshot, v.change_description, v.changed_by,
+                               u.name as changed_by_name, v.created_at
+                        FROM {schema}.document_versions v
+                        LEFT JOIN {schema}.users u ON v.changed_by = u.id
+                        WHERE v.document_id = {doc_id} {before_sql}
+                        ORDER BY v.version DESC
+                        LIMIT {limit + 1}
+                    """)
+                    rows = cur.fetchall()
+                
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+                revisions = [{
+                    'version': r['version'],
+                    'isSnapshot': r['is_snapshot'],
+                    'changeDescription': r['change_description'],
+                    'changedBy': r['changed_by'],
+                    'changedByName': r['changed_by_name'],
+                    'createdAt': r['created_at'].isoformat() if r['created_at'] else None
+                } for r in rows]
+                
+                return {
+                    'statusCode': 200,
+                    'headers': cors_headers,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'revisions': revisions,
+                        'nextBefore': rows[-1]['version'] if has_more else None
+                    }, ensure_ascii=False)
+                }
+            
+            if doc_id and query_params.get('version'):
+                try:
+                    doc_id = int(doc_id)
+                    version = int(query_params['version'])
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': cors_headers,
+                        'body': json.dumps({'error': 'Invalid id or version'}),
+                        'isBase64Encoded': False
+                    }
+                
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    state = reconstruct_revision(cur, doc_id, version)
+                
+                if state is None:
+                    return {
+                        'statusCode': 404,
+                        'headers': cors_headers,
+                        'body': json.dumps({'error': 'Revision not found'}),
+                        'isBase64Encoded': False
+                    }
+                
+                return {
+                    'statusCode': 200,
+                    'headers': cors_headers,
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'id': doc_id,
+                        'version': version,
+                        'title': state.get('title'),
+                        'status': state.get('status'),
+                        'contentData': state.get('contentData') or {},
+                        'htmlContent': state.get('html') or ''
+                    }, ensure_ascii=False)
+                }
+            
             if doc_id:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
                     query = f"""
                         SELECT d.id, d.work_id, d.template_id, d.document_number, d.document_type, 
                                d.title, d.content, d.status, d.created_by, d.created_at, d.updated_at,
+                               d.html_hash, d.pdf_url, b.html,
                                w.title as work_title, w.object_id,
                                o.title as object_title,
                                u.name as created_by_name
                         FROM {schema}.documents d
+                        LEFT JOIN {schema}.document_bodies b ON b.content_hash = d.html_hash
                         LEFT JOIN {schema}.works w ON d.work_id = w.id
                         LEFT JOIN {schema}.objects o ON w.object_id = o.id
                         LEFT JOIN {schema}.users u ON d.created_by = u.id
@@ -92,84 +640,165 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                             inspection_id = inspection['id']
                             inspection_number = inspection['inspection_number']
                     
-                    # Разделяем content на contentData (без html) и htmlContent
+                    # HTML хранится отдельно в document_bodies; content содержит только contentData
                     content = doc['content'] or {}
-                    html_content = content.get('html', '')
+                    html_content = doc['html'] or content.get('html', '')
                     content_data = {k: v for k, v in content.items() if k != 'html'}
                     
+                    response = {
+                        'id': doc['id'],
+                        'title': doc['title'],
+                        'work_id': doc['work_id'],
+                        'work_title': doc['work_title'],
+                        'object_id': doc['object_id'],
+                        'object_title': doc['object_title'],
+                        'created_by_name': doc['created_by_name'],
+                        'inspection_id': inspection_id,
+                        'inspection_number': inspection_number,
+                        'templateId': doc['template_id'],
+                        'templateName': template_name,
+                        'status': doc['status'],
+                        'contentData': content_data,
+                        'htmlContent': html_content,
+                        'pdfUrl': doc['pdf_url'],
+                        'createdAt': doc['created_at'].isoformat() if doc['created_at'] else None,
+                        'updatedAt': doc['updated_at'].isoformat() if doc['updated_at'] else None
+                    }
+                    if query_params.get('render'):
+                        response['renderedHtml'] = render_document_body(doc['html_hash'], html_content, content_data)
+                    
                     return {
                         'statusCode': 200,
                         'headers': cors_headers,
                         'isBase64Encoded': False,
-                        'body': json.dumps({
-                            'id': doc['id'],
-                            'title': doc['title'],
-                            'work_id': doc['work_id'],
-                            'work_title': doc['work_title'],
-                            'object_id': doc['object_id'],
-                            'object_title': doc['object_title'],
-                            'created_by_name': doc['created_by_name'],
-                            'inspection_id': inspection_id,
-                            'inspection_number': inspection_number,
-                            'templateId': doc['template_id'],
-                            'templateName': template_name,
-                            'status': doc['status'],
-                            'contentData': content_data,
-                            'htmlContent': html_content,
-                            'createdAt': doc['created_at'].isoformat() if doc['created_at'] else None,
-                            'updatedAt': doc['updated_at'].isoformat() if doc['updated_at'] else None
-                        }, ensure_ascii=False)
+                        'body': json.dumps(response, ensure_ascii=False)
                     }
             else:
                 params = event.get('queryStringParameters', {}) or {}
-                status_filter = params.get('status')
+                
+                try:
+                    limit = max(1, min(int(params.get('limit') or DOCUMENTS_PAGE_SIZE), DOCUMENTS_MAX_PAGE_SIZE))
+                    cursor_created_at, cursor_id = parse_list_cursor(params.get('cursor'))
+                    conditions = []
+                    for column in ('work_id', 'template_id'):
+                        if params.get(column):
+                            conditions.append(f"d.{column} = {int(params[column])}")
+                    if params.get('object_id'):
+                        conditions.append(f"d.work_id IN (SELECT id FROM {schema}.works WHERE object_id = {int(params['object_id'])})")
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': cors_headers,
+                        'body': json.dumps({'error': 'Invalid filter or cursor'}),
+                        'isBase64Encoded': False
+                    }
+                
+                if params.get('status'):
+                    status_safe = params['status'].replace("'", "''")
+                    conditions.append(f"d.status = '{status_safe}'")
+                
+                # Keyset-пагинация по (created_at, id): без OFFSET, стабильно при вставках
+                if cursor_id is not None:
+                    conditions.append(f"(d.created_at, d.id) < ('{cursor_created_at.isoformat()}'::timestamp, {cursor_id})")
+                
+                where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ''
                 
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    if status_filter:
-                        query = f"""SELECT d.id, d.work_id, d.template_id, d.document_number, d.document_type,
-                                   d.title, d.content, d.status, d.created_by, d.created_at, d.updated_at,
-                                   dt.name as template_name
-                                   FROM {schema}.documents d
-                                   LEFT JOIN {schema}.document_templates dt ON d.template_id = dt.id
-                                   WHERE d.status = '{status_filter}' 
-                                   ORDER BY d.created_at DESC"""
-                    else:
-                        query = f"""SELECT d.id, d.work_id, d.template_id, d.document_number, d.document_type,
-                                   d.title, d.content, d.status, d.created_by, d.created_at, d.updated_at,
-                                   dt.name as template_name
-                                   FROM {schema}.documents d
-                                   LEFT JOIN {schema}.document_templates dt ON d.template_id = dt.id
-                                   ORDER BY d.created_at DESC"""
+                    # html не покидает БД: в список попадают только метаданные и contentData
+                    query = f"""SELECT d.id, d.work_id, d.template_id, d.document_number, d.document_type,
+                               d.title, d.content - 'html' AS content_data, d.status, d.created_by,
+                               d.created_at, d.updated_at,
+                               dt.name as template_name
+                               FROM {schema}.documents d
+                               LEFT JOIN {schema}.document_templates dt ON d.template_id = dt.id
+                               {where_clause}
+                               ORDER BY d.created_at DESC, d.id DESC
+                               LIMIT {limit + 1}"""
                     cur.execute(query)
                     
                     docs = cur.fetchall()
+                    has_more = len(docs) > limit
+                    docs = docs[:limit]
                     
-                    # Подготовка списка документов без html в contentData
                     documents_list = []
                     for doc in docs:
-                        content = doc['content'] or {}
-                        content_data = {k: v for k, v in content.items() if k != 'html'}
-                        
                         documents_list.append({
                             'id': doc['id'],
                             'title': doc['title'],
+                            'work_id': doc['work_id'],
                             'templateId': doc['template_id'],
                             'templateName': doc.get('template_name', ''),
                             'status': doc['status'],
-                            'contentData': content_data,
+                            'contentData': doc['content_data'] or {},
                             'createdAt': doc['created_at'].isoformat() if doc['created_at'] else None,
                             'updatedAt': doc['updated_at'].isoformat() if doc['updated_at'] else None
                         })
                     
+                    next_cursor = None
+                    if has_more and docs:
+                        last = docs[-1]
+                        next_cursor = f"{last['created_at'].isoformat()}|{last['id']}"
+                    
                     return {
                         'statusCode': 200,
                         'headers': cors_headers,
                         'isBase64Encoded': False,
-                        'body': json.dumps({'documents': documents_list}, ensure_ascii=False)
+                        'body': json.dumps({'documents': documents_list, 'nextCursor': next_cursor}, ensure_ascii=False)
                     }
         
         elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
+            raw_body = event.get('body') or '{}'
+            body_data = json.loads(raw_body)
+            
+            query_params = event.get('queryStringParameters', {}) or {}
+            if query_params.get('action') == 'bulk':
+                headers = event.get('headers', {}) or {}
+                user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+                if not user_id:
+                    return {
+                        'statusCode': 401,
+                        'headers': cors_headers,
+                        'body': json.dumps({'error': 'X-User-Id is required'}),
+                        'isBase64Encoded': False
+                    }
+                user_id = int(user_id)
+                
+                idempotency_key = headers.get('Idempotency-Key') or headers.get('idempotency-key')
+                if idempotency_key and len(idempotency_key) > 255:
+                    return {
+                        'statusCode': 400,
+                        'headers': cors_headers,
+                        'body': json.dumps({'error': 'Idempotency-Key is too long'}),
+                        'isBase64Encoded': False
+                    }
+                
+                if idempotency_key:
+                    # Пакет коммитится порциями, поэтому резерв ключа фиксируется до начала генерации:
+                    # повтор во время работы получает 409, после завершения - сохранённый ответ
+                    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                        purge_expired_idempotency_keys(cur)
+                        conn.commit()
+                        request_hash = hashlib.sha256(raw_body.encode('utf-8')).hexdigest()
+                        stored = claim_idempotency_key(cur, IDEMPOTENCY_SCOPE, idempotency_key, user_id, request_hash)
+                        if stored:
+                            conn.rollback()
+                            return idempotent_replay_response(stored, request_hash, cors_headers)
+                        conn.commit()
+                
+                try:
+                    response = bulk_generate_documents(conn, body_data, user_id, cors_headers)
+                except Exception:
+                    if idempotency_key:
+                        with conn.cursor() as cur:
+                            release_idempotency_key(cur, IDEMPOTENCY_SCOPE, idempotency_key, user_id)
+                        conn.commit()
+                    raise
+                
+                if idempotency_key:
+                    with conn.cursor() as cur:
+                        save_idempotent_response(cur, IDEMPOTENCY_SCOPE, idempotency_key, user_id, response['statusCode'], response['body'])
+                    conn.commit()
+                return response
             title = body_data.get('title', 'Новый документ')
             template_id = body_data.get('templateId')
             work_id = body_data.get('work_id')
@@ -193,12 +822,20 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            content_obj = content_data.copy()
-            content_obj['html'] = html_content
+            content_obj = {k: v for k, v in content_data.items() if k != 'html'}
+            
+            headers = event.get('headers', {})
+            idempotency_key = headers.get('Idempotency-Key') or headers.get('idempotency-key')
+            if idempotency_key and len(idempotency_key) > 255:
+                return {
+                    'statusCode': 400,
+                    'headers': cors_headers,
+                    'body': json.dumps({'error': 'Idempotency-Key is too long'}),
+                    'isBase64Encoded': False
+                }
             
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 # Получаем created_by из заголовков или используем владельца работы
-                headers = event.get('headers', {})
                 user_id = headers.get('X-User-Id') or headers.get('x-user-id')
                 
                 if not user_id:
@@ -221,45 +858,88 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 
                 user_id = int(user_id)
                 
+                if idempotency_key:
+                    purge_expired_idempotency_keys(cur)
+                    conn.commit()
+                    
+                    request_hash = hashlib.sha256(raw_body.encode('utf-8')).hexdigest()
+                    stored = claim_idempotency_key(cur, IDEMPOTENCY_SCOPE, idempotency_key, user_id, request_hash)
+                    if stored:
+                        conn.rollback()
+                        return idempotent_replay_response(stored, request_hash, cors_headers)
+                
                 content_json = json.dumps(content_obj, ensure_ascii=False).replace("'", "''")
                 title_escaped = title.replace("'", "''")
+                html_from_template = not html_content
+                if html_from_template:
+                    # Клиент может не пересылать HTML шаблона - берём его из document_templates
+                    html_content = load_template_html(cur, template_id) or ''
+                html_hash = store_html_body(cur, html_content)
+                html_hash_sql = f"'{html_hash}'" if html_hash else 'NULL'
                 
                 cur.execute(f"SELECT COALESCE(MAX(id), 0) + 1 as next_id FROM {schema}.documents")
                 next_doc_num = cur.fetchone()['next_id']
                 doc_number = f"DOC-{template_id}-{next_doc_num}"
                 
-                query = f"""INSERT INTO {schema}.documents 
-                           (title, work_id, template_id, document_type, content, status, created_by, document_number)
-                           VALUES ('{title_escaped}', {work_id}, {template_id}, 'custom', '{content_json}', '{status}', {user_id}, '{doc_number}')
-                           RETURNING id, work_id, template_id, document_number, document_type, title, content, status, created_by, created_at, updated_at"""
+                query = f"""WITH inserted AS (
+                               INSERT INTO {schema}.documents 
+                               (title, work_id, template_id, document_type, content, html_hash, status, created_by, document_number)
+                               VALUES ('{title_escaped}', {work_id}, {template_id}, 'custom', '{content_json}', {html_hash_sql}, '{status}', {user_id}, '{doc_number}')
+                               RETURNING id, work_id, template_id, document_number, document_type, title, content, status, created_by, created_at, updated_at
+                           ),
+                           template_usage AS (
+                               UPDATE {schema}.document_templates SET usage_count = usage_count + 1
+                               WHERE id = {int(template_id)}
+                           )
+                           SELECT * FROM inserted"""
                 cur.execute(query)
                 doc = cur.fetchone()
-                conn.commit()
                 
                 cur.execute(f"SELECT name FROM {schema}.document_templates WHERE id = {template_id}")
                 template = cur.fetchone()
                 template_name = template['name'] if template else ''
                 
-                # Разделяем content на contentData (без html) и htmlContent
-                content = doc['content'] or {}
-                html_content = content.get('html', '')
-                content_data = {k: v for k, v in content.items() if k != 'html'}
+                content_data = doc['content'] or {}
+                
+                rendered_html = None
+                if body_data.get('render'):
+                    if html_from_template:
+                        rendered_html = render_template(cur, template_id, content_data)
+                    else:
+                        rendered_html = render_document_body(html_hash, html_content, content_data)
+                
+                version = record_revision(cur, doc['id'], None, {
+                    'title': doc['title'],
+                    'status': doc['status'],
+                    'contentData': content_data,
+                    'html_hash': html_hash
+                }, user_id, 'Документ создан')
+                
+                response_body = json.dumps({
+                    'id': doc['id'],
+                    'title': doc['title'],
+                    'templateId': doc['template_id'],
+                    'templateName': template_name,
+                    'status': doc['status'],
+                    'contentData': content_data,
+                    'htmlContent': html_content,
+                    'renderedHtml': rendered_html,
+                    'version': version,
+                    'createdAt': doc['created_at'].isoformat() if doc['created_at'] else None,
+                    'updatedAt': doc['updated_at'].isoformat() if doc['updated_at'] else None
+                }, ensure_ascii=False)
+                
+                # Ответ сохраняется в той же транзакции, что и сам документ
+                if idempotency_key:
+                    save_idempotent_response(cur, IDEMPOTENCY_SCOPE, idempotency_key, user_id, 201, response_body)
+                
+                conn.commit()
                 
                 return {
                     'statusCode': 201,
                     'headers': cors_headers,
                     'isBase64Encoded': False,
-                    'body': json.dumps({
-                        'id': doc['id'],
-                        'title': doc['title'],
-                        'templateId': doc['template_id'],
-                        'templateName': template_name,
-                        'status': doc['status'],
-                        'contentData': content_data,
-                        'htmlContent': html_content,
-                        'createdAt': doc['created_at'].isoformat() if doc['created_at'] else None,
-                        'updatedAt': doc['updated_at'].isoformat() if doc['updated_at'] else None
-                    }, ensure_ascii=False)
+                    'body': response_body
                 }
         
         elif method == 'PUT':
@@ -281,18 +961,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             print(f"🔍 PUT body_data: {body_data}")
             
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(f"SELECT content FROM {schema}.documents WHERE id = {int(doc_id)}")
-                existing = cur.fetchone()
-                if not existing:
-                    return {
-                        'statusCode': 404,
-                        'headers': cors_headers,
-                        'body': json.dumps({'error': 'Document not found'}),
-                        'isBase64Encoded': False
-                    }
-                
-                current_content = existing['content'] or {}
-                
                 update_fields = []
                 
                 if 'title' in body_data:
@@ -302,24 +970,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 if 'status' in body_data:
                     update_fields.append(f"status = '{body_data['status']}'")
                 
-                if 'contentData' in body_data or 'htmlContent' in body_data:
-                    # Обновляем только переданные поля contentData
-                    if 'contentData' in body_data:
-                        # Мерджим с текущими данными (не перезаписываем весь объект)
-                        for key, value in body_data['contentData'].items():
-                            if key != 'html':  # html обновляется отдельно через htmlContent
-                                current_content[key] = value
-                    
-                    # Обновляем html только если он явно передан
-                    if 'htmlContent' in body_data:
-                        current_content['html'] = body_data['htmlContent']
-                    
-                    content_json = json.dumps(current_content, ensure_ascii=False).replace("'", "''")
-                    update_fields.append(f"content = '{content_json}'")
+                if 'contentData' in body_data:
+                    # Мерджим переданные поля с текущими на стороне БД (без чтения и перезаписи всего content)
+                    content_patch = {k: v for k, v in body_data['contentData'].items() if k != 'html'}
+                    if content_patch:
+                        patch_json = json.dumps(content_patch, ensure_ascii=False).replace("'", "''")
+                        update_fields.append(f"content = content || '{patch_json}'::jsonb")
                 
-                update_fields.append('updated_at = CURRENT_TIMESTAMP')
+                if 'htmlContent' in body_data:
+                    # Тело документа меняется только при явной передаче htmlContent
+                    html_hash = store_html_body(cur, body_data['htmlContent'])
+                    update_fields.append(f"html_hash = '{html_hash}'" if html_hash else "html_hash = NULL")
                 
-                if len(update_fields) <= 1:
+                if not update_fields:
                     return {
                         'statusCode': 400,
                         'headers': cors_headers,
@@ -327,6 +990,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
+                update_fields.append('updated_at = CURRENT_TIMESTAMP')
+                
+                # Предыдущее состояние нужно для дельты ревизии; блокировка строки сериализует номера версий
+                cur.execute(f"""
+                    SELECT d.title, d.status, d.content, d.created_by, d.html_hash, b.html
+                    FROM {schema}.documents d
+                    LEFT JOIN {schema}.document_bodies b ON b.content_hash = d.html_hash
+                    WHERE d.id = {int(doc_id)}
+                    FOR UPDATE OF d
+                """)
+                previous = cur.fetchone()
+                
                 update_query = f"""UPDATE {schema}.documents 
                                   SET {', '.join(update_fields)} 
                                   WHERE id = {int(doc_id)} 
@@ -334,6 +1009,37 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                                            title, content, status, created_by, created_at, updated_at"""
                 cur.execute(update_query)
                 doc = cur.fetchone()
+                
+                if not doc or not previous:
+                    conn.rollback()
+                    return {
+                        'statusCode': 404,
+                        'headers': cors_headers,
+                        'body': json.dumps({'error': 'Document not found'}),
+                        'isBase64Encoded': False
+                    }
+                
+                if doc['status'] == 'signed' and previous['status'] != 'signed':
+                    enqueue_pdf_render(cur, 'document', doc['id'])
+                
+                previous_content = previous['content'] or {}
+                previous_html = previous['html'] or previous_content.get('html', '')
+                # У документов, созданных до document_bodies, HTML лежит в content - переносим его в тела
+                previous_hash = previous['html_hash'] or store_html_body(cur, previous_html)
+                headers = event.get('headers', {}) or {}
+                user_id = headers.get('X-User-Id') or headers.get('x-user-id') or previous['created_by']
+                version = record_revision(cur, doc['id'], {
+                    'title': previous['title'],
+                    'status': previous['status'],
+                    'contentData': {k: v for k, v in previous_content.items() if k != 'html'},
+                    'html_hash': previous_hash
+                }, {
+                    'title': doc['title'],
+                    'status': doc['status'],
+                    'contentData': doc['content'] or {},
+                    'html_hash': html_hash if 'htmlContent' in body_data else previous_hash
+                }, int(user_id), body_data.get('changeDescription'))
+                
                 conn.commit()
                 
                 template_name = ''
@@ -343,26 +1049,31 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     if template:
                         template_name = template['name']
                 
-                # Разделяем content на contentData (без html) и htmlContent
-                content = doc['content'] or {}
-                html_content = content.get('html', '')
-                content_data = {k: v for k, v in content.items() if k != 'html'}
+                response = {
+                    'id': doc['id'],
+                    'title': doc['title'],
+                    'templateId': doc['template_id'],
+                    'templateName': template_name,
+                    'status': doc['status'],
+                    'contentData': doc['content'] or {},
+                    'version': version,
+                    'createdAt': doc['created_at'].isoformat() if doc['created_at'] else None,
+                    'updatedAt': doc['updated_at'].isoformat() if doc['updated_at'] else None
+                }
+                # Тело возвращается только если оно менялось в этом запросе
+                if 'htmlContent' in body_data:
+                    response['htmlContent'] = body_data['htmlContent']
+                if body_data.get('render'):
+                    if 'htmlContent' in body_data:
+                        response['renderedHtml'] = render_document_body(html_hash, body_data['htmlContent'], response['contentData'])
+                    else:
+                        response['renderedHtml'] = render_document_body(previous['html_hash'], previous_html, response['contentData'])
                 
                 return {
                     'statusCode': 200,
                     'headers': cors_headers,
                     'isBase64Encoded': False,
-                    'body': json.dumps({
-                        'id': doc['id'],
-                        'title': doc['title'],
-                        'templateId': doc['template_id'],
-                        'templateName': template_name,
-                        'status': doc['status'],
-                        'contentData': content_data,
-                        'htmlContent': html_content,
-                        'createdAt': doc['created_at'].isoformat() if doc['created_at'] else None,
-                        'updatedAt': doc['updated_at'].isoformat() if doc['updated_at'] else None
-                    }, ensure_ascii=False)
+                    'body': json.dumps(response, ensure_ascii=False)
                 }
         
         elif method == 'DELETE':
@@ -381,7 +1092,18 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             with conn.cursor() as cur:
-                query = f"DELETE FROM {schema}.documents WHERE id = {int(doc_id)}"
+                cur.execute(f"DELETE FROM {schema}.document_versions WHERE document_id = {int(doc_id)}")
+                # usage_count шаблона уменьшается в том же запросе, что и удаление документа
+                query = f"""
+                    WITH removed AS (
+                        DELETE FROM {schema}.documents WHERE id = {int(doc_id)}
+                        RETURNING template_id
+                    )
+                    UPDATE {schema}.document_templates t
+                    SET usage_count = GREATEST(t.usage_count - 1, 0)
+                    FROM removed
+                    WHERE t.id = removed.template_id
+                """
                 cur.execute(query)
                 conn.commit()
                 
@@ -1,13 +1,26 @@
 '''
 Business: Get contractor tasks from remediations and defect reports
-Args: event with queryStringParameters.contractor_id
-Returns: JSON with tasks list
+Args: event with queryStringParameters (contractor_id, status, limit, cursor)
+Returns: JSON with tasks page and nextCursor
 '''
 
 import json
 import os
 import psycopg2
-from typing import Dict, Any, List
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+TASKS_PAGE_SIZE = 50
+TASKS_MAX_PAGE_SIZE = 200
+# Порядок задач в списке: сначала требующие действий подрядчика
+STATUS_RANK = {'pending': 1, 'completed': 2, 'rejected': 3, 'verified': 4}
+
+def parse_tasks_cursor(cursor: Optional[str]) -> Optional[Tuple[int, datetime, int]]:
+    '''Курсор страницы задач: "<ранг статуса>|<created_at ISO>|<id>" последней задачи предыдущей страницы'''
+    if not cursor:
+        return None
+    rank, created_at, remediation_id = cursor.split('|')
+    return int(rank), datetime.fromisoformat(created_at), int(remediation_id)
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
@@ -47,6 +60,23 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
+    try:
+        contractor_id_int = int(contractor_id)
+        limit = max(1, min(int(params.get('limit', TASKS_PAGE_SIZE)), TASKS_MAX_PAGE_SIZE))
+        page_after = parse_tasks_cursor(params.get('cursor'))
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Invalid contractor_id, limit or cursor'}),
+            'isBase64Encoded': False
+        }
+    
+    statuses = [st.replace("'", "''") for st in (params.get('status') or '').split(',') if st]
+    
     dsn = os.environ.get('DATABASE_URL')
     if not dsn:
         return {
@@ -59,7 +89,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     conn = psycopg2.connect(dsn)
     cursor = conn.cursor()
     
-    query = '''
+    rank_sql = 'CASE r.status ' + ' '.join(
+        f"WHEN '{st}' THEN {rank}" for st, rank in STATUS_RANK.items()
+    ) + f' ELSE {len(STATUS_RANK) + 1} END'
+    
+    filters = [f'r.contractor_id = {contractor_id_int}']
+    if statuses:
+        filters.append('r.status IN (' + ', '.join(f"'{st}'" for st in statuses) + ')')
+    if page_after:
+        after_rank, after_created_at, after_id = page_after
+        # Порядок: ранг статуса по возрастанию, внутри - (created_at, id) по убыванию
+        filters.append(
+            f"(({rank_sql}) > {after_rank} OR (({rank_sql}) = {after_rank} "
+            f"AND (r.created_at, r.id) < ('{after_created_at.isoformat()}'::timestamp, {after_id})))"
+        )
+    
+    # Описание дефекта берётся из строки defects; если дефект уже удалён из проверки -
+    # из снимка в акте, причём из report_data извлекается только нужный элемент
+    query = f'''
         SELECT 
             r.id,
             r.defect_report_id,
@@ -67,53 +114,56 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             r.defect_id,
             r.status,
             r.created_at,
-            dr.report_data,
-            i.work_id,
+            COALESCE(d.description, snap.defect->>'description'),
+            COALESCE(d.location, snap.defect->>'location'),
+            COALESCE(d.severity, snap.defect->>'severity'),
             w.title as work_title,
-            o.title as object_title
+            o.title as object_title,
+            {rank_sql} as status_rank
         FROM t_p8942561_contractor_control_s.defect_remediations r
         JOIN t_p8942561_contractor_control_s.defect_reports dr ON r.defect_report_id = dr.id
         JOIN t_p8942561_contractor_control_s.inspections i ON dr.inspection_id = i.id
         JOIN t_p8942561_contractor_control_s.works w ON i.work_id = w.id
         JOIN t_p8942561_contractor_control_s.objects o ON w.object_id = o.id
-        WHERE r.contractor_id = ''' + contractor_id + '''
-        ORDER BY 
-            CASE r.status 
-                WHEN 'pending' THEN 1
-                WHEN 'completed' THEN 2
-                WHEN 'rejected' THEN 3
-                WHEN 'verified' THEN 4
-            END,
-            r.created_at DESC
+        LEFT JOIN t_p8942561_contractor_control_s.defects d
+            ON d.inspection_id = dr.inspection_id AND d.defect_id = r.defect_id
+        LEFT JOIN LATERAL (
+            SELECT e AS defect
+            FROM jsonb_array_elements(dr.report_data->'defects') e
+            WHERE d.id IS NULL AND e->>'id' = r.defect_id
+            LIMIT 1
+        ) snap ON TRUE
+        WHERE {' AND '.join(filters)}
+        ORDER BY status_rank, r.created_at DESC, r.id DESC
+        LIMIT {limit + 1}
     '''
     
     cursor.execute(query)
     rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     
     tasks: List[Dict[str, Any]] = []
     for row in rows:
-        report_data = row[6] if row[6] else {}
-        defects = report_data.get('defects', [])
-        
-        defect_info = next(
-            (d for d in defects if d.get('id') == row[3]),
-            {}
-        )
-        
         tasks.append({
             'id': row[0],
             'report_id': row[1],
             'report_number': row[2],
             'defect_id': row[3],
-            'defect_description': defect_info.get('description', ''),
-            'defect_location': defect_info.get('location'),
-            'defect_severity': defect_info.get('severity'),
+            'defect_description': row[6] or '',
+            'defect_location': row[7],
+            'defect_severity': row[8],
             'status': row[4],
-            'work_title': row[8],
-            'object_title': row[9],
+            'work_title': row[9],
+            'object_title': row[10],
             'created_at': row[5].isoformat() if row[5] else None
         })
     
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = f"{last[11]}|{last[5].isoformat()}|{last[0]}"
+    
     cursor.close()
     conn.close()
     
@@ -123,6 +173,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'Content-Type': 'application/json',
             'Access-Control-Allow-Origin': '*'
         },
-        'body': json.dumps({'tasks': tasks}),
+        'body': json.dumps({'tasks': tasks, 'nextCursor': next_cursor}),
         'isBase64Encoded': False
     }
\ No newline at end of file
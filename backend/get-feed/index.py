@@ -6,6 +6,21 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 
 SCHEMA = 't_p8942561_contractor_control_s'
+# Размер превью из photos.thumbnails, который отдаётся в ленте вместо оригинала
+FEED_THUMBNAIL_SIZE = 'sm'
+
+def load_photo_thumbnails(cur, urls: List[str]) -> Dict[str, str]:
+    '''Превью для оригиналов одной выборкой; фото, загруженные в обход photo-upload, превью не имеют'''
+    urls = list({u for u in urls if isinstance(u, str) and u})
+    if not urls:
+        return {}
+    urls_sql = ', '.join("'" + u.replace("'", "''") + "'" for u in urls)
+    cur.execute(f'''
+        SELECT original_url, thumbnails->>'{FEED_THUMBNAIL_SIZE}' AS thumbnail_url
+        FROM {SCHEMA}.photos
+        WHERE original_url IN ({urls_sql})
+    ''')
+    return {row['original_url']: row['thumbnail_url'] for row in cur.fetchall() if row['thumbnail_url']}
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -206,21 +221,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         result = cur.fetchone()
         work_log_numbers[log_id] = result['log_number'] if result else 1
     
+    # Лента показывает превью, оригинал клиент загружает только при открытии фото
+    thumbnails = load_photo_thumbnails(cur, [u for log in work_logs for u in log['photo_urls']])
+    
     for log in work_logs:
-        photo_urls = []
-        if log['photo_urls']:
-            photo_url_str = log['photo_urls']
-            if isinstance(photo_url_str, str):
-                if photo_url_str.startswith('['):
-                    try:
-                        photo_urls = json.loads(photo_url_str)
-                    except Exception:
-                        photo_urls = [photo_url_str]
-                else:
-                    photo_urls = [photo_url_str]
-            elif isinstance(photo_url_str, list):
-                photo_urls = photo_url_str
-        
+        photo_urls = log['photo_urls']
         work_id = log['work_id']
         log_number = work_log_numbers.get(log['id'], 1)
         
@@ -239,7 +244,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'author': log['author_name'],
             'volume': log['volume'],
             'materials': log['materials'],
-            'photoUrls': photo_urls
+            'photoUrls': photo_urls,
+            'photoThumbnails': [thumbnails.get(u, u) for u in photo_urls]
         })
     
     # Get inspections
@@ -255,7 +261,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 i.type,
                 i.scheduled_date,
                 i.created_at,
-                i.defects,
+                (SELECT COUNT(*) FROM {SCHEMA}.defects df WHERE df.inspection_id = i.id) as defects_count,
                 w.title as work_title,
                 w.object_id,
                 o.title as object_title,
@@ -282,7 +288,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 i.type,
                 i.scheduled_date,
                 i.created_at,
-                i.defects,
+                (SELECT COUNT(*) FROM {SCHEMA}.defects df WHERE df.inspection_id = i.id) as defects_count,
                 w.title as work_title,
                 w.object_id,
                 o.title as object_title,
@@ -306,7 +312,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 i.type,
                 i.scheduled_date,
                 i.created_at,
-                i.defects,
+                (SELECT COUNT(*) FROM {SCHEMA}.defects df WHERE df.inspection_id = i.id) as defects_count,
                 w.title as work_title,
                 w.object_id,
                 o.title as object_title,
@@ -324,13 +330,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     inspections = cur.fetchall()
     
     for inspection in inspections:
-        defects_count = 0
-        if inspection['defects']:
-            try:
-                defects = json.loads(inspection['defects']) if isinstance(inspection['defects'], str) else inspection['defects']
-                defects_count = len(defects) if isinstance(defects, list) else 0
-            except Exception:
-                defects_count = 0
+        defects_count = inspection['defects_count'] or 0
         
         # Determine event type based on inspection status
         event_type = 'inspection_scheduled'
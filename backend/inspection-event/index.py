@@ -1,101 +1,278 @@
 '''
 Business: Создание и управление событиями проверок
-Args: event с httpMethod, body, queryStringParameters; context с request_id
+Args: event с httpMethod, body (одно событие или events: [...] пакетом), queryStringParameters;
+      POST ?action=maintain (по таймеру, X-Worker-Token) - создание и удаление месячных секций
 Returns: HTTP response с данными события
 '''
 import json
 import os
-from typing import Dict, Any
+from datetime import date
+from typing import Dict, Any, List, Optional
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
 SCHEMA = 't_p8942561_contractor_control_s'
+EVENT_TYPES = ('scheduled', 'started', 'completed')
+EVENTS_BATCH_MAX = 500
+RECENT_EVENTS_LIMIT = 100
+# Окна чтения последних событий в месяцах до текущего: обычно хватает текущей и прошлой секции
+RECENT_WINDOWS_MONTHS = (1, 3, 12)
+PARTITIONS_AHEAD_MONTHS = 3
+RETENTION_MONTHS = int(os.environ.get('INSPECTION_EVENTS_RETENTION_MONTHS', '36'))
 
 def get_db_connection():
     dsn = os.environ.get('DATABASE_URL')
     return psycopg2.connect(dsn, cursor_factory=RealDictCursor)
 
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"inspection_events_y{month.year:04d}m{month.month:02d}"
+
+def ensure_partitions(cur, months_ahead: int) -> List[str]:
+    '''Создаёт секции с текущего месяца на months_ahead вперёд; существующие не трогает'''
+    cur.execute(f"""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = '{SCHEMA}.inspection_events'::regclass
+    """)
+    existing = {row['relname'] for row in cur.fetchall()}
+
+    created = []
+    current = date.today().replace(day=1)
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SCHEMA}.{name}
+            PARTITION OF {SCHEMA}.inspection_events
+            FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')
+        """)
+        created.append(name)
+    return created
+
+def drop_expired_partitions(cur, retention_months: int) -> List[str]:
+    '''
+    Журнал только дописывается, поэтому срок хранения соблюдается удалением секций целиком:
+    без DELETE, без мёртвых строк и VACUUM по всей таблице.
+    '''
+    cutoff = add_months(date.today().replace(day=1), -retention_months)
+    cur.execute(f"""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = '{SCHEMA}.inspection_events'::regclass
+          AND c.relname ~ '^inspection_events_y[0-9]{{4}}m[0-9]{{2}}$'
+        ORDER BY c.relname
+    """)
+    dropped = []
+    for row in cur.fetchall():
+        name = row['relname']
+        month = date(int(name[-7:-3]), int(name[-2:]), 1)
+        if add_months(month, 1) > cutoff:
+            continue
+        cur.execute(f"ALTER TABLE {SCHEMA}.inspection_events DETACH PARTITION {SCHEMA}.{name}")
+        cur.execute(f"DROP TABLE {SCHEMA}.{name}")
+        dropped.append(name)
+    return dropped
+
+def parse_batch(events: Any) -> List[Dict[str, Any]]:
+    '''Проверяет пакет событий; ValueError - ошибка клиента'''
+    if not isinstance(events, list) or not events:
+        raise ValueError('events must be a non-empty list')
+    if len(events) > EVENTS_BATCH_MAX:
+        raise ValueError(f'Too many events (max {EVENTS_BATCH_MAX})')
+
+    parsed = []
+    for item in events:
+        if not isinstance(item, dict):
+            raise ValueError('Each event must be an object')
+        if item.get('event_type') not in EVENT_TYPES:
+            raise ValueError(f"event_type must be one of: {', '.join(EVENT_TYPES)}")
+        try:
+            parsed.append({
+                'inspection_id': int(item['inspection_id']),
+                'event_type': item['event_type'],
+                'created_by': int(item['created_by']),
+                'metadata': item.get('metadata') or {}
+            })
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each event requires integer inspection_id and created_by')
+    return parsed
+
+def insert_events(conn, cur, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    '''
+    Весь пакет - один INSERT ... SELECT FROM jsonb_to_recordset: один проход по индексам
+    и одна фиксация вместо запроса на каждое событие.
+    '''
+    events_json = json.dumps(events, ensure_ascii=False).replace("'", "''")
+    sql = f"""
+        INSERT INTO {SCHEMA}.inspection_events (inspection_id, event_type, created_by, metadata)
+        SELECT e.inspection_id, e.event_type, e.created_by, COALESCE(e.metadata, '{{}}'::jsonb)
+        FROM jsonb_to_recordset('{events_json}'::jsonb)
+            AS e(inspection_id INTEGER, event_type VARCHAR(50), created_by INTEGER, metadata JSONB)
+        RETURNING *
+    """
+    try:
+        cur.execute(sql)
+    except psycopg2.IntegrityError as e:
+        # Таймер обслуживания не успел создать секцию текущего месяца - создаём и повторяем
+        if e.pgcode != '23514' or 'no partition' not in str(e):
+            raise
+        conn.rollback()
+        ensure_partitions(cur, PARTITIONS_AHEAD_MONTHS)
+        cur.execute(sql)
+    rows = cur.fetchall()
+    conn.commit()
+    return rows
+
+def fetch_recent_events(cur, limit: int) -> List[Dict[str, Any]]:
+    '''
+    Ограничение по created_at отсекает старые секции при планировании, поэтому чтение
+    последних событий не растёт вместе с историей. Окно расширяется, только если событий мало.
+    '''
+    windows: List[Optional[int]] = list(RECENT_WINDOWS_MONTHS) + [None]
+    for months in windows:
+        window_sql = (
+            f"WHERE ie.created_at >= date_trunc('month', LOCALTIMESTAMP) - INTERVAL '{months - 1} months'"
+            if months is not None else ''
+        )
+        cur.execute(f"""
+            SELECT ie.*, u.name as author_name, u.role as author_role
+            FROM {SCHEMA}.inspection_events ie
+            LEFT JOIN {SCHEMA}.users u ON ie.created_by = u.id
+            {window_sql}
+            ORDER BY ie.created_at DESC
+            LIMIT {limit}
+        """)
+        events = cur.fetchall()
+        if len(events) >= limit:
+            break
+    return events
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
-    
+
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, X-Worker-Token',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
             'isBase64Encoded': False
         }
-    
+
+    params = event.get('queryStringParameters') or {}
+    headers = event.get('headers') or {}
+
+    if method == 'POST' and params.get('action'):
+        if params['action'] != 'maintain':
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Unknown action'}),
+                'isBase64Encoded': False
+            }
+        worker_token = os.environ.get('INSPECTION_EVENTS_WORKER_TOKEN')
+        if not worker_token or (headers.get('X-Worker-Token') or headers.get('x-worker-token')) != worker_token:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Unauthorized'}),
+                'isBase64Encoded': False
+            }
+
     conn = get_db_connection()
     cur = conn.cursor()
-    
+
     try:
         if method == 'GET':
-            inspection_id = event.get('queryStringParameters', {}).get('inspection_id') if event.get('queryStringParameters') else None
-            
+            inspection_id = params.get('inspection_id')
+
             if inspection_id:
                 cur.execute(f"""
                     SELECT ie.*, u.name as author_name, u.role as author_role
                     FROM {SCHEMA}.inspection_events ie
                     LEFT JOIN {SCHEMA}.users u ON ie.created_by = u.id
-                    WHERE ie.inspection_id = {inspection_id}
+                    WHERE ie.inspection_id = {int(inspection_id)}
                     ORDER BY ie.created_at ASC
                 """)
+                events = cur.fetchall()
             else:
-                cur.execute(f"""
-                    SELECT ie.*, u.name as author_name, u.role as author_role
-                    FROM {SCHEMA}.inspection_events ie
-                    LEFT JOIN {SCHEMA}.users u ON ie.created_by = u.id
-                    ORDER BY ie.created_at DESC
-                    LIMIT 100
-                """)
-            
-            events = cur.fetchall()
+                events = fetch_recent_events(cur, RECENT_EVENTS_LIMIT)
+
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps([dict(e) for e in events], default=str),
                 'isBase64Encoded': False
             }
-        
-        if method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            
-            inspection_id = int(body_data.get('inspection_id', 0))
-            event_type = body_data.get('event_type', '').replace("'", "''")
-            created_by = int(body_data.get('created_by', 0))
-            metadata = body_data.get('metadata', {})
-            
-            metadata_json = json.dumps(metadata, ensure_ascii=False).replace("'", "''")
-            
-            cur.execute(f"""
-                INSERT INTO {SCHEMA}.inspection_events (inspection_id, event_type, created_by, metadata)
-                VALUES ({inspection_id}, '{event_type}', {created_by}, '{metadata_json}'::jsonb)
-                RETURNING *
-            """)
-            
-            new_event = cur.fetchone()
+
+        if method == 'POST' and params.get('action') == 'maintain':
+            created = ensure_partitions(cur, PARTITIONS_AHEAD_MONTHS)
+            dropped = drop_expired_partitions(cur, RETENTION_MONTHS)
             conn.commit()
-            
+
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True, 'created': created, 'dropped': dropped}),
+                'isBase64Encoded': False
+            }
+
+        if method == 'POST':
+            body_data = json.loads(event.get('body') or '{}')
+
+            if 'events' in body_data:
+                try:
+                    batch = parse_batch(body_data['events'])
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)}),
+                        'isBase64Encoded': False
+                    }
+
+                new_events = insert_events(conn, cur, batch)
+
+                return {
+                    'statusCode': 201,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'inserted': len(new_events), 'events': [dict(e) for e in new_events]}, default=str),
+                    'isBase64Encoded': False
+                }
+
+            new_event = insert_events(conn, cur, [{
+                'inspection_id': int(body_data.get('inspection_id', 0)),
+                'event_type': body_data.get('event_type', ''),
+                'created_by': int(body_data.get('created_by', 0)),
+                'metadata': body_data.get('metadata', {})
+            }])[0]
+
             return {
                 'statusCode': 201,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                 'body': json.dumps(dict(new_event), default=str),
                 'isBase64Encoded': False
             }
-        
+
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'Method not allowed'}),
             'isBase64Encoded': False
         }
-    
+
     finally:
         cur.close()
         conn.close()
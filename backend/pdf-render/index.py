@@ -0,0 +1,253 @@
+'''
+Business: Фоновый рендеринг PDF для документов и актов о дефектах из очереди pdf_render_jobs
+Args: event - dict с httpMethod (вызов по таймеру или POST), headers (X-Worker-Token), body (limit)
+      context - object с request_id, function_name, function_version
+Returns: HTTP response dict со статистикой обработанных задач
+'''
+
+import json
+import os
+import hashlib
+import html as html_lib
+from typing import Dict, Any, Optional, List, Tuple
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from shared.template_render import render_template_source
+
+SCHEMA = 't_p8942561_contractor_control_s'
+PDF_BATCH_SIZE = int(os.environ.get('PDF_BATCH_SIZE', '10'))
+PDF_MAX_ATTEMPTS = 3
+# Задача в статусе processing дольше этого времени считается брошенной (упавший инстанс)
+PDF_STALE_MINUTES = 15
+# Меняется при изменении печатного оформления, чтобы старые PDF из кеша не переиспользовались
+PDF_LAYOUT_VERSION = '1'
+PDF_STORAGE_DIR = os.environ.get('PDF_STORAGE_DIR', '/tmp/pdf-renders')
+
+PRINT_LAYOUT = '''<!DOCTYPE html>
+<html>
+  <head>
+    <meta charset="utf-8">
+    <title>{title}</title>
+    <style>
+      body {{ font-family: 'Times New Roman', serif; padding: 20px; line-height: 1.6; color: #000; }}
+      h1, h2, h3 {{ margin-top: 1em; margin-bottom: 0.5em; }}
+      p {{ margin: 0.5em 0; }}
+      table {{ width: 100%; border-collapse: collapse; }}
+      th, td {{ border: 1px solid #000; padding: 4px 6px; text-align: left; vertical-align: top; }}
+    </style>
+  </head>
+  <body>
+{body}
+  </body>
+</html>'''
+
+def cors_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': json.dumps(body, ensure_ascii=False)
+    }
+
+def build_document_html(cur, document_id: int) -> Optional[Tuple[str, str]]:
+    cur.execute(f"""
+        SELECT d.title, d.content, b.html
+        FROM {SCHEMA}.documents d
+        LEFT JOIN {SCHEMA}.document_bodies b ON b.content_hash = d.html_hash
+        WHERE d.id = {int(document_id)}
+    """)
+    doc = cur.fetchone()
+    if not doc:
+        return None
+    content = doc['content'] or {}
+    source = doc['html'] or content.get('html', '')
+    return doc['title'], render_template_source(source, content)
+
+def build_defect_report_html(cur, report_id: int) -> Optional[Tuple[str, str]]:
+    cur.execute(f"""
+        SELECT report_number, created_at, report_data
+        FROM {SCHEMA}.defect_reports
+        WHERE id = {int(report_id)}
+    """)
+    report = cur.fetchone()
+    if not report:
+        return None
+
+    data = report['report_data'] or {}
+    esc = lambda value: html_lib.escape(str(value)) if value is not None else ''
+    rows = ''.join(
+        f"<tr><td>{index}</td><td>{esc(d.get('description'))}</td><td>{esc(d.get('location'))}</td>"
+        f"<td>{esc(d.get('severity'))}</td><td>{esc(d.get('deadline'))}</td></tr>"
+        for index, d in enumerate(data.get('defects') or [], start=1)
+    )
+    title = f"Акт об обнаружении дефектов №{report['report_number']}"
+    body = (
+        f"<h1>{esc(title)}</h1>"
+        f"<p>Объект: {esc(data.get('object_title'))}, {esc(data.get('object_address'))}</p>"
+        f"<p>Работа: {esc(data.get('work_title'))}</p>"
+        f"<p>Проверка: {esc(data.get('inspection_number'))} от {esc(data.get('inspection_date'))}</p>"
+        f"<p>Всего дефектов: {esc(data.get('total_defects'))}, критических: {esc(data.get('critical_defects'))}</p>"
+        f"<table><tr><th>№</th><th>Описание</th><th>Место</th><th>Критичность</th><th>Срок устранения</th></tr>{rows}</table>"
+    )
+    return title, body
+
+SOURCE_BUILDERS = {
+    'document': (build_document_html, 'documents'),
+    'defect_report': (build_defect_report_html, 'defect_reports'),
+}
+
+def storage_configured() -> bool:
+    '''
+    /tmp функции не переживает инстанс, поэтому ссылки file:// нельзя ни кешировать, ни отдавать:
+    нужно объектное хранилище или постоянный каталог с публичным адресом (PDF_PUBLIC_BASE_URL)
+    '''
+    return bool(os.environ.get('AWS_ACCESS_KEY_ID') or os.environ.get('PDF_PUBLIC_BASE_URL'))
+
+def store_pdf(content_hash: str, pdf_bytes: bytes) -> str:
+    '''
+    Сохраняет PDF в объектное хранилище (если заданы ключи S3) или в каталог PDF_STORAGE_DIR,
+    раздаваемый по PDF_PUBLIC_BASE_URL. Имя файла - хеш контента, поэтому повторная запись безопасна.
+    '''
+    key = f"pdf/{content_hash}.pdf"
+    access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+    if access_key:
+        import boto3
+        s3 = boto3.client(
+            's3',
+            endpoint_url=os.environ.get('S3_ENDPOINT_URL', 'https://bucket.poehali.dev'),
+            aws_access_key_id=access_key,
+            aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY')
+        )
+        s3.put_object(Bucket=os.environ.get('S3_BUCKET', 'files'), Key=key, Body=pdf_bytes, ContentType='application/pdf')
+        return f"https://cdn.poehali.dev/projects/{access_key}/bucket/{key}"
+
+    base_url = os.environ.get('PDF_PUBLIC_BASE_URL')
+    if not base_url:
+        raise RuntimeError('PDF storage is not configured')
+    path = os.path.join(PDF_STORAGE_DIR, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(pdf_bytes)
+    return f"{base_url.rstrip('/')}/{key}"
+
+def render_pdf(page_html: str) -> bytes:
+    from weasyprint import HTML
+    return HTML(string=page_html).write_pdf()
+
+def claim_jobs(cur, limit: int) -> List[Dict[str, Any]]:
+    '''Забирает пачку задач; SKIP LOCKED позволяет нескольким воркерам работать параллельно'''
+    cur.execute(f"""
+        UPDATE {SCHEMA}.pdf_render_jobs
+        SET status = 'processing', attempts = attempts + 1, updated_at = NOW()
+        WHERE id IN (
+            SELECT id FROM {SCHEMA}.pdf_render_jobs
+            WHERE status = 'pending'
+               OR (status = 'processing' AND updated_at < NOW() - INTERVAL '{PDF_STALE_MINUTES} minutes')
+            ORDER BY created_at
+            LIMIT {int(limit)}
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, entity_type, entity_id, attempts
+    """)
+    return cur.fetchall()
+
+def process_job(cur, job: Dict[str, Any]) -> str:
+    '''Рендерит одну задачу и записывает pdf_url обратно; возвращает rendered, cached или missing'''
+    builder, table = SOURCE_BUILDERS[job['entity_type']]
+    source = builder(cur, job['entity_id'])
+    if source is None:
+        cur.execute(f"""
+            UPDATE {SCHEMA}.pdf_render_jobs
+            SET status = 'failed', error = 'Source not found', updated_at = NOW()
+            WHERE id = {job['id']}
+        """)
+        return 'missing'
+
+    title, body = source
+    page_html = PRINT_LAYOUT.format(title=html_lib.escape(title or ''), body=body)
+    content_hash = hashlib.sha256(f"{PDF_LAYOUT_VERSION}:{page_html}".encode('utf-8')).hexdigest()
+
+    cur.execute(f"SELECT pdf_url FROM {SCHEMA}.pdf_renders WHERE content_hash = '{content_hash}'")
+    cached = cur.fetchone()
+    if cached:
+        pdf_url = cached['pdf_url']
+        outcome = 'cached'
+    else:
+        pdf_bytes = render_pdf(page_html)
+        pdf_url = store_pdf(content_hash, pdf_bytes)
+        url_safe = pdf_url.replace("'", "''")
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}.pdf_renders (content_hash, pdf_url, size_bytes)
+            VALUES ('{content_hash}', '{url_safe}', {len(pdf_bytes)})
+            ON CONFLICT (content_hash) DO NOTHING
+        """)
+        outcome = 'rendered'
+
+    url_safe = pdf_url.replace("'", "''")
+    cur.execute(f"UPDATE {SCHEMA}.{table} SET pdf_url = '{url_safe}' WHERE id = {int(job['entity_id'])}")
+    cur.execute(f"""
+        UPDATE {SCHEMA}.pdf_render_jobs
+        SET status = 'done', content_hash = '{content_hash}', pdf_url = '{url_safe}',
+            error = NULL, updated_at = NOW()
+        WHERE id = {job['id']}
+    """)
+    return outcome
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Worker-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    worker_token = os.environ.get('PDF_WORKER_TOKEN')
+    headers = event.get('headers', {}) or {}
+    if not worker_token or (headers.get('X-Worker-Token') or headers.get('x-worker-token')) != worker_token:
+        return cors_response(401, {'error': 'Unauthorized'})
+
+    # Без хранилища задачи не забираются: иначе они тратили бы попытки и уходили в failed
+    if not storage_configured():
+        return cors_response(503, {'error': 'PDF storage is not configured'})
+
+    try:
+        body = json.loads(event.get('body') or '{}')
+        limit = max(1, min(int(body.get('limit', PDF_BATCH_SIZE)), 100))
+    except (ValueError, TypeError, AttributeError):
+        return cors_response(400, {'error': 'Invalid limit'})
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    stats = {'rendered': 0, 'cached': 0, 'missing': 0, 'failed': 0}
+
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            jobs = claim_jobs(cur, limit)
+            conn.commit()
+
+            # Каждая задача коммитится отдельно: ошибка одной не откатывает уже готовые PDF
+            for job in jobs:
+                try:
+                    stats[process_job(cur, job)] += 1
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    next_status = 'failed' if job['attempts'] >= PDF_MAX_ATTEMPTS else 'pending'
+                    error_safe = str(e)[:1000].replace("'", "''")
+                    cur.execute(f"""
+                        UPDATE {SCHEMA}.pdf_render_jobs
+                        SET status = '{next_status}', error = '{error_safe}', updated_at = NOW()
+                        WHERE id = {job['id']}
+                    """)
+                    conn.commit()
+                    stats['failed'] += 1
+
+        return cors_response(200, {'success': True, 'claimed': len(jobs), **stats})
+    finally:
+        conn.close()
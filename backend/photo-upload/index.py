@@ -0,0 +1,243 @@
+'''
+Business: Приём фотографий: дедупликация по SHA-256, превью нескольких размеров, сохранение в хранилище
+Args: event with httpMethod POST, headers (X-Auth-Token), body (files: [{data: base64, filename, contentType}])
+Returns: JSON со списком фото (url оригинала, thumbnails по размерам, duplicate)
+'''
+
+import json
+import os
+import io
+import base64
+import hashlib
+import psycopg2
+import jwt
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Tuple
+from psycopg2.extras import RealDictCursor
+
+JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-change-in-production')
+SCHEMA = 't_p8942561_contractor_control_s'
+PHOTO_MAX_BYTES = 10 * 1024 * 1024
+PHOTO_MAX_FILES = 10
+# Длинная сторона превью в пикселях: sm - списки и лента, md - карточки, lg - просмотр без оригинала
+THUMBNAIL_SIZES = {'sm': 160, 'md': 480, 'lg': 1280}
+THUMBNAIL_QUALITY = 82
+PHOTO_POOL_THRESHOLD = 2
+PHOTO_STORAGE_DIR = os.environ.get('PHOTO_STORAGE_DIR', '/tmp/photos')
+ALLOWED_CONTENT_TYPES = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/webp': 'webp', 'image/heic': 'heic'}
+
+def verify_jwt_token(token: str) -> Dict[str, Any]:
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        raise ValueError('Token expired')
+    except jwt.InvalidTokenError:
+        raise ValueError('Invalid token')
+
+def json_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': json.dumps(body, ensure_ascii=False, default=str)
+    }
+
+def storage_configured() -> bool:
+    '''
+    Ссылки на фото сохраняются в photos и отдаются клиентам, а /tmp функции не переживает инстанс:
+    нужно объектное хранилище или постоянный каталог с публичным адресом (PHOTO_PUBLIC_BASE_URL)
+    '''
+    return bool(os.environ.get('AWS_ACCESS_KEY_ID') or os.environ.get('PHOTO_PUBLIC_BASE_URL'))
+
+def store_file(key: str, data: bytes, content_type: str) -> str:
+    '''
+    Сохраняет файл в объектное хранилище (если заданы ключи S3) или в каталог PHOTO_STORAGE_DIR,
+    раздаваемый по PHOTO_PUBLIC_BASE_URL. Ключ строится из хеша контента, поэтому повторная запись безопасна.
+    '''
+    access_key = os.environ.get('AWS_ACCESS_KEY_ID')
+    if access_key:
+        import boto3
+        s3 = boto3.client(
+            's3',
+            endpoint_url=os.environ.get('S3_ENDPOINT_URL', 'https://bucket.poehali.dev'),
+            aws_access_key_id=access_key,
+            aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY')
+        )
+        s3.put_object(Bucket=os.environ.get('S3_BUCKET', 'files'), Key=key, Body=data, ContentType=content_type)
+        return f"https://cdn.poehali.dev/projects/{access_key}/bucket/{key}"
+
+    base_url = os.environ.get('PHOTO_PUBLIC_BASE_URL')
+    if not base_url:
+        raise RuntimeError('Photo storage is not configured')
+    path = os.path.join(PHOTO_STORAGE_DIR, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return f"{base_url.rstrip('/')}/{key}"
+
+def make_thumbnails(data: bytes) -> Tuple[int, int, Dict[str, bytes]]:
+    '''Декодирует изображение и строит JPEG-превью всех размеров; выполняется в пуле процессов'''
+    from PIL import Image, ImageOps
+    from pillow_heif import register_heif_opener
+    # Фото с iPhone приходят в HEIC; Pillow читает его только через плагин pillow-heif
+    register_heif_opener()
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        width, height = image.size
+        thumbnails = {}
+        for name, size in THUMBNAIL_SIZES.items():
+            thumb = image.copy()
+            thumb.thumbnail((size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            thumb.save(buffer, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True, progressive=True)
+            thumbnails[name] = buffer.getvalue()
+    return width, height, thumbnails
+
+def make_thumbnails_many(datas: List[bytes]) -> List[Tuple[int, int, Dict[str, bytes]]]:
+    '''Декодирование и ресайз - CPU-нагрузка, поэтому несколько файлов обрабатываются в пуле процессов'''
+    workers = os.cpu_count() or 1
+    if len(datas) >= PHOTO_POOL_THRESHOLD and workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(datas))) as pool:
+                return list(pool.map(make_thumbnails, datas))
+        except (OSError, NotImplementedError):
+            # Среда без поддержки multiprocessing (нет /dev/shm) - обрабатываем последовательно
+            pass
+    return [make_thumbnails(data) for data in datas]
+
+def parse_files(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    '''Проверяет и декодирует файлы запроса; ValueError - ошибка клиента'''
+    files = body.get('files')
+    if files is None and body.get('data'):
+        files = [body]
+    if not isinstance(files, list) or not files:
+        raise ValueError('files must be a non-empty list')
+    if len(files) > PHOTO_MAX_FILES:
+        raise ValueError(f'Too many files (max {PHOTO_MAX_FILES})')
+
+    parsed = []
+    for item in files:
+        if not isinstance(item, dict) or not item.get('data'):
+            raise ValueError('Each file requires base64 data')
+        content_type = item.get('contentType') or 'image/jpeg'
+        if content_type not in ALLOWED_CONTENT_TYPES:
+            raise ValueError(f'Unsupported content type: {content_type}')
+        data = item['data']
+        if data.startswith('data:'):
+            data = data.split(',', 1)[-1]
+        try:
+            raw = base64.b64decode(data, validate=True)
+        except (ValueError, TypeError):
+            raise ValueError(f"Invalid base64 data in {item.get('filename') or 'file'}")
+        if len(raw) > PHOTO_MAX_BYTES:
+            raise ValueError(f"{item.get('filename') or 'File'} is too large (max 10 MB)")
+        parsed.append({
+            'data': raw,
+            'content_type': content_type,
+            'filename': item.get('filename'),
+            'content_hash': hashlib.sha256(raw).hexdigest()
+        })
+    return parsed
+
+def photo_payload(row: Dict[str, Any], duplicate: bool) -> Dict[str, Any]:
+    return {
+        'id': row['id'],
+        'hash': row['content_hash'],
+        'url': row['original_url'],
+        'thumbnails': row['thumbnails'],
+        'width': row['width'],
+        'height': row['height'],
+        'duplicate': duplicate
+    }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    if method != 'POST':
+        return json_response(405, {'error': 'Method not allowed'})
+
+    headers = event.get('headers', {}) or {}
+    auth_token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
+    if not auth_token:
+        return json_response(401, {'error': 'Auth token required'})
+
+    try:
+        user_id = int(verify_jwt_token(auth_token)['user_id'])
+    except ValueError as e:
+        return json_response(401, {'error': str(e)})
+    except Exception:
+        return json_response(401, {'error': 'Invalid token'})
+
+    try:
+        files = parse_files(json.loads(event.get('body') or '{}'))
+    except ValueError as e:
+        return json_response(400, {'error': str(e)})
+
+    if not storage_configured():
+        return json_response(503, {'error': 'Photo storage is not configured'})
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+
+        hashes_sql = ', '.join(f"'{f['content_hash']}'" for f in files)
+        cur.execute(f"""
+            SELECT id, content_hash, original_url, thumbnails, width, height
+            FROM {SCHEMA}.photos
+            WHERE content_hash IN ({hashes_sql})
+        """)
+        known = {row['content_hash']: row for row in cur.fetchall()}
+
+        # Одинаковые файлы в одном запросе обрабатываются один раз
+        new_files = list({f['content_hash']: f for f in files if f['content_hash'] not in known}.values())
+        try:
+            rendered = make_thumbnails_many([f['data'] for f in new_files])
+        except Exception as e:
+            return json_response(400, {'error': f'Cannot decode image: {e}'})
+
+        for photo, (width, height, thumbnails) in zip(new_files, rendered):
+            content_hash = photo['content_hash']
+            prefix = f"photos/{content_hash[:2]}/{content_hash}"
+            original_url = store_file(f"{prefix}.{ALLOWED_CONTENT_TYPES[photo['content_type']]}",
+                                      photo['data'], photo['content_type'])
+            thumbnail_urls = {
+                name: store_file(f"{prefix}_{name}.jpg", data, 'image/jpeg')
+                for name, data in thumbnails.items()
+            }
+            thumbnails_json = json.dumps(thumbnail_urls).replace("'", "''")
+            url_safe = original_url.replace("'", "''")
+            # Параллельная загрузка того же файла другим запросом не создаёт вторую строку
+            cur.execute(f"""
+                INSERT INTO {SCHEMA}.photos
+                    (content_hash, original_url, thumbnails, content_type, size_bytes, width, height, uploaded_by)
+                VALUES ('{content_hash}', '{url_safe}', '{thumbnails_json}'::jsonb, '{photo['content_type']}',
+                        {len(photo['data'])}, {int(width)}, {int(height)}, {user_id})
+                ON CONFLICT (content_hash) DO UPDATE SET content_hash = EXCLUDED.content_hash
+                RETURNING id, content_hash, original_url, thumbnails, width, height
+            """)
+            photo['row'] = cur.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+
+    stored = {f['content_hash']: f['row'] for f in new_files}
+    return json_response(201, {
+        'success': True,
+        'photos': [
+            photo_payload(known[f['content_hash']], True) if f['content_hash'] in known
+            else photo_payload(stored[f['content_hash']], False)
+            for f in files
+        ]
+    })
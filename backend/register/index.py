@@ -107,24 +107,6 @@ def handler(event, context):
                 SET organization_id = {organization_id}
                 WHERE id = {user_id}
             """)
-            
-            # Копируем системные шаблоны новому клиенту
-            cur.execute(f"""
-                INSERT INTO {SCHEMA}.document_templates 
-                  (client_id, name, description, template_type, content, version, is_active, is_system, source_template_id)
-                SELECT 
-                  {user_id},
-                  name,
-                  description,
-                  template_type,
-                  content,
-                  1,
-                  true,
-                  false,
-                  id
-                FROM {SCHEMA}.document_templates
-                WHERE is_system = true
-            """)
         
         conn.commit()
         
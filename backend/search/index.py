@@ -0,0 +1,222 @@
+'''
+Business: Поиск по объектам, работам, документам, сообщениям чата и дефектам с учётом роли пользователя
+Args: event with httpMethod GET, headers (X-Auth-Token), queryStringParameters (q, types, limit, offset)
+Returns: JSON с ранжированными результатами и nextOffset для следующей страницы
+'''
+
+import json
+import os
+import psycopg2
+import jwt
+from typing import Dict, Any, Optional
+from psycopg2.extras import RealDictCursor
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-change-in-production')
+SCHEMA = 't_p8942561_contractor_control_s'
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_MIN_QUERY_LENGTH = 2
+SEARCH_MAX_QUERY_LENGTH = 200
+# Порог pg_trgm: ниже него триграммное совпадение не считается нечётким попаданием
+SEARCH_TRGM_THRESHOLD = 0.3
+SEARCH_TYPES = ('object', 'work', 'document', 'chat', 'defect')
+
+def get_db_connection():
+    conn = psycopg2.connect(DATABASE_URL)
+    return conn
+
+def verify_jwt_token(token: str) -> Dict[str, Any]:
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        raise ValueError('Token expired')
+    except jwt.InvalidTokenError:
+        raise ValueError('Invalid token')
+
+def json_response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(body, ensure_ascii=False, default=str)
+    }
+
+def visible_works_sql(cur, role: str, user_id: int) -> Optional[str]:
+    '''
+    SQL-условие на works (алиас w) с той же областью видимости, что и в user-data:
+    админ видит всё, подрядчик - свои работы, клиент - работы на своих объектах.
+    None - пользователю не видно ничего.
+    '''
+    if role == 'admin':
+        return 'TRUE'
+    if role == 'contractor':
+        cur.execute(f"SELECT id FROM {SCHEMA}.contractors WHERE user_id = {int(user_id)}")
+        contractor = cur.fetchone()
+        if not contractor:
+            return None
+        return f"w.contractor_id = {int(contractor['id'])}"
+    return f"w.object_id IN (SELECT id FROM {SCHEMA}.objects WHERE client_id = {int(user_id)})"
+
+def build_search_sql(types, works_scope: str, role: str, user_id: int) -> str:
+    '''
+    UNION ALL по типам сущностей. rank - максимум из ts_rank_cd и триграммного сходства,
+    поэтому опечатки в названиях находятся даже без совпадения по словоформам.
+    '''
+    if role == 'admin':
+        objects_scope = 'TRUE'
+    elif role == 'contractor':
+        objects_scope = f"o.id IN (SELECT w.object_id FROM {SCHEMA}.works w WHERE {works_scope})"
+    else:
+        objects_scope = f"o.client_id = {int(user_id)}"
+
+    parts = []
+    if 'object' in types:
+        parts.append(f"""
+            SELECT 'object' AS type, o.id, o.title, o.address AS body, NULL::integer AS work_id, o.id AS object_id,
+                   o.created_at,
+                   GREATEST(ts_rank_cd(o.search_vector, q.query),
+                            similarity(o.title, q.raw), similarity(coalesce(o.address, ''), q.raw)) AS rank
+            FROM {SCHEMA}.objects o, q
+            WHERE {objects_scope}
+              AND (o.search_vector @@ q.query OR o.title % q.raw OR o.address % q.raw)
+        """)
+    if 'work' in types:
+        parts.append(f"""
+            SELECT 'work', w.id, w.title, w.description, w.id, w.object_id, w.created_at,
+                   GREATEST(ts_rank_cd(w.search_vector, q.query), similarity(w.title, q.raw))
+            FROM {SCHEMA}.works w, q
+            WHERE {works_scope}
+              AND (w.search_vector @@ q.query OR w.title % q.raw)
+        """)
+    if 'document' in types:
+        parts.append(f"""
+            SELECT 'document', d.id, d.title, (d.content - 'html')::text, d.work_id, w.object_id, d.created_at,
+                   GREATEST(ts_rank_cd(d.search_vector, q.query), similarity(d.title, q.raw))
+            FROM {SCHEMA}.documents d
+            JOIN {SCHEMA}.works w ON d.work_id = w.id, q
+            WHERE {works_scope}
+              AND (d.search_vector @@ q.query OR d.title % q.raw)
+        """)
+    if 'chat' in types:
+        parts.append(f"""
+            SELECT 'chat', cm.id, NULL, cm.message, cm.work_id, w.object_id, cm.created_at,
+                   ts_rank_cd(cm.search_vector, q.query)
+            FROM {SCHEMA}.chat_messages cm
+            JOIN {SCHEMA}.works w ON cm.work_id = w.id, q
+            WHERE {works_scope}
+              AND cm.search_vector @@ q.query
+        """)
+    if 'defect' in types:
+        parts.append(f"""
+            SELECT 'defect', df.id, i.inspection_number, concat_ws('. ', df.description, df.location),
+                   i.work_id, w.object_id, df.created_at,
+                   ts_rank_cd(df.search_vector, q.query)
+            FROM {SCHEMA}.defects df
+            JOIN {SCHEMA}.inspections i ON df.inspection_id = i.id
+            JOIN {SCHEMA}.works w ON i.work_id = w.id, q
+            WHERE {works_scope}
+              AND df.search_vector @@ q.query
+        """)
+    return ' UNION ALL '.join(parts)
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    if method != 'GET':
+        return json_response(405, {'error': 'Method not allowed'})
+
+    headers = event.get('headers', {}) or {}
+    auth_header = headers.get('X-Auth-Token') or headers.get('x-auth-token')
+    if not auth_header:
+        return json_response(401, {'error': 'No token provided'})
+
+    try:
+        payload = verify_jwt_token(auth_header)
+        user_id = int(payload['user_id'])
+    except ValueError as e:
+        return json_response(401, {'error': str(e)})
+    except Exception:
+        return json_response(401, {'error': 'Invalid token'})
+
+    params = event.get('queryStringParameters', {}) or {}
+    search_query = (params.get('q') or '').strip()
+    if len(search_query) < SEARCH_MIN_QUERY_LENGTH or len(search_query) > SEARCH_MAX_QUERY_LENGTH:
+        return json_response(400, {
+            'error': f'q must be {SEARCH_MIN_QUERY_LENGTH}-{SEARCH_MAX_QUERY_LENGTH} characters'
+        })
+
+    types = [t for t in (params.get('types') or ','.join(SEARCH_TYPES)).split(',') if t]
+    unknown = [t for t in types if t not in SEARCH_TYPES]
+    if unknown:
+        return json_response(400, {'error': f"Unknown types: {', '.join(unknown)}"})
+
+    try:
+        limit = max(1, min(int(params.get('limit', SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE))
+        offset = max(0, int(params.get('offset', 0)))
+    except ValueError:
+        return json_response(400, {'error': 'Invalid limit or offset'})
+
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+
+        cur.execute(f"SELECT role, is_active FROM {SCHEMA}.users WHERE id = {user_id}")
+        user = cur.fetchone()
+        if not user or not user['is_active']:
+            return json_response(401, {'error': 'User not found or inactive'})
+
+        works_scope = visible_works_sql(cur, user['role'], user_id)
+        if works_scope is None:
+            return json_response(200, {'results': [], 'nextOffset': None})
+
+        query_safe = search_query.replace("'", "''")
+        # Сниппеты (ts_headline) считаются только для строк текущей страницы
+        cur.execute(f"""
+            SET LOCAL pg_trgm.similarity_threshold = {SEARCH_TRGM_THRESHOLD};
+            WITH q AS (
+                SELECT websearch_to_tsquery('russian', '{query_safe}') AS query, '{query_safe}'::text AS raw
+            ),
+            page AS (
+                {build_search_sql(types, works_scope, user['role'], user_id)}
+                ORDER BY rank DESC, created_at DESC, id DESC
+                LIMIT {limit + 1} OFFSET {offset}
+            )
+            SELECT page.type, page.id, page.title, page.work_id, page.object_id, page.created_at, page.rank,
+                   ts_headline('russian', coalesce(page.body, ''), q.query,
+                               'MaxWords=30, MinWords=10, MaxFragments=1') AS snippet
+            FROM page, q
+            ORDER BY page.rank DESC, page.created_at DESC, page.id DESC
+        """)
+        rows = cur.fetchall()
+        conn.commit()
+    finally:
+        conn.close()
+
+    has_more = len(rows) > limit
+    results = [{
+        'type': r['type'],
+        'id': r['id'],
+        'title': r['title'],
+        'snippet': r['snippet'],
+        'work_id': r['work_id'],
+        'object_id': r['object_id'],
+        'rank': round(float(r['rank']), 4),
+        'created_at': r['created_at'].isoformat() if r['created_at'] else None
+    } for r in rows[:limit]]
+
+    return json_response(200, {
+        'results': results,
+        'nextOffset': offset + limit if has_more else None
+    })
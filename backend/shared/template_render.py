@@ -0,0 +1,52 @@
+"""
+Подстановка contentData в HTML шаблонов документов
+Используется функциями documents и pdf-render, чтобы документ и его PDF рендерились одинаково
+"""
+
+import json
+import re
+import html as html_lib
+from typing import Any, Dict, List, Optional, Tuple
+
+# Плейсхолдеры шаблонов: {{key}} и [key], как в DocumentPreview/useDocumentUtils на клиенте
+TEMPLATE_PLACEHOLDER_RE = re.compile(r'\{\{\s*([^{}]+?)\s*\}\}|\[([^\[\]<>]+)\]')
+
+def compile_template(source: str) -> List[Tuple[str, Optional[str]]]:
+    """
+    Разбирает HTML шаблона один раз в список частей (текст, ключ):
+    для литералов ключ None, для плейсхолдеров - имя переменной из contentData
+    """
+    parts: List[Tuple[str, Optional[str]]] = []
+    position = 0
+    for match in TEMPLATE_PLACEHOLDER_RE.finditer(source):
+        if match.start() > position:
+            parts.append((source[position:match.start()], None))
+        parts.append((match.group(0), match.group(1) if match.group(1) is not None else match.group(2)))
+        position = match.end()
+    if position < len(source):
+        parts.append((source[position:], None))
+    return parts
+
+def format_template_value(value: Any) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, list) and all(not isinstance(v, (dict, list)) for v in value):
+        return html_lib.escape(', '.join(str(v) for v in value))
+    if isinstance(value, (dict, list)):
+        return html_lib.escape(json.dumps(value, ensure_ascii=False))
+    return html_lib.escape(str(value))
+
+def render_compiled_template(parts: List[Tuple[str, Optional[str]]], data: Dict[str, Any]) -> str:
+    """
+    Подставляет contentData; плейсхолдеры без значения в data остаются как есть
+    """
+    return ''.join(
+        format_template_value(data[key]) if key is not None and key in data else text
+        for text, key in parts
+    )
+
+def render_template_source(source: str, data: Dict[str, Any]) -> str:
+    """
+    Разбор и подстановка за один вызов - для шаблонов, которые не кешируются
+    """
+    return render_compiled_template(compile_template(source or ''), data)
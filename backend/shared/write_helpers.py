@@ -0,0 +1,129 @@
+"""
+Общие helpers для функций записи (create-data, documents, defect-reports, sync-mutations)
+Ключи идемпотентности (заголовок Idempotency-Key) и нормализация photo_urls перед записью
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+SCHEMA = 't_p8942561_contractor_control_s'
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_PURGE_BATCH = 500
+
+def _key_filter(scope: str, key: str, user_id: int) -> str:
+    key_safe = key.replace("'", "''")
+    return f"scope = '{scope}' AND user_id = {int(user_id)} AND idempotency_key = '{key_safe}'"
+
+def _fetch_dict(cur) -> Optional[Dict[str, Any]]:
+    """
+    Строка результата как dict - и для RealDictCursor, и для обычного курсора
+    """
+    row = cur.fetchone()
+    if row is None or isinstance(row, dict):
+        return row
+    return dict(zip([column[0] for column in cur.description], row))
+
+def purge_expired_idempotency_keys(cur) -> None:
+    """
+    Удаляет пачку просроченных ключей идемпотентности (не более IDEMPOTENCY_PURGE_BATCH за вызов)
+    """
+    cur.execute(f"""
+        DELETE FROM {SCHEMA}.idempotency_keys
+        WHERE id IN (
+            SELECT id FROM {SCHEMA}.idempotency_keys
+            WHERE expires_at < NOW()
+            ORDER BY expires_at
+            LIMIT {IDEMPOTENCY_PURGE_BATCH}
+        )
+    """)
+
+def claim_idempotency_key(cur, scope: str, key: str, user_id: int, request_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    Резервирует ключ пользователя в текущей транзакции
+    Возвращает None, если ключ новый (или просрочен), иначе сохранённую запись
+    {request_hash, status_code, response_body}
+    """
+    key_safe = key.replace("'", "''")
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.idempotency_keys (scope, idempotency_key, user_id, request_hash, expires_at)
+        VALUES ('{scope}', '{key_safe}', {int(user_id)}, '{request_hash}',
+                NOW() + INTERVAL '{IDEMPOTENCY_TTL_HOURS} hours')
+        ON CONFLICT (scope, user_id, idempotency_key) DO UPDATE
+        SET request_hash = EXCLUDED.request_hash,
+            status_code = NULL, response_body = NULL,
+            created_at = NOW(), expires_at = EXCLUDED.expires_at
+        WHERE {SCHEMA}.idempotency_keys.expires_at < NOW()
+        RETURNING id
+    """)
+    if cur.fetchone():
+        return None
+
+    cur.execute(f"""
+        SELECT request_hash, status_code, response_body
+        FROM {SCHEMA}.idempotency_keys
+        WHERE {_key_filter(scope, key, user_id)}
+    """)
+    return _fetch_dict(cur)
+
+def save_idempotent_response(cur, scope: str, key: str, user_id: int, status_code: int, response_body: str) -> None:
+    body_safe = response_body.replace("'", "''")
+    cur.execute(f"""
+        UPDATE {SCHEMA}.idempotency_keys
+        SET status_code = {int(status_code)}, response_body = '{body_safe}'
+        WHERE {_key_filter(scope, key, user_id)}
+    """)
+
+def release_idempotency_key(cur, scope: str, key: str, user_id: int) -> None:
+    """
+    Снимает резерв ключа, если запрос упал: повтор с тем же ключом выполнится заново
+    """
+    cur.execute(f"""
+        DELETE FROM {SCHEMA}.idempotency_keys
+        WHERE {_key_filter(scope, key, user_id)} AND response_body IS NULL
+    """)
+
+def idempotent_replay_response(stored: Dict[str, Any], request_hash: str, headers: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Ответ на повтор запроса с уже использованным ключом
+    """
+    if stored['request_hash'] != request_hash:
+        return {
+            'statusCode': 422,
+            'headers': headers,
+            'body': json.dumps({'success': False, 'error': 'Idempotency-Key already used for a different request'}),
+            'isBase64Encoded': False
+        }
+    if stored['response_body'] is None:
+        return {
+            'statusCode': 409,
+            'headers': headers,
+            'body': json.dumps({'success': False, 'error': 'Request with this Idempotency-Key is still in progress'}),
+            'isBase64Encoded': False
+        }
+    return {
+        'statusCode': stored['status_code'],
+        'headers': {**headers, 'Idempotent-Replayed': 'true'},
+        'body': stored['response_body'],
+        'isBase64Encoded': False
+    }
+
+def normalize_photo_urls(value: Any) -> List[str]:
+    """
+    photo_urls хранится JSONB-массивом. Клиенты присылают список, JSON-строку или URL через запятую -
+    приводим к списку строк один раз при записи
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith('['):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                value = value.split(',')
+        else:
+            value = value.split(',')
+    if not isinstance(value, list):
+        value = [value]
+    return [str(url).strip() for url in value if url and str(url).strip()]
@@ -0,0 +1,495 @@
+"""
+Business: Replay offline mutation queue (create/update) in one transaction with temporary ids
+Args: event with httpMethod POST, headers (X-Auth-Token, Idempotency-Key), body (mutations, atomic)
+Returns: HTTP response with id_map (temp_id -> id) and per-mutation results
+"""
+import json
+import os
+import time
+import uuid
+import hashlib
+import psycopg2
+import jwt
+from psycopg2.extras import RealDictCursor
+from shared.write_helpers import (
+    purge_expired_idempotency_keys, claim_idempotency_key, save_idempotent_response, idempotent_replay_response,
+    normalize_photo_urls
+)
+
+JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-change-in-production')
+SCHEMA = 't_p8942561_contractor_control_s'
+MAX_MUTATIONS = 500
+IDEMPOTENCY_SCOPE = 'sync-mutations'
+
+class MutationError(Exception):
+    pass
+
+class MutationConflict(MutationError):
+    '''expected_version не совпал с текущей версией строки; current - актуальная строка'''
+    def __init__(self, message, current):
+        super().__init__(message)
+        self.current = current
+
+def verify_jwt_token(token):
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        raise ValueError('Token expired')
+    except jwt.InvalidTokenError:
+        raise ValueError('Invalid token')
+
+def resolve_id(value, id_map):
+    '''Подставляет настоящий id вместо временного (temp_id из предыдущих мутаций пакета)'''
+    # temp_id регистрируется строкой, а ссылаться на него клиент может и числом (work_id: -1)
+    key = str(value)
+    if key in id_map:
+        return id_map[key]
+    if not key.lstrip('-').isdigit() or int(key) < 0:
+        raise MutationError(f'Unresolved temporary id: {value}')
+    return int(key)
+
+def validate_temp_id(temp_id, id_map):
+    '''temp_id не должен совпадать с настоящим id: только отрицательное число или строка не из цифр'''
+    key = str(temp_id)
+    if key.isdigit():
+        raise MutationError(f'temp_id must be negative or non-numeric: {temp_id}')
+    if key in id_map:
+        raise MutationError(f'Duplicate temp_id: {temp_id}')
+    return key
+
+def resolve_refs(data, id_map):
+    resolved = dict(data)
+    for key, value in data.items():
+        if (key == 'id' or key.endswith('_id')) and value is not None and value != '':
+            resolved[key] = resolve_id(value, id_map)
+    return resolved
+
+def escape(value):
+    return str(value).replace("'", "''")
+
+def create_work_log(cur, data, user_id):
+    work_id = int(data.get('work_id', 0))
+    photo_urls = normalize_photo_urls(data.get('photo_urls'))
+
+    fields = ['work_id', 'description', 'created_by', 'created_at']
+    values = [str(work_id), f"'{escape(data.get('description', ''))}'", str(user_id), 'NOW()']
+
+    if data.get('volume'):
+        fields.append('volume')
+        values.append(f"'{escape(data['volume'])}'")
+    if data.get('materials'):
+        fields.append('materials')
+        values.append(f"'{escape(data['materials'])}'")
+    if photo_urls:
+        fields.append('photo_urls')
+        values.append(f"'{escape(json.dumps(photo_urls, ensure_ascii=False))}'::jsonb")
+    if data.get('is_work_start'):
+        fields.append('is_work_start')
+        values.append('TRUE')
+    if data.get('inspection_id'):
+        fields.append('inspection_id')
+        values.append(str(int(data['inspection_id'])))
+    if data.get('defects_count') is not None:
+        fields.append('defects_count')
+        values.append(str(int(data['defects_count'])))
+    if data.get('progress') is not None:
+        fields.append('progress')
+        values.append(str(int(data['progress'])))
+
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.work_logs ({', '.join(fields)})
+        VALUES ({', '.join(values)})
+        RETURNING id, work_id, description, volume, materials, photo_urls, created_at, created_by
+    """)
+    return cur.fetchone()
+
+def create_inspection(cur, data, user_id):
+    work_id = int(data.get('work_id', 0))
+    inspection_type = escape(data.get('type', 'unscheduled'))
+    status = escape(data.get('status', 'draft'))
+
+    cur.execute(f"""
+        SELECT COALESCE(MAX(CAST(SUBSTRING(inspection_number FROM 'INS-{work_id}-(\\d+)') AS INTEGER)), 0) + 1 as next_num
+        FROM {SCHEMA}.inspections
+        WHERE work_id = {work_id}
+    """)
+    next_number_row = cur.fetchone()
+    next_number = next_number_row['next_num'] if next_number_row and next_number_row['next_num'] else 1
+
+    fields = ['work_id', 'inspection_number', 'type', 'status', 'created_by', 'created_at']
+    values = [str(work_id), f"'INS-{work_id}-{next_number}'", f"'{inspection_type}'", f"'{status}'", str(user_id), 'NOW()']
+
+    if data.get('scheduled_date'):
+        fields.append('scheduled_date')
+        values.append(f"'{escape(data['scheduled_date'])}'")
+
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.inspections ({', '.join(fields)})
+        VALUES ({', '.join(values)})
+        RETURNING id, work_id, inspection_number, type, status, scheduled_date, created_by, created_at
+    """)
+    return cur.fetchone()
+
+def create_chat_message(cur, data, user_id):
+    work_id = int(data.get('work_id', 0))
+    photo_urls = normalize_photo_urls(data.get('photo_urls'))
+
+    fields = ['work_id', 'message', 'message_type', 'created_by', 'created_at']
+    values = [str(work_id), f"'{escape(data.get('message', ''))}'", f"'{escape(data.get('message_type', 'text'))}'", str(user_id), 'NOW()']
+
+    if photo_urls:
+        fields.append('photo_urls')
+        values.append(f"'{escape(json.dumps(photo_urls, ensure_ascii=False))}'::jsonb")
+
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.chat_messages ({', '.join(fields)})
+        VALUES ({', '.join(values)})
+        RETURNING id, work_id, message, message_type, photo_urls, created_at, created_by
+    """)
+    return cur.fetchone()
+
+# Поля замечания, хранящиеся в отдельных колонках defects; остальные ключи попадают в extra
+DEFECT_COLUMNS = ('description', 'location', 'severity', 'status', 'responsible', 'deadline', 'photo_urls')
+
+def replace_defects(cur, inspection_id, defects):
+    '''Полная замена замечаний проверки в таблице defects с сохранением defect_id (как в update-data)'''
+    if isinstance(defects, str):
+        try:
+            defects = json.loads(defects) if defects.strip() else []
+        except ValueError:
+            raise MutationError('defects must be valid JSON')
+    if not isinstance(defects, list) or any(not isinstance(d, dict) for d in defects):
+        raise MutationError('defects must be a list of objects')
+
+    defects = [
+        {**d, 'id': str(d['id']) if d.get('id') not in (None, '') else uuid.uuid4().hex}
+        for d in defects
+    ]
+
+    ids_sql = ', '.join(f"'{escape(d['id'])}'" for d in defects)
+    cur.execute(f"""
+        DELETE FROM {SCHEMA}.defects
+        WHERE inspection_id = {int(inspection_id)}
+        {f"AND defect_id NOT IN ({ids_sql})" if ids_sql else ''}
+    """)
+    if not defects:
+        return
+
+    known_keys = ', '.join(f"'{k}'" for k in ('id',) + DEFECT_COLUMNS)
+    updates = ', '.join(f"{c} = EXCLUDED.{c}" for c in DEFECT_COLUMNS + ('position', 'extra'))
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.defects
+            (inspection_id, defect_id, position, description, location, severity, status,
+             responsible, deadline, photo_urls, extra)
+        SELECT {int(inspection_id)}, e->>'id', n,
+               e->>'description', e->>'location', e->>'severity', COALESCE(NULLIF(e->>'status', ''), 'open'),
+               e->>'responsible', e->>'deadline', e->'photo_urls', e - ARRAY[{known_keys}]
+        FROM jsonb_array_elements('{escape(json.dumps(defects, ensure_ascii=False))}'::jsonb) WITH ORDINALITY AS t(e, n)
+        ON CONFLICT (inspection_id, defect_id) DO UPDATE SET {updates}, updated_at = NOW()
+    """)
+
+def update_inspection(cur, item_id, data, user_id, is_admin):
+    update_parts = []
+
+    if 'status' in data:
+        update_parts.append(f"status = '{escape(data['status'])}'")
+    for column in ('completed_at', 'scheduled_date'):
+        if column in data:
+            update_parts.append(f"{column} = '{escape(data[column])}'" if data[column] else f"{column} = NULL")
+    if 'defect_report_document_id' in data:
+        doc_id = data['defect_report_document_id']
+        update_parts.append(f"defect_report_document_id = {int(doc_id)}" if doc_id else "defect_report_document_id = NULL")
+
+    if not update_parts and 'defects' not in data:
+        raise MutationError('No fields to update')
+
+    returning = 'id, work_id, inspection_number, type, status, scheduled_date, completed_at, defect_report_document_id'
+    if update_parts:
+        cur.execute(f"""
+            UPDATE {SCHEMA}.inspections
+            SET {', '.join(update_parts)}
+            WHERE id = {int(item_id)}
+            RETURNING {returning}
+        """)
+    else:
+        cur.execute(f"SELECT {returning} FROM {SCHEMA}.inspections WHERE id = {int(item_id)} FOR UPDATE")
+    row = cur.fetchone()
+    if not row:
+        raise MutationError('Inspection not found')
+
+    # Замечания хранятся строками в defects, а не JSON-массивом в inspections
+    if 'defects' in data:
+        replace_defects(cur, row['id'], data['defects'])
+    return row
+
+def update_work(cur, item_id, data, user_id, is_admin):
+    changes = []
+
+    for column in ('title', 'description', 'status'):
+        if column in data:
+            changes.append((column, f"'{escape(data[column] or '')}'"))
+    if 'contractor_id' in data:
+        changes.append(('contractor_id', str(int(data['contractor_id'])) if data['contractor_id'] else 'NULL'))
+    for column in ('planned_start_date', 'planned_end_date', 'start_date', 'end_date'):
+        if column in data:
+            changes.append((column, f"'{escape(data[column])}'::date" if data[column] else 'NULL'))
+    if data.get('completion_percentage') is not None:
+        changes.append(('completion_percentage', str(int(data['completion_percentage']))))
+
+    if not changes:
+        raise MutationError('No fields to update')
+
+    work_filter = f"WHERE id = {int(item_id)}" if is_admin else f"""WHERE id = {int(item_id)} AND object_id IN (
+        SELECT o.id FROM {SCHEMA}.objects o
+        JOIN {SCHEMA}.projects p ON o.project_id = p.id
+        WHERE p.client_id = {user_id}
+    )"""
+
+    expected_version = data.get('expected_version')
+    version_filter = f"AND version = {int(expected_version)}" if expected_version is not None else ''
+    returning_sql = 'id, title, status, completion_percentage, version, updated_at'
+
+    cur.execute(f"""
+        UPDATE {SCHEMA}.works
+        SET {', '.join(f"{column} = {value}" for column, value in changes)}, version = version + 1, updated_at = NOW()
+        {work_filter} {version_filter}
+        RETURNING {returning_sql}
+    """)
+    row = cur.fetchone()
+    if not row:
+        cur.execute(f"SELECT {returning_sql} FROM {SCHEMA}.works {work_filter}")
+        current = cur.fetchone()
+        if not current:
+            raise MutationError('Work not found or access denied')
+        # Как в update-data: правка поверх чужого изменения не применяется
+        raise MutationConflict('Work was modified by another user', current)
+    return row
+
+CREATE_HANDLERS = {
+    'work_log': create_work_log,
+    'inspection': create_inspection,
+    'chat_message': create_chat_message,
+}
+
+UPDATE_HANDLERS = {
+    'inspection': update_inspection,
+    'work': update_work,
+}
+
+def apply_mutation(cur, mutation, id_map, user_id, is_admin):
+    action = mutation.get('action', 'create')
+    item_type = (mutation.get('type') or '').lower()
+    data = resolve_refs(mutation.get('data') or {}, id_map)
+
+    if action == 'create':
+        create = CREATE_HANDLERS.get(item_type)
+        if not create:
+            raise MutationError(f'Unsupported create type: {item_type}')
+        temp_id = mutation.get('temp_id')
+        temp_key = validate_temp_id(temp_id, id_map) if temp_id else None
+        row = create(cur, data, user_id)
+        if temp_key:
+            id_map[temp_key] = row['id']
+        return row
+
+    if action == 'update':
+        update = UPDATE_HANDLERS.get(item_type)
+        if not update:
+            raise MutationError(f'Unsupported update type: {item_type}')
+        if mutation.get('id') is None:
+            raise MutationError('id is required for update')
+        item_id = resolve_id(mutation['id'], id_map)
+        if mutation.get('expected_version') is not None:
+            data = {**data, 'expected_version': mutation['expected_version']}
+        return update(cur, item_id, data, user_id, is_admin)
+
+    raise MutationError(f'Unknown action: {action}')
+
+def serialize_row(row):
+    result = dict(row) if row else {}
+    for key, value in result.items():
+        if hasattr(value, 'isoformat'):
+            result[key] = value.isoformat()
+    return result
+
+def handler(event, context):
+    method = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-User-Id, Idempotency-Key',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'success': False, 'error': 'Method not allowed'})
+        }
+
+    headers = event.get('headers', {})
+    auth_token = headers.get('X-Auth-Token') or headers.get('x-auth-token')
+
+    if not auth_token:
+        return {
+            'statusCode': 401,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'success': False, 'error': 'Auth token required'})
+        }
+
+    try:
+        payload = verify_jwt_token(auth_token)
+        user_id_int = payload['user_id']
+        user_role = payload.get('role')
+    except ValueError as e:
+        return {
+            'statusCode': 401,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'success': False, 'error': str(e)})
+        }
+    except Exception:
+        return {
+            'statusCode': 401,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'success': False, 'error': 'Invalid token'})
+        }
+
+    raw_body = event.get('body') or '{}'
+    body = json.loads(raw_body)
+    mutations = body.get('mutations')
+    # atomic=true: любая ошибка откатывает весь пакет; иначе откатывается только ошибочная мутация
+    atomic = bool(body.get('atomic', False))
+
+    if not isinstance(mutations, list) or not mutations:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'success': False, 'error': 'mutations list required'})
+        }
+
+    if len(mutations) > MAX_MUTATIONS:
+        return {
+            'statusCode': 413,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'success': False, 'error': f'Too many mutations (max {MAX_MUTATIONS})'})
+        }
+
+    idempotency_key = headers.get('Idempotency-Key') or headers.get('idempotency-key')
+    if idempotency_key and len(idempotency_key) > 255:
+        return {
+            'statusCode': 400,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'success': False, 'error': 'Idempotency-Key is too long'})
+        }
+
+    dsn = os.environ.get('DATABASE_URL')
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        if idempotency_key:
+            purge_expired_idempotency_keys(cur)
+            conn.commit()
+
+            request_hash = hashlib.sha256(raw_body.encode('utf-8')).hexdigest()
+            stored = claim_idempotency_key(cur, IDEMPOTENCY_SCOPE, idempotency_key, user_id_int, request_hash)
+            if stored:
+                conn.rollback()
+                cur.close()
+                conn.close()
+                return idempotent_replay_response(stored, request_hash, {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'})
+
+        is_admin = user_role == 'admin'
+        id_map = {}
+        results = []
+        started_at = time.time()
+
+        for index, mutation in enumerate(mutations):
+            result = {'index': index, 'client_id': mutation.get('client_id') if isinstance(mutation, dict) else None}
+
+            if not isinstance(mutation, dict):
+                result.update({'status': 'error', 'error': 'Mutation must be an object'})
+                results.append(result)
+                if atomic:
+                    break
+                continue
+
+            cur.execute('SAVEPOINT mutation')
+            try:
+                row = apply_mutation(cur, mutation, id_map, user_id_int, is_admin)
+                cur.execute('RELEASE SAVEPOINT mutation')
+                result.update({'status': 'ok', 'id': row['id'], 'data': serialize_row(row)})
+                if mutation.get('temp_id'):
+                    result['temp_id'] = mutation['temp_id']
+            except MutationConflict as e:
+                cur.execute('ROLLBACK TO SAVEPOINT mutation')
+                result.update({'status': 'conflict', 'error': str(e), 'data': serialize_row(e.current)})
+            except (MutationError, psycopg2.Error, ValueError, TypeError) as e:
+                cur.execute('ROLLBACK TO SAVEPOINT mutation')
+                result.update({'status': 'error', 'error': str(e).strip()})
+
+            results.append(result)
+            if atomic and result['status'] in ('error', 'conflict'):
+                break
+
+        failed = [r for r in results if r['status'] in ('error', 'conflict')]
+
+        if atomic and failed:
+            conn.rollback()
+            # Оставшиеся мутации не выполнялись
+            for index in range(len(results), len(mutations)):
+                results.append({'index': index, 'client_id': mutations[index].get('client_id') if isinstance(mutations[index], dict) else None, 'status': 'skipped'})
+            for r in results:
+                if r['status'] == 'ok':
+                    r.update({'status': 'rolled_back', 'data': None})
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 409,
+                'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                'body': json.dumps({'success': False, 'error': 'Batch rolled back', 'id_map': {}, 'results': results})
+            }
+
+        print(f"sync-mutations: user={user_id_int} applied={len(results) - len(failed)} failed={len(failed)} in {time.time() - started_at:.3f}s")
+
+        response_body = json.dumps({
+            'success': not failed,
+            'id_map': id_map,
+            'results': results
+        }, default=str)
+
+        if idempotency_key:
+            save_idempotent_response(cur, IDEMPOTENCY_SCOPE, idempotency_key, user_id_int, 200, response_body)
+
+        conn.commit()
+        cur.close()
+        conn.close()
+
+        return {
+            'statusCode': 200,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': response_body
+        }
+
+    except Exception as e:
+        import traceback
+        print(f"ERROR: {traceback.format_exc()}")
+        try:
+            if conn and not conn.closed:
+                conn.rollback()
+                cur.close()
+                conn.close()
+        except Exception:
+            pass
+        return {
+            'statusCode': 500,
+            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+            'body': json.dumps({'success': False, 'error': str(e)})
+        }
@@ -5,6 +5,7 @@ Returns: HTTP response with result or error
 """
 import json
 import os
+import uuid
 import psycopg2
 import jwt
 from psycopg2.extras import RealDictCursor
@@ -20,6 +21,154 @@ def verify_jwt_token(token):
     except jwt.InvalidTokenError:
         raise ValueError('Invalid token')
 
+# Поля замечания, хранящиеся в отдельных колонках defects; остальные ключи попадают в extra
+DEFECT_COLUMNS = ('description', 'location', 'severity', 'status', 'responsible', 'deadline', 'photo_urls')
+
+def defects_json_sql(inspection_ref):
+    '''Собирает замечания проверки в JSON-текст прежнего формата inspections.defects'''
+    fields = ', '.join(f"'{c}', df.{c}" for c in DEFECT_COLUMNS)
+    return f"""(SELECT COALESCE(jsonb_agg(
+                    df.extra || jsonb_strip_nulls(jsonb_build_object('id', df.defect_id, {fields}))
+                    ORDER BY df.position, df.id), '[]'::jsonb)::text
+                FROM {SCHEMA}.defects df WHERE df.inspection_id = {inspection_ref})"""
+
+def defect_insert_sql(inspection_id, defects, position_base):
+    '''INSERT ... SELECT строк defects из JSON-массива замечаний; position_base - SQL-выражение начальной позиции'''
+    defects_json = json.dumps(defects, ensure_ascii=False).replace("'", "''")
+    known_keys = ', '.join(f"'{k}'" for k in ('id',) + DEFECT_COLUMNS)
+    return f"""
+        INSERT INTO {SCHEMA}.defects
+            (inspection_id, defect_id, position, description, location, severity, status,
+             responsible, deadline, photo_urls, extra)
+        SELECT {int(inspection_id)}, e->>'id', ({position_base}) + n,
+               e->>'description', e->>'location', e->>'severity', COALESCE(NULLIF(e->>'status', ''), 'open'),
+               e->>'responsible', e->>'deadline', e->'photo_urls', e - ARRAY[{known_keys}]
+        FROM jsonb_array_elements('{defects_json}'::jsonb) WITH ORDINALITY AS t(e, n)
+    """
+
+def with_defect_ids(defects):
+    '''Проставляет id замечаниям без него (как раньше делал клиент) и приводит id к строке'''
+    result = []
+    for defect in defects:
+        if not isinstance(defect, dict):
+            raise ValueError('defects must be a list of objects')
+        defect = dict(defect)
+        if defect.get('id') is None or defect.get('id') == '':
+            defect['id'] = uuid.uuid4().hex
+        defect['id'] = str(defect['id'])
+        result.append(defect)
+    return result
+
+def replace_defects(cur, inspection_id, defects):
+    '''
+    Полная замена замечаний проверки: удаляет отсутствующие в списке, остальные вставляет
+    или обновляет по (inspection_id, defect_id), чтобы ссылки из defect_remediations не терялись.
+    '''
+    if isinstance(defects, str):
+        defects = json.loads(defects) if defects.strip() else []
+    if not isinstance(defects, list):
+        raise ValueError('defects must be a list')
+    defects = with_defect_ids(defects)
+    
+    ids_sql = ', '.join("'" + d['id'].replace("'", "''") + "'" for d in defects)
+    cur.execute(f"""
+        DELETE FROM {SCHEMA}.defects
+        WHERE inspection_id = {int(inspection_id)}
+        {f"AND defect_id NOT IN ({ids_sql})" if ids_sql else ''}
+    """)
+    if not defects:
+        return []
+    
+    updates = ', '.join(f"{c} = EXCLUDED.{c}" for c in DEFECT_COLUMNS + ('position', 'extra'))
+    cur.execute(defect_insert_sql(inspection_id, defects, '0') + f"""
+        ON CONFLICT (inspection_id, defect_id) DO UPDATE SET {updates}, updated_at = NOW()
+    """)
+    return [d['id'] for d in defects]
+
+def apply_defect_ops(cur, inspection_id, ops):
+    '''
+    Применяет операции add/update/remove к строкам defects: клиент передаёт только
+    изменённое замечание, а не весь массив. Возвращает id затронутых замечаний.
+    '''
+    if not isinstance(ops, list) or not ops:
+        raise ValueError('defect_ops must be a non-empty list')
+    
+    # Сначала проверяем все операции, чтобы не записать часть пачки
+    parsed = []
+    for op in ops:
+        op_type = op.get('op') if isinstance(op, dict) else None
+        
+        if op_type == 'add':
+            defect = op.get('defect')
+            if not isinstance(defect, dict):
+                raise ValueError('add requires defect object')
+            parsed.append(('add', with_defect_ids([defect])[0]))
+        
+        elif op_type in ('update', 'remove'):
+            defect_id = op.get('id')
+            if defect_id is None or defect_id == '':
+                raise ValueError(f'{op_type} requires defect id')
+            fields = None
+            if op_type == 'update':
+                fields = op.get('defect')
+                if not isinstance(fields, dict):
+                    raise ValueError('update requires defect object')
+            parsed.append((op_type, str(defect_id), fields))
+        
+        else:
+            raise ValueError(f"Unknown defect op: {op_type}")
+    
+    defect_ids = []
+    for item in parsed:
+        if item[0] == 'add':
+            defect = item[1]
+            defect_ids.append(defect['id'])
+            position_base = f"SELECT COALESCE(MAX(position), 0) FROM {SCHEMA}.defects WHERE inspection_id = {int(inspection_id)}"
+            cur.execute(defect_insert_sql(inspection_id, [defect], position_base) + f"""
+                ON CONFLICT (inspection_id, defect_id) DO NOTHING
+                RETURNING defect_id
+            """)
+            if not cur.fetchone():
+                raise ValueError(f"Defect {defect['id']} already exists")
+            continue
+        
+        op_type, defect_id, fields = item
+        defect_ids.append(defect_id)
+        id_safe = defect_id.replace("'", "''")
+        where = f"inspection_id = {int(inspection_id)} AND defect_id = '{id_safe}'"
+        
+        if op_type == 'remove':
+            cur.execute(f"DELETE FROM {SCHEMA}.defects WHERE {where}")
+            if cur.rowcount == 0:
+                raise ValueError(f"Defect {defect_id} not found")
+            continue
+        
+        set_parts = []
+        extra = {}
+        for key, value in fields.items():
+            if key == 'id':
+                continue
+            if key == 'photo_urls':
+                value_json = json.dumps(value, ensure_ascii=False).replace("'", "''")
+                set_parts.append(f"photo_urls = '{value_json}'::jsonb")
+            elif key in DEFECT_COLUMNS:
+                if value is None:
+                    set_parts.append("status = 'open'" if key == 'status' else f"{key} = NULL")
+                else:
+                    value_safe = str(value).replace("'", "''")
+                    set_parts.append(f"{key} = '{value_safe}'")
+            else:
+                extra[key] = value
+        if extra:
+            extra_json = json.dumps(extra, ensure_ascii=False).replace("'", "''")
+            set_parts.append(f"extra = extra || '{extra_json}'::jsonb")
+        set_parts.append("updated_at = NOW()")
+        cur.execute(f"UPDATE {SCHEMA}.defects SET {', '.join(set_parts)} WHERE {where}")
+        if cur.rowcount == 0:
+            raise ValueError(f"Defect {defect_id} not found")
+    
+    return defect_ids
+
 def handler(event, context):
     method = event.get('httpMethod', 'PUT')
     
@@ -286,29 +435,34 @@ def handler(event, context):
                 result = {'success': True, 'data': dict(result_row)}
                 
             elif item_type == 'work':
-                title = data.get('title', '').replace("'", "''")
-                description = data.get('description', '').replace("'", "''")
-                status = data.get('status', 'pending')
-                contractor_id = data.get('contractor_id')
-                planned_start_date = data.get('planned_start_date')
-                planned_end_date = data.get('planned_end_date')
-                completion_percentage = data.get('completion_percentage')
-                
-                update_parts = [f"title = '{title}'", f"description = '{description}'", f"status = '{status}'"]
+                # PATCH-семантика: обновляем только переданные поля
+                changes = []
                 
-                if contractor_id is not None:
-                    update_parts.append(f"contractor_id = {int(contractor_id)}" if contractor_id else "contractor_id = NULL")
+                for column in ('title', 'description', 'status'):
+                    if column in data:
+                        value = (data[column] or '').replace("'", "''")
+                        changes.append((column, f"'{value}'"))
                 
-                if planned_start_date:
-                    update_parts.append(f"planned_start_date = '{planned_start_date}'")
+                if 'contractor_id' in data:
+                    contractor_id = data['contractor_id']
+                    changes.append(('contractor_id', str(int(contractor_id)) if contractor_id else 'NULL'))
                 
-                if planned_end_date:
-                    update_parts.append(f"planned_end_date = '{planned_end_date}'")
+                for column in ('planned_start_date', 'planned_end_date', 'start_date', 'end_date'):
+                    if column in data:
+                        value = data[column]
+                        changes.append((column, f"'{value}'::date" if value else 'NULL'))
                 
-                if completion_percentage is not None:
-                    update_parts.append(f"completion_percentage = {int(completion_percentage)}")
+                if data.get('completion_percentage') is not None:
+                    changes.append(('completion_percentage', str(int(data['completion_percentage']))))
                 
-                update_sql = ', '.join(update_parts)
+                if not changes:
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': 'No fields to update'})
+                    }
                 
                 work_filter = f"WHERE id = {int(item_id)}" if is_admin else f"""WHERE id = {int(item_id)} AND object_id IN (
                     SELECT o.id FROM {SCHEMA}.objects o 
@@ -316,21 +470,48 @@ def handler(event, context):
                     WHERE p.client_id = {user_id_int}
                 )"""
                 
+                expected_version = body.get('expected_version')
+                version_filter = f"AND version = {int(expected_version)}" if expected_version is not None else ''
+                
+                # Строку не переписываем, если значения не изменились (нет лишних версий строк и обновлений индексов)
+                set_sql = ', '.join(f"{column} = {value}" for column, value in changes)
+                changed_sql = ' OR '.join(f"{column} IS DISTINCT FROM {value}" for column, value in changes)
+                returning_sql = """id, title, description, object_id, contractor_id, status, 
+                              planned_start_date, planned_end_date, start_date, end_date,
+                              completion_percentage, version, created_at, updated_at"""
+                
                 cur.execute(f"""
                     UPDATE {SCHEMA}.works 
-                    SET {update_sql}
-                    {work_filter}
-                    RETURNING id, title, description, object_id, contractor_id, status, 
-                              planned_start_date, planned_end_date, completion_percentage, created_at
+                    SET {set_sql}, version = version + 1, updated_at = NOW()
+                    {work_filter} {version_filter} AND ({changed_sql})
+                    RETURNING {returning_sql}
                 """)
                 
                 result_row = cur.fetchone()
                 if not result_row:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
-                        'body': json.dumps({'success': False, 'error': 'Work not found or access denied'})
-                    }
+                    cur.execute(f"SELECT {returning_sql} FROM {SCHEMA}.works {work_filter}")
+                    current_row = cur.fetchone()
+                    
+                    if not current_row:
+                        return {
+                            'statusCode': 404,
+                            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                            'body': json.dumps({'success': False, 'error': 'Work not found or access denied'})
+                        }
+                    
+                    if expected_version is not None and current_row['version'] != int(expected_version):
+                        return {
+                            'statusCode': 409,
+                            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                            'body': json.dumps({
+                                'success': False,
+                                'error': 'Work was modified by another user',
+                                'data': dict(current_row)
+                            }, default=str)
+                        }
+                    
+                    # Значения уже совпадают — возвращаем текущую строку без записи
+                    result_row = current_row
                 
                 conn.commit()
                 result = {'success': True, 'data': dict(result_row)}
@@ -342,10 +523,43 @@ def handler(event, context):
                     status = data['status'].replace("'", "''")
                     update_parts.append(f"status = '{status}'")
                 
-                if 'defects' in data:
-                    defects = data['defects'].replace("'", "''") if isinstance(data['defects'], str) else json.dumps(data['defects'], ensure_ascii=False).replace("'", "''")
-                    update_parts.append(f"defects = '{defects}'::jsonb")
+                if 'defects' in data and 'defect_ops' in data:
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': 'Use either defects or defect_ops'})
+                    }
                 
+                # Замечания живут в таблице defects: полная замена (defects) или
+                # точечные изменения [{op: add|update|remove, id, defect}] (defect_ops)
+                defect_ids = None
+                if 'defects' in data or 'defect_ops' in data:
+                    cur.execute(f"SELECT id FROM {SCHEMA}.inspections WHERE id = {int(item_id)} FOR UPDATE")
+                    if not cur.fetchone():
+                        cur.close()
+                        conn.close()
+                        return {
+                            'statusCode': 404,
+                            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                            'body': json.dumps({'success': False, 'error': 'Inspection not found'})
+                        }
+                    try:
+                        if 'defects' in data:
+                            replace_defects(cur, int(item_id), data['defects'])
+                        else:
+                            defect_ids = apply_defect_ops(cur, int(item_id), data['defect_ops'])
+                    except ValueError as e:
+                        conn.rollback()
+                        cur.close()
+                        conn.close()
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
+                            'body': json.dumps({'success': False, 'error': str(e)})
+                        }
+
                 if 'completed_at' in data:
                     completed_at = data['completed_at'].replace("'", "''") if data['completed_at'] else 'NULL'
                     if completed_at == 'NULL':
@@ -367,7 +581,7 @@ def handler(event, context):
                     else:
                         update_parts.append(f"defect_report_document_id = {int(doc_id)}")
                 
-                if not update_parts:
+                if not update_parts and 'defects' not in data and 'defect_ops' not in data:
                     cur.close()
                     conn.close()
                     return {
@@ -375,15 +589,23 @@ def handler(event, context):
                         'headers': {'Access-Control-Allow-Origin': '*', 'Content-Type': 'application/json'},
                         'body': json.dumps({'success': False, 'error': 'No fields to update'})
                     }
-                
-                update_sql = ', '.join(update_parts)
-                
-                cur.execute(f"""
-                    UPDATE {SCHEMA}.inspections 
-                    SET {update_sql}
-                    WHERE id = {int(item_id)}
-                    RETURNING id, work_id, inspection_number, type, status, defects, scheduled_date, completed_at, defect_report_document_id, created_by, created_at
-                """)
+
+                # При точечных изменениях не возвращаем весь массив замечаний, только их количество
+                if 'defect_ops' in data:
+                    defects_returning = f"(SELECT COUNT(*) FROM {SCHEMA}.defects df WHERE df.inspection_id = inspections.id) AS defects_count"
+                else:
+                    defects_returning = f"{defects_json_sql('inspections.id')} AS defects"
+                returning = f"id, work_id, inspection_number, type, status, {defects_returning}, scheduled_date, completed_at, defect_report_document_id, created_by, created_at"
+
+                if update_parts:
+                    cur.execute(f"""
+                        UPDATE {SCHEMA}.inspections
+                        SET {', '.join(update_parts)}
+                        WHERE id = {int(item_id)}
+                        RETURNING {returning}
+                    """)
+                else:
+                    cur.execute(f"SELECT {returning} FROM {SCHEMA}.inspections WHERE id = {int(item_id)}")
                 
                 result_row = cur.fetchone()
                 if not result_row:
@@ -395,6 +617,8 @@ def handler(event, context):
                 
                 conn.commit()
                 result = {'success': True, 'data': dict(result_row)}
+                if defect_ids is not None:
+                    result['data']['defect_ids'] = defect_ids
             
             else:
                 cur.close()
@@ -15,6 +15,8 @@ from collections import defaultdict
 DATABASE_URL = os.environ.get('DATABASE_URL')
 JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-change-in-production')
 SCHEMA = 't_p8942561_contractor_control_s'
+# Размер превью из photos.thumbnails, который отдаётся в списках вместо оригинала
+LIST_THUMBNAIL_SIZE = 'sm'
 
 def get_db_connection():
     conn = psycopg2.connect(DATABASE_URL)
@@ -28,6 +30,27 @@ def verify_jwt_token(token: str) -> Dict[str, Any]:
     except jwt.InvalidTokenError:
         raise ValueError('Invalid token')
 
+def attach_photo_thumbnails(cur, collections: List[tuple]) -> None:
+    '''
+    Добавляет к строкам photo_thumbnails (превью в том же порядке, что и оригиналы) одной выборкой
+    из photos на весь ответ. collections - пары (строки, поле с оригиналами).
+    Фото без превью (загруженные в обход photo-upload) отдаются оригиналом.
+    '''
+    urls = {u for rows, field in collections for row in rows
+            for u in (row.get(field) or []) if isinstance(u, str) and u}
+    thumbnails = {}
+    if urls:
+        urls_sql = ', '.join("'" + u.replace("'", "''") + "'" for u in urls)
+        cur.execute(f"""
+            SELECT original_url, thumbnails->>'{LIST_THUMBNAIL_SIZE}' AS thumbnail_url
+            FROM {SCHEMA}.photos
+            WHERE original_url IN ({urls_sql})
+        """)
+        thumbnails = {row['original_url']: row['thumbnail_url'] for row in cur.fetchall() if row['thumbnail_url']}
+    for rows, field in collections:
+        for row in rows:
+            row['photo_thumbnails'] = [thumbnails.get(u, u) for u in (row.get(field) or [])]
+
 def build_hierarchy(objects: List[Dict], works: List[Dict], inspections: List[Dict], 
                      remarks: List[Dict], work_logs: List[Dict], chat_messages: List[Dict],
                      defect_reports: List[Dict], defect_remediations: List[Dict]) -> List[Dict]:
@@ -173,7 +196,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             cur.execute(f"""
                 SELECT w.id, w.title, w.description, w.object_id, w.contractor_id,
                        o.name as contractor_name, w.status, w.start_date, w.end_date,
-                       w.planned_start_date, w.planned_end_date, w.completion_percentage,
+                       w.planned_start_date, w.planned_end_date, w.completion_percentage, w.version,
                        w.created_at, w.updated_at
                 FROM {SCHEMA}.works w
                 LEFT JOIN {SCHEMA}.organizations o ON w.contractor_id = o.id
@@ -205,7 +228,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 cur.execute(f"""
                     SELECT w.id, w.title, w.description, w.object_id, w.contractor_id,
                            o.name as contractor_name, w.status, w.start_date, w.end_date,
-                           w.planned_start_date, w.planned_end_date, w.completion_percentage,
+                           w.planned_start_date, w.planned_end_date, w.completion_percentage, w.version,
                            w.created_at, w.updated_at
                     FROM {SCHEMA}.works w
                     LEFT JOIN {SCHEMA}.organizations o ON w.contractor_id = o.id
@@ -232,7 +255,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 cur.execute(f"""
                     SELECT w.id, w.title, w.description, w.object_id, w.contractor_id,
                            o.name as contractor_name, w.status, w.start_date, w.end_date,
-                           w.planned_start_date, w.planned_end_date, w.completion_percentage,
+                           w.planned_start_date, w.planned_end_date, w.completion_percentage, w.version,
                            w.created_at, w.updated_at
                     FROM {SCHEMA}.works w
                     LEFT JOIN {SCHEMA}.organizations o ON w.contractor_id = o.id
@@ -259,9 +282,16 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             # Загружаем inspections с автором
             cur.execute(f"""
                 SELECT i.id, i.work_id, i.work_log_id, i.inspection_number, i.created_by, i.status,
-                       i.notes, i.description, i.defects, i.photo_urls, i.created_at, i.completed_at,
+                       i.notes, i.description, i.photo_urls, i.created_at, i.completed_at,
                        i.scheduled_date, i.title, i.type, i.defect_report_document_id,
-                       u.name as author_name, u.role as author_role
+                       u.name as author_name, u.role as author_role,
+                       (SELECT COALESCE(jsonb_agg(
+                                   df.extra || jsonb_strip_nulls(jsonb_build_object(
+                                       'id', df.defect_id, 'description', df.description, 'location', df.location,
+                                       'severity', df.severity, 'status', df.status, 'responsible', df.responsible,
+                                       'deadline', df.deadline, 'photo_urls', df.photo_urls))
+                                   ORDER BY df.position, df.id), '[]'::jsonb)::text
+                        FROM {SCHEMA}.defects df WHERE df.inspection_id = i.id) as defects
                 FROM {SCHEMA}.inspections i
                 LEFT JOIN {SCHEMA}.users u ON i.created_by = u.id
                 WHERE i.work_id IN ({work_ids_str})
@@ -312,6 +342,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 SELECT dr.id, dr.work_id, dr.object_id, dr.inspection_id, dr.report_number,
                        dr.status, dr.created_at, dr.created_by, dr.total_defects, dr.critical_defects,
                        dr.report_data, dr.pdf_url, dr.notes,
+                       dr.pending_remediations, dr.completed_remediations, dr.verified_remediations,
                        u.name as author_name
                 FROM {SCHEMA}.defect_reports dr
                 LEFT JOIN {SCHEMA}.users u ON dr.created_by = u.id
@@ -336,6 +367,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     ORDER BY rem.created_at DESC
                 """)
                 defect_remediations = cur.fetchall()
+            
+            # Списки отдают превью; оригиналы клиент загружает только при открытии фото
+            attach_photo_thumbnails(cur, [
+                (inspections, 'photo_urls'),
+                (work_logs, 'photo_urls'),
+                (chat_messages, 'photo_urls'),
+                (defect_remediations, 'remediation_photos'),
+            ])
         
         # Загружаем contractors для пользователя
         if role == 'admin':
@@ -264,7 +264,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             cur.execute(
                 f"""
                 UPDATE {SCHEMA}.works
-                SET title = '{title}', description = '{description}', {contractor_clause}, status = '{status}', updated_at = CURRENT_TIMESTAMP
+                SET title = '{title}', description = '{description}', {contractor_clause}, status = '{status}', version = version + 1, updated_at = CURRENT_TIMESTAMP
                 WHERE id = {work_id}
                 RETURNING id, title, description, object_id, contractor_id, status, created_at, updated_at
                 """
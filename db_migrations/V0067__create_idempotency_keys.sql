@@ -0,0 +1,26 @@
+-- Ключи идемпотентности для POST-запросов (повторные отправки с нестабильной связью)
+CREATE TABLE IF NOT EXISTS t_p8942561_contractor_control_s.idempotency_keys (
+    id SERIAL PRIMARY KEY,
+    scope VARCHAR(100) NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    user_id INTEGER NOT NULL,
+    request_hash VARCHAR(64) NOT NULL,
+    status_code INTEGER,
+    response_body TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Ключ уникален в пределах функции и пользователя: одинаковые ключи разных пользователей не пересекаются
+CREATE UNIQUE INDEX IF NOT EXISTS idx_idempotency_keys_scope_user_key
+ON t_p8942561_contractor_control_s.idempotency_keys(scope, user_id, idempotency_key);
+
+-- Индекс для пакетной очистки просроченных ключей
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires_at
+ON t_p8942561_contractor_control_s.idempotency_keys(expires_at);
+
+COMMENT ON TABLE t_p8942561_contractor_control_s.idempotency_keys IS 'Ключи идемпотентности (заголовок Idempotency-Key) с сохранённым ответом';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.idempotency_keys.scope IS 'Имя функции, принявшей запрос';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.idempotency_keys.user_id IS 'Пользователь, отправивший запрос: ключ действует только в его пределах';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.idempotency_keys.request_hash IS 'SHA-256 тела запроса: повтор с другим телом отклоняется';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.idempotency_keys.response_body IS 'Тело исходного ответа, возвращается при повторе без повторной записи';
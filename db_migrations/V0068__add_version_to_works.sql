@@ -0,0 +1,5 @@
+-- Версия строки работы для оптимистичной блокировки (update-data возвращает 409 при конфликте)
+ALTER TABLE t_p8942561_contractor_control_s.works 
+ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+COMMENT ON COLUMN t_p8942561_contractor_control_s.works.version IS 'Увеличивается при каждом изменении работы; клиент передаёт expected_version для проверки конфликтов';
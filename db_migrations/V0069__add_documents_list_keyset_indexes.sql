@@ -0,0 +1,16 @@
+-- Составные индексы для keyset-пагинации списка документов (ORDER BY created_at DESC, id DESC)
+CREATE INDEX IF NOT EXISTS idx_documents_created_id 
+ON t_p8942561_contractor_control_s.documents(created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_documents_work_created_id 
+ON t_p8942561_contractor_control_s.documents(work_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_documents_status_created_id 
+ON t_p8942561_contractor_control_s.documents(status, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_documents_template_created_id 
+ON t_p8942561_contractor_control_s.documents(template_id, created_at DESC, id DESC);
+
+-- Одиночные индексы покрываются префиксом составных
+DROP INDEX IF EXISTS t_p8942561_contractor_control_s.idx_documents_work;
+DROP INDEX IF EXISTS t_p8942561_contractor_control_s.idx_documents_status;
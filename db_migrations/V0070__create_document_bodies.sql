@@ -0,0 +1,37 @@
+-- Контентно-адресуемое хранилище HTML-тел документов (дедупликация по SHA-256)
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+CREATE TABLE IF NOT EXISTS t_p8942561_contractor_control_s.document_bodies (
+    content_hash CHAR(64) PRIMARY KEY,
+    html TEXT NOT NULL,
+    size_bytes INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE t_p8942561_contractor_control_s.documents
+ADD COLUMN IF NOT EXISTS html_hash CHAR(64) REFERENCES t_p8942561_contractor_control_s.document_bodies(content_hash);
+
+-- Переносим существующие HTML из content->'html' в document_bodies
+INSERT INTO t_p8942561_contractor_control_s.document_bodies (content_hash, html, size_bytes)
+SELECT DISTINCT ON (h.content_hash) h.content_hash, h.html, octet_length(h.html)
+FROM (
+    SELECT encode(digest(convert_to(content->>'html', 'UTF8'), 'sha256'), 'hex') AS content_hash,
+           content->>'html' AS html
+    FROM t_p8942561_contractor_control_s.documents
+    WHERE content ? 'html' AND COALESCE(content->>'html', '') <> ''
+) h
+ON CONFLICT (content_hash) DO NOTHING;
+
+UPDATE t_p8942561_contractor_control_s.documents
+SET html_hash = CASE
+        WHEN COALESCE(content->>'html', '') <> ''
+        THEN encode(digest(convert_to(content->>'html', 'UTF8'), 'sha256'), 'hex')
+    END,
+    content = content - 'html'
+WHERE content ? 'html';
+
+CREATE INDEX IF NOT EXISTS idx_documents_html_hash
+ON t_p8942561_contractor_control_s.documents(html_hash);
+
+COMMENT ON TABLE t_p8942561_contractor_control_s.document_bodies IS 'HTML-тела документов, адресуемые по SHA-256; одинаковые тела хранятся один раз';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.documents.html_hash IS 'Ссылка на HTML-тело в document_bodies; content хранит только contentData';
@@ -0,0 +1,12 @@
+-- История ревизий документов: периодические полные снимки и дельты между ними
+ALTER TABLE t_p8942561_contractor_control_s.document_versions
+ADD COLUMN IF NOT EXISTS is_snapshot BOOLEAN NOT NULL DEFAULT TRUE;
+
+-- Номер версии уникален в пределах документа; индекс покрывает выборку цепочки снимок + дельты
+CREATE UNIQUE INDEX IF NOT EXISTS idx_doc_versions_document_version
+ON t_p8942561_contractor_control_s.document_versions(document_id, version);
+
+DROP INDEX IF EXISTS t_p8942561_contractor_control_s.idx_doc_versions_document;
+
+COMMENT ON COLUMN t_p8942561_contractor_control_s.document_versions.is_snapshot IS 'TRUE - content содержит полное состояние документа, FALSE - дельту к предыдущей версии';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.document_versions.content IS 'Снимок {title, status, contentData, html_hash} или дельта {title, status, contentData: {set, unset}, html_hash}; тело HTML - в document_bodies по html_hash';
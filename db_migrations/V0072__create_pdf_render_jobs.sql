@@ -0,0 +1,36 @@
+-- Очередь фонового рендеринга PDF для документов и актов о дефектах
+CREATE TABLE IF NOT EXISTS t_p8942561_contractor_control_s.pdf_render_jobs (
+    id SERIAL PRIMARY KEY,
+    entity_type VARCHAR(30) NOT NULL CHECK (entity_type IN ('document', 'defect_report')),
+    entity_id INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    content_hash CHAR(64),
+    pdf_url TEXT,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Не более одной незавершённой задачи на сущность: повторная постановка в очередь ничего не делает
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pdf_render_jobs_active
+ON t_p8942561_contractor_control_s.pdf_render_jobs(entity_type, entity_id)
+WHERE status IN ('pending', 'processing');
+
+CREATE INDEX IF NOT EXISTS idx_pdf_render_jobs_status_created
+ON t_p8942561_contractor_control_s.pdf_render_jobs(status, created_at);
+
+-- Кеш готовых PDF по хешу итогового HTML: неизменённый контент повторно не рендерится
+CREATE TABLE IF NOT EXISTS t_p8942561_contractor_control_s.pdf_renders (
+    content_hash CHAR(64) PRIMARY KEY,
+    pdf_url TEXT NOT NULL,
+    size_bytes INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE t_p8942561_contractor_control_s.documents
+ADD COLUMN IF NOT EXISTS pdf_url TEXT;
+
+COMMENT ON TABLE t_p8942561_contractor_control_s.pdf_render_jobs IS 'Задачи рендеринга PDF, обрабатываются функцией pdf-render вне пути запроса';
+COMMENT ON TABLE t_p8942561_contractor_control_s.pdf_renders IS 'Отрендеренные PDF, адресуемые по SHA-256 итогового HTML';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.documents.pdf_url IS 'Печатная форма документа (PDF), заполняется после подписания';
@@ -0,0 +1,19 @@
+-- Задачи пакетной генерации документов по шаблону (прогресс для больших пакетов)
+CREATE TABLE IF NOT EXISTS t_p8942561_contractor_control_s.document_bulk_jobs (
+    id SERIAL PRIMARY KEY,
+    client_job_id VARCHAR(100),
+    template_id INTEGER NOT NULL REFERENCES t_p8942561_contractor_control_s.document_templates(id),
+    total INTEGER NOT NULL,
+    processed INTEGER NOT NULL DEFAULT 0,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    error TEXT,
+    created_by INTEGER NOT NULL REFERENCES t_p8942561_contractor_control_s.users(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_document_bulk_jobs_client_job
+ON t_p8942561_contractor_control_s.document_bulk_jobs(client_job_id);
+
+COMMENT ON TABLE t_p8942561_contractor_control_s.document_bulk_jobs IS 'Пакетная генерация документов: документы фиксируются одной транзакцией, processed обновляется после каждой порции';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.document_bulk_jobs.client_job_id IS 'Идентификатор, заданный клиентом, для опроса прогресса до получения ответа';
@@ -0,0 +1,50 @@
+-- Полнотекстовый (русская морфология) и нечёткий (pg_trgm) поиск для функции search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE t_p8942561_contractor_control_s.objects
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(address, '')), 'B')
+) STORED;
+
+ALTER TABLE t_p8942561_contractor_control_s.works
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+) STORED;
+
+-- В content документа индексируются только строковые значения contentData
+ALTER TABLE t_p8942561_contractor_control_s.documents
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+    setweight(jsonb_to_tsvector('russian', content, '["string"]'), 'B')
+) STORED;
+
+ALTER TABLE t_p8942561_contractor_control_s.chat_messages
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    to_tsvector('russian', coalesce(message, ''))
+) STORED;
+
+-- defects хранится как JSON-текст, поэтому индексируется целиком (описания, места, критичность)
+ALTER TABLE t_p8942561_contractor_control_s.inspections
+ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+    to_tsvector('russian', coalesce(defects, ''))
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_objects_search ON t_p8942561_contractor_control_s.objects USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_works_search ON t_p8942561_contractor_control_s.works USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_documents_search ON t_p8942561_contractor_control_s.documents USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_search ON t_p8942561_contractor_control_s.chat_messages USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_inspections_search ON t_p8942561_contractor_control_s.inspections USING GIN (search_vector);
+
+-- Триграммы для опечаток и частичных совпадений в коротких полях
+CREATE INDEX IF NOT EXISTS idx_objects_title_trgm ON t_p8942561_contractor_control_s.objects USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_objects_address_trgm ON t_p8942561_contractor_control_s.objects USING GIN (address gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_works_title_trgm ON t_p8942561_contractor_control_s.works USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_documents_title_trgm ON t_p8942561_contractor_control_s.documents USING GIN (title gin_trgm_ops);
+
+COMMENT ON COLUMN t_p8942561_contractor_control_s.objects.search_vector IS 'Поисковый вектор: название (A), адрес (B)';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.works.search_vector IS 'Поисковый вектор: название (A), описание (B)';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.documents.search_vector IS 'Поисковый вектор: название (A), строковые поля contentData (B)';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.chat_messages.search_vector IS 'Поисковый вектор текста сообщения';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.inspections.search_vector IS 'Поисковый вектор по JSON дефектов проверки';
@@ -0,0 +1,25 @@
+-- Счётчики подписей на документе вместо COUNT(*) по document_signatures после каждой подписи
+ALTER TABLE t_p8942561_contractor_control_s.documents
+ADD COLUMN IF NOT EXISTS pending_signatures INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS signed_signatures INTEGER NOT NULL DEFAULT 0;
+
+UPDATE t_p8942561_contractor_control_s.documents d
+SET pending_signatures = c.pending,
+    signed_signatures = c.signed
+FROM (
+    SELECT document_id,
+           COUNT(*) FILTER (WHERE status = 'pending') AS pending,
+           COUNT(*) FILTER (WHERE status = 'signed') AS signed
+    FROM t_p8942561_contractor_control_s.document_signatures
+    GROUP BY document_id
+) c
+WHERE d.id = c.document_id;
+
+-- Входящие подписи подписанта: фильтр по статусу и keyset-пагинация по (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_doc_signatures_signer_status_created
+ON t_p8942561_contractor_control_s.document_signatures(signer_id, status, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS t_p8942561_contractor_control_s.idx_doc_signatures_signer;
+
+COMMENT ON COLUMN t_p8942561_contractor_control_s.documents.pending_signatures IS 'Количество подписей в статусе pending, меняется вместе с подписями';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.documents.signed_signatures IS 'Количество полученных подписей';
@@ -0,0 +1,24 @@
+-- Счётчик использований шаблона вместо COUNT(*) по documents для каждой строки списка
+ALTER TABLE t_p8942561_contractor_control_s.document_templates
+ADD COLUMN IF NOT EXISTS usage_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE t_p8942561_contractor_control_s.document_templates t
+SET usage_count = c.cnt
+FROM (
+    SELECT template_id, COUNT(*) AS cnt
+    FROM t_p8942561_contractor_control_s.documents
+    WHERE template_id IS NOT NULL
+    GROUP BY template_id
+) c
+WHERE t.id = c.template_id;
+
+-- Список шаблонов пользователя: (client_id = X OR is_system) AND is_active, сортировка по created_at
+CREATE INDEX IF NOT EXISTS idx_document_templates_client_active
+ON t_p8942561_contractor_control_s.document_templates(client_id, created_at DESC)
+WHERE is_active = true;
+
+CREATE INDEX IF NOT EXISTS idx_document_templates_system_active
+ON t_p8942561_contractor_control_s.document_templates(created_at DESC)
+WHERE is_system = true AND is_active = true;
+
+COMMENT ON COLUMN t_p8942561_contractor_control_s.document_templates.usage_count IS 'Количество документов по шаблону, поддерживается функцией documents при создании и удалении';
@@ -0,0 +1,21 @@
+-- Copy-on-write для системных шаблонов: пользователи ссылаются на эталон, копия создаётся при первом изменении
+CREATE INDEX IF NOT EXISTS idx_document_templates_client_source
+ON t_p8942561_contractor_control_s.document_templates(client_id, source_template_id)
+WHERE source_template_id IS NOT NULL;
+
+-- Удаляем копии эталонов (из V0050 и init-templates), которые не менялись и ни на что не ссылаются:
+-- после этого пользователю отдаётся сам эталон
+DELETE FROM t_p8942561_contractor_control_s.document_templates c
+USING t_p8942561_contractor_control_s.document_templates m
+WHERE c.source_template_id = m.id
+  AND c.is_system = false
+  AND c.is_active = true
+  AND c.version = 1
+  AND c.name = m.name
+  AND c.description IS NOT DISTINCT FROM m.description
+  AND c.content = m.content
+  AND NOT EXISTS (SELECT 1 FROM t_p8942561_contractor_control_s.documents d WHERE d.template_id = c.id)
+  AND NOT EXISTS (SELECT 1 FROM t_p8942561_contractor_control_s.document_bulk_jobs j WHERE j.template_id = c.id)
+  AND NOT EXISTS (SELECT 1 FROM t_p8942561_contractor_control_s.document_templates t WHERE t.source_template_id = c.id);
+
+COMMENT ON COLUMN t_p8942561_contractor_control_s.document_templates.source_template_id IS 'Эталон, из которого создана личная копия (copy-on-write при первом изменении)';
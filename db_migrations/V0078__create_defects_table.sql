@@ -0,0 +1,101 @@
+-- Замечания проверок: отдельная строка на замечание вместо JSON-массива inspections.defects
+CREATE TABLE IF NOT EXISTS t_p8942561_contractor_control_s.defects (
+    id SERIAL PRIMARY KEY,
+    inspection_id INTEGER NOT NULL REFERENCES t_p8942561_contractor_control_s.inspections(id),
+    defect_id VARCHAR(100) NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    description TEXT,
+    location VARCHAR(500),
+    severity VARCHAR(50),
+    status VARCHAR(50) NOT NULL DEFAULT 'open',
+    responsible VARCHAR(255),
+    deadline VARCHAR(50),
+    photo_urls JSONB,
+    extra JSONB NOT NULL DEFAULT '{}'::jsonb,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    search_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('russian', coalesce(description, '') || ' ' || coalesce(location, ''))
+    ) STORED
+);
+
+-- defect_id - клиентский идентификатор замечания, на него ссылается defect_remediations.defect_id.
+-- Уникальный индекс начинается с inspection_id и заодно обслуживает выборку замечаний проверки.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_defects_inspection_defect
+ON t_p8942561_contractor_control_s.defects(inspection_id, defect_id);
+
+CREATE INDEX IF NOT EXISTS idx_defects_severity ON t_p8942561_contractor_control_s.defects(severity);
+CREATE INDEX IF NOT EXISTS idx_defects_status ON t_p8942561_contractor_control_s.defects(status);
+CREATE INDEX IF NOT EXISTS idx_defects_search ON t_p8942561_contractor_control_s.defects USING GIN (search_vector);
+
+-- Перенос существующих замечаний. defects хранился как TEXT, поэтому битый JSON пропускается по одной проверке.
+-- Поля, для которых нет колонок, сохраняются в extra и возвращаются клиенту как раньше.
+DO $$
+DECLARE
+    insp RECORD;
+BEGIN
+    FOR insp IN
+        SELECT id, defects FROM t_p8942561_contractor_control_s.inspections
+        WHERE defects IS NOT NULL AND defects <> '' AND defects <> '[]'
+    LOOP
+        BEGIN
+            INSERT INTO t_p8942561_contractor_control_s.defects
+                (inspection_id, defect_id, position, description, location, severity, status,
+                 responsible, deadline, photo_urls, extra)
+            SELECT insp.id,
+                   COALESCE(NULLIF(e->>'id', ''), 'legacy-' || n),
+                   n,
+                   e->>'description',
+                   e->>'location',
+                   e->>'severity',
+                   COALESCE(NULLIF(e->>'status', ''), 'open'),
+                   e->>'responsible',
+                   e->>'deadline',
+                   COALESCE(e->'photo_urls', e->'photos'),
+                   e - ARRAY['id', 'description', 'location', 'severity', 'status',
+                             'responsible', 'deadline', 'photo_urls', 'photos']
+            FROM jsonb_array_elements(insp.defects::jsonb) WITH ORDINALITY AS t(e, n)
+            WHERE jsonb_typeof(e) = 'object'
+            ON CONFLICT (inspection_id, defect_id) DO NOTHING;
+        EXCEPTION WHEN others THEN
+            RAISE NOTICE 'inspection %: defects not migrated (%)', insp.id, SQLERRM;
+        END;
+    END LOOP;
+END $$;
+
+-- Акты до этой миграции записывали в defect_remediations.defect_id строку id замечания, а у замечаний
+-- без id - '' (или 'None'); здесь такие замечания получили 'legacy-n'. Ремедиации акта создавались
+-- по порядку report_data.defects, поэтому сопоставляем их по позиции и сверяем описание замечания.
+WITH snapshot AS (
+    SELECT r.id AS report_id, r.inspection_id, s.n, s.e
+    FROM t_p8942561_contractor_control_s.defect_reports r
+    CROSS JOIN LATERAL jsonb_array_elements(
+        CASE WHEN jsonb_typeof(r.report_data->'defects') = 'array' THEN r.report_data->'defects' ELSE '[]'::jsonb END
+    ) WITH ORDINALITY AS s(e, n)
+),
+numbered AS (
+    SELECT id, defect_report_id, defect_id,
+           ROW_NUMBER() OVER (PARTITION BY defect_report_id ORDER BY id) AS n,
+           COUNT(*) OVER (PARTITION BY defect_report_id) AS total
+    FROM t_p8942561_contractor_control_s.defect_remediations
+)
+UPDATE t_p8942561_contractor_control_s.defect_remediations dr
+SET defect_id = d.defect_id
+FROM numbered nb
+JOIN snapshot s ON s.report_id = nb.defect_report_id AND s.n = nb.n
+JOIN t_p8942561_contractor_control_s.defects d
+  ON d.inspection_id = s.inspection_id AND d.defect_id = 'legacy-' || s.n
+WHERE dr.id = nb.id
+  AND nb.defect_id IN ('', 'None')
+  AND nb.total = (SELECT COUNT(*) FROM snapshot x WHERE x.report_id = nb.defect_report_id)
+  AND d.description IS NOT DISTINCT FROM s.e->>'description';
+
+-- Поиск по замечаниям теперь идёт по defects.search_vector
+DROP INDEX IF EXISTS t_p8942561_contractor_control_s.idx_inspections_search;
+ALTER TABLE t_p8942561_contractor_control_s.inspections DROP COLUMN IF EXISTS search_vector;
+ALTER TABLE t_p8942561_contractor_control_s.inspections DROP COLUMN IF EXISTS defects;
+
+COMMENT ON TABLE t_p8942561_contractor_control_s.defects IS 'Замечания проверок (ранее JSON-массив inspections.defects)';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.defects.defect_id IS 'Идентификатор замечания из клиента, уникален в пределах проверки';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.defects.position IS 'Порядок замечания в проверке';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.defects.extra IS 'Прочие поля замечания из клиента без отдельных колонок';
@@ -0,0 +1,78 @@
+-- Аналитика по дефектам: агрегаты обновляются REFRESH MATERIALIZED VIEW CONCURRENTLY из функции defect-analytics,
+-- поэтому отчёты не читают акты и JSON через user-data
+
+-- Найденные дефекты по неделям и месяцам в разрезе работы и критичности.
+-- Объект, подрядчик и заказчик однозначно определяются работой и хранятся рядом для фильтров.
+CREATE MATERIALIZED VIEW IF NOT EXISTS t_p8942561_contractor_control_s.defect_analytics_rollup AS
+SELECT p.period,
+       date_trunc(p.period, i.created_at)::date AS period_start,
+       w.id AS work_id,
+       w.object_id,
+       COALESCE(w.contractor_id, 0) AS contractor_id,
+       COALESCE(o.client_id, 0) AS client_id,
+       COALESCE(df.severity, '') AS severity,
+       COUNT(*) AS defects_found
+FROM t_p8942561_contractor_control_s.defects df
+JOIN t_p8942561_contractor_control_s.inspections i ON df.inspection_id = i.id
+JOIN t_p8942561_contractor_control_s.works w ON i.work_id = w.id
+JOIN t_p8942561_contractor_control_s.objects o ON w.object_id = o.id
+CROSS JOIN (VALUES ('week'), ('month')) AS p(period)
+GROUP BY p.period, date_trunc(p.period, i.created_at)::date, w.id, w.object_id,
+         COALESCE(w.contractor_id, 0), COALESCE(o.client_id, 0), COALESCE(df.severity, '');
+
+-- Уникальный индекс только по колонкам обязателен для REFRESH ... CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_defect_analytics_rollup_key
+ON t_p8942561_contractor_control_s.defect_analytics_rollup(period, period_start, work_id, severity);
+
+CREATE INDEX IF NOT EXISTS idx_defect_analytics_rollup_client
+ON t_p8942561_contractor_control_s.defect_analytics_rollup(period, client_id, period_start);
+
+CREATE INDEX IF NOT EXISTS idx_defect_analytics_rollup_contractor
+ON t_p8942561_contractor_control_s.defect_analytics_rollup(period, contractor_id, period_start);
+
+-- Устранения: одна узкая строка на устранение с готовыми длительностями в часах.
+-- Перцентили не складываются между группами, поэтому они считаются по этим строкам при запросе.
+CREATE MATERIALIZED VIEW IF NOT EXISTS t_p8942561_contractor_control_s.defect_remediation_facts AS
+SELECT r.id AS remediation_id,
+       r.created_at,
+       r.status,
+       w.id AS work_id,
+       w.object_id,
+       COALESCE(w.contractor_id, 0) AS contractor_id,
+       COALESCE(o.client_id, 0) AS client_id,
+       COALESCE(df.severity, '') AS severity,
+       EXTRACT(EPOCH FROM (r.completed_at - r.created_at)) / 3600.0 AS hours_to_complete,
+       EXTRACT(EPOCH FROM (r.verified_at - r.created_at)) / 3600.0 AS hours_to_verify
+FROM t_p8942561_contractor_control_s.defect_remediations r
+JOIN t_p8942561_contractor_control_s.defect_reports dr ON r.defect_report_id = dr.id
+JOIN t_p8942561_contractor_control_s.works w ON dr.work_id = w.id
+JOIN t_p8942561_contractor_control_s.objects o ON w.object_id = o.id
+LEFT JOIN t_p8942561_contractor_control_s.defects df
+    ON df.inspection_id = dr.inspection_id AND df.defect_id = r.defect_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_defect_remediation_facts_id
+ON t_p8942561_contractor_control_s.defect_remediation_facts(remediation_id);
+
+CREATE INDEX IF NOT EXISTS idx_defect_remediation_facts_client
+ON t_p8942561_contractor_control_s.defect_remediation_facts(client_id, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_defect_remediation_facts_contractor
+ON t_p8942561_contractor_control_s.defect_remediation_facts(contractor_id, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_defect_remediation_facts_created
+ON t_p8942561_contractor_control_s.defect_remediation_facts(created_at);
+
+-- Время последнего обновления представлений, отдаётся вместе с отчётом
+CREATE TABLE IF NOT EXISTS t_p8942561_contractor_control_s.analytics_refreshes (
+    view_name VARCHAR(100) PRIMARY KEY,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duration_ms INTEGER
+);
+
+INSERT INTO t_p8942561_contractor_control_s.analytics_refreshes (view_name)
+VALUES ('defect_analytics_rollup'), ('defect_remediation_facts')
+ON CONFLICT (view_name) DO NOTHING;
+
+COMMENT ON MATERIALIZED VIEW t_p8942561_contractor_control_s.defect_analytics_rollup IS 'Количество найденных дефектов по периоду (week/month), работе и критичности';
+COMMENT ON MATERIALIZED VIEW t_p8942561_contractor_control_s.defect_remediation_facts IS 'Устранения дефектов с длительностями до выполнения и до приёмки в часах';
+COMMENT ON TABLE t_p8942561_contractor_control_s.analytics_refreshes IS 'Время последнего REFRESH аналитических представлений';
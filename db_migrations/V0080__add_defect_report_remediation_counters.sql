@@ -0,0 +1,37 @@
+-- Счётчики устранений на акте: поддерживаются функцией defect-remediation при каждой смене статуса,
+-- поэтому фильтр по статусу акта и бейджи не требуют загрузки устранений
+ALTER TABLE t_p8942561_contractor_control_s.defect_reports
+ADD COLUMN IF NOT EXISTS pending_remediations INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS completed_remediations INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS verified_remediations INTEGER NOT NULL DEFAULT 0;
+
+UPDATE t_p8942561_contractor_control_s.defect_reports rep
+SET pending_remediations = agg.pending,
+    completed_remediations = agg.completed,
+    verified_remediations = agg.verified
+FROM (
+    SELECT defect_report_id,
+           COUNT(*) FILTER (WHERE status IS NULL OR status NOT IN ('completed', 'verified')) AS pending,
+           COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+           COUNT(*) FILTER (WHERE status = 'verified') AS verified
+    FROM t_p8942561_contractor_control_s.defect_remediations
+    GROUP BY defect_report_id
+) agg
+WHERE rep.id = agg.defect_report_id;
+
+-- Статус акта выводится из счётчиков: active - есть открытые устранения,
+-- remediated - всё устранено и ждёт приёмки, closed - всё принято
+UPDATE t_p8942561_contractor_control_s.defect_reports
+SET status = CASE
+    WHEN pending_remediations > 0 THEN 'active'
+    WHEN completed_remediations > 0 THEN 'remediated'
+    ELSE 'closed'
+END
+WHERE pending_remediations + completed_remediations + verified_remediations > 0;
+
+CREATE INDEX IF NOT EXISTS idx_defect_reports_work_status
+ON t_p8942561_contractor_control_s.defect_reports(work_id, status, created_at DESC);
+
+COMMENT ON COLUMN t_p8942561_contractor_control_s.defect_reports.pending_remediations IS 'Устранения в работе (pending, rejected и прочие незавершённые)';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.defect_reports.completed_remediations IS 'Устранения, выполненные подрядчиком и ожидающие приёмки';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.defect_reports.verified_remediations IS 'Устранения, принятые заказчиком';
@@ -0,0 +1,10 @@
+-- Входящие устранения подрядчика: фильтр по статусу и keyset-пагинация по (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_defect_remediations_contractor_status_created
+ON t_p8942561_contractor_control_s.defect_remediations(contractor_id, status, created_at DESC, id DESC);
+
+-- Без фильтра по статусу страница читается по этому индексу без сортировки
+CREATE INDEX IF NOT EXISTS idx_defect_remediations_contractor_created
+ON t_p8942561_contractor_control_s.defect_remediations(contractor_id, created_at DESC, id DESC);
+
+-- Покрыт обоими индексами выше
+DROP INDEX IF EXISTS t_p8942561_contractor_control_s.idx_defect_remediations_contractor;
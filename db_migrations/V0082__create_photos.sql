@@ -0,0 +1,21 @@
+-- Загруженные фотографии: один файл на уникальный SHA-256 и готовые превью нескольких размеров
+CREATE TABLE IF NOT EXISTS t_p8942561_contractor_control_s.photos (
+    id SERIAL PRIMARY KEY,
+    content_hash CHAR(64) NOT NULL UNIQUE,
+    original_url TEXT NOT NULL,
+    thumbnails JSONB NOT NULL DEFAULT '{}'::jsonb,
+    content_type VARCHAR(50) NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    uploaded_by INTEGER REFERENCES t_p8942561_contractor_control_s.users(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Списки подбирают превью по URL оригинала из photo_urls / remediation_photos
+CREATE UNIQUE INDEX IF NOT EXISTS idx_photos_original_url
+ON t_p8942561_contractor_control_s.photos(original_url);
+
+COMMENT ON TABLE t_p8942561_contractor_control_s.photos IS 'Фотографии, принятые функцией photo-upload (дедупликация по хешу)';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.photos.content_hash IS 'SHA-256 оригинала: повторная загрузка того же файла возвращает существующую запись';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.photos.thumbnails IS 'URL превью по размерам: {"sm": ..., "md": ..., "lg": ...}';
@@ -0,0 +1,71 @@
+-- photo_urls хранились текстом в трёх форматах: JSON-массив, URL через запятую и одиночный URL.
+-- Переводим в JSONB-массив строк, чтобы чтение не разбирало строку в каждой строке выборки.
+CREATE OR REPLACE FUNCTION t_p8942561_contractor_control_s.normalize_photo_urls(value TEXT)
+RETURNS JSONB AS $$
+DECLARE
+    parsed JSONB;
+BEGIN
+    IF value IS NULL OR btrim(value) = '' THEN
+        RETURN '[]'::jsonb;
+    END IF;
+    IF left(btrim(value), 1) = '[' THEN
+        BEGIN
+            parsed := value::jsonb;
+            IF jsonb_typeof(parsed) = 'array' THEN
+                RETURN COALESCE((
+                    SELECT jsonb_agg(btrim(e) ORDER BY n)
+                    FROM jsonb_array_elements_text(parsed) WITH ORDINALITY AS t(e, n)
+                    WHERE btrim(e) <> ''
+                ), '[]'::jsonb);
+            END IF;
+        EXCEPTION WHEN others THEN
+            NULL;
+        END;
+    END IF;
+    RETURN COALESCE((
+        SELECT jsonb_agg(btrim(part) ORDER BY n)
+        FROM unnest(string_to_array(value, ',')) WITH ORDINALITY AS t(part, n)
+        WHERE btrim(part) <> ''
+    ), '[]'::jsonb);
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE t_p8942561_contractor_control_s.work_logs
+ALTER COLUMN photo_urls TYPE JSONB USING t_p8942561_contractor_control_s.normalize_photo_urls(photo_urls),
+ALTER COLUMN photo_urls SET DEFAULT '[]'::jsonb,
+ALTER COLUMN photo_urls SET NOT NULL;
+
+ALTER TABLE t_p8942561_contractor_control_s.chat_messages
+ALTER COLUMN photo_urls TYPE JSONB USING t_p8942561_contractor_control_s.normalize_photo_urls(photo_urls),
+ALTER COLUMN photo_urls SET DEFAULT '[]'::jsonb,
+ALTER COLUMN photo_urls SET NOT NULL;
+
+ALTER TABLE t_p8942561_contractor_control_s.inspections
+ALTER COLUMN photo_urls TYPE JSONB USING t_p8942561_contractor_control_s.normalize_photo_urls(photo_urls),
+ALTER COLUMN photo_urls SET DEFAULT '[]'::jsonb,
+ALTER COLUMN photo_urls SET NOT NULL;
+
+ALTER TABLE t_p8942561_contractor_control_s.remarks
+ALTER COLUMN photo_urls TYPE JSONB USING t_p8942561_contractor_control_s.normalize_photo_urls(photo_urls),
+ALTER COLUMN photo_urls SET DEFAULT '[]'::jsonb,
+ALTER COLUMN photo_urls SET NOT NULL;
+
+-- remediation_photos уже JSONB, но мог содержать NULL или строку вместо массива
+UPDATE t_p8942561_contractor_control_s.defect_remediations
+SET remediation_photos = CASE
+    WHEN jsonb_typeof(remediation_photos) = 'string'
+        THEN t_p8942561_contractor_control_s.normalize_photo_urls(remediation_photos #>> '{}')
+    ELSE '[]'::jsonb
+END
+WHERE remediation_photos IS NULL OR jsonb_typeof(remediation_photos) <> 'array';
+
+ALTER TABLE t_p8942561_contractor_control_s.defect_remediations
+ALTER COLUMN remediation_photos SET DEFAULT '[]'::jsonb,
+ALTER COLUMN remediation_photos SET NOT NULL;
+
+DROP FUNCTION t_p8942561_contractor_control_s.normalize_photo_urls(TEXT);
+
+COMMENT ON COLUMN t_p8942561_contractor_control_s.work_logs.photo_urls IS 'JSON-массив URL фотографий';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.chat_messages.photo_urls IS 'JSON-массив URL фотографий';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.inspections.photo_urls IS 'JSON-массив URL фотографий';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.remarks.photo_urls IS 'JSON-массив URL фотографий';
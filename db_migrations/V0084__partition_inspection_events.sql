@@ -0,0 +1,60 @@
+-- inspection_events - журнал только на добавление. Секционируем по месяцам: запись и чтение последних
+-- событий касаются одной-двух секций, а старые месяцы удаляются целиком (DROP секции) по сроку хранения.
+ALTER TABLE t_p8942561_contractor_control_s.inspection_events RENAME TO inspection_events_legacy;
+ALTER SEQUENCE t_p8942561_contractor_control_s.inspection_events_id_seq OWNED BY NONE;
+
+CREATE TABLE t_p8942561_contractor_control_s.inspection_events (
+    id INTEGER NOT NULL DEFAULT nextval('t_p8942561_contractor_control_s.inspection_events_id_seq'),
+    inspection_id INTEGER NOT NULL REFERENCES t_p8942561_contractor_control_s.inspections(id),
+    event_type VARCHAR(50) NOT NULL CHECK (event_type IN ('scheduled', 'started', 'completed')),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_by INTEGER NOT NULL,
+    metadata JSONB DEFAULT '{}'::jsonb,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE t_p8942561_contractor_control_s.inspection_events_id_seq
+OWNED BY t_p8942561_contractor_control_s.inspection_events.id;
+
+-- Секции inspection_events_yYYYYmMM: от первого месяца с событиями до года вперёд.
+-- Дальнейшие месяцы создаёт функция inspection-event (POST ?action=maintain по таймеру).
+DO $$
+DECLARE
+    month_start DATE;
+    last_month DATE := (date_trunc('month', CURRENT_DATE) + INTERVAL '12 months')::date;
+BEGIN
+    SELECT COALESCE(date_trunc('month', MIN(created_at))::date, date_trunc('month', CURRENT_DATE)::date)
+    INTO month_start
+    FROM t_p8942561_contractor_control_s.inspection_events_legacy;
+
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS t_p8942561_contractor_control_s.%I PARTITION OF t_p8942561_contractor_control_s.inspection_events FOR VALUES FROM (%L) TO (%L)',
+            'inspection_events_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+            month_start,
+            (month_start + INTERVAL '1 month')::date
+        );
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+END $$;
+
+-- События пишутся в порядке времени, поэтому BRIN по created_at почти ничего не весит
+CREATE INDEX IF NOT EXISTS idx_inspection_events_created_brin
+ON t_p8942561_contractor_control_s.inspection_events USING BRIN (created_at);
+
+CREATE INDEX IF NOT EXISTS idx_inspection_events_inspection_created
+ON t_p8942561_contractor_control_s.inspection_events(inspection_id, created_at);
+
+INSERT INTO t_p8942561_contractor_control_s.inspection_events
+    (id, inspection_id, event_type, created_at, created_by, metadata)
+SELECT id, inspection_id, event_type, COALESCE(created_at, CURRENT_TIMESTAMP), created_by, metadata
+FROM t_p8942561_contractor_control_s.inspection_events_legacy;
+
+SELECT setval('t_p8942561_contractor_control_s.inspection_events_id_seq',
+              GREATEST((SELECT COALESCE(MAX(id), 0) FROM t_p8942561_contractor_control_s.inspection_events), 1));
+
+DROP TABLE t_p8942561_contractor_control_s.inspection_events_legacy;
+
+COMMENT ON TABLE t_p8942561_contractor_control_s.inspection_events IS 'События проверок: планирование, старт, завершение (секции по месяцам)';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.inspection_events.event_type IS 'Тип события: scheduled (запланирована), started (начата), completed (завершена)';
+COMMENT ON COLUMN t_p8942561_contractor_control_s.inspection_events.metadata IS 'Доп. данные: кол-во замечаний и т.д.';
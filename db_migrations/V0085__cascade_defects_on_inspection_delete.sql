@@ -0,0 +1,8 @@
+-- Замечания принадлежат проверке: удаление проектов, объектов, работ и пользователей удаляет проверки,
+-- и их замечания должны уходить вместе с ними, а не блокировать удаление внешним ключом
+ALTER TABLE t_p8942561_contractor_control_s.defects
+DROP CONSTRAINT IF EXISTS defects_inspection_id_fkey;
+
+ALTER TABLE t_p8942561_contractor_control_s.defects
+ADD CONSTRAINT defects_inspection_id_fkey
+FOREIGN KEY (inspection_id) REFERENCES t_p8942561_contractor_control_s.inspections(id) ON DELETE CASCADE;
@@ -175,7 +175,7 @@ export default function WorkJournal({ objectId, selectedWorkId }: WorkJournalPro
         volume: log.volume,
         unit: log.unit,
         materials: log.materials ? log.materials.split(',').map(m => m.trim()) : [],
-        photos: log.photo_urls ? log.photo_urls.split(',').filter(url => url.trim()) : [],
+        photos: log.photo_urls || [],
         progress: log.progress,
         completion_percentage: log.completion_percentage,
         workLogNumber: workLogNumber,
@@ -240,7 +240,7 @@ export default function WorkJournal({ objectId, selectedWorkId }: WorkJournalPro
           scheduled_date: inspection.scheduled_date,
           defects: defectsArray,
           defects_count: event.metadata?.defects_count || defectsArray.length,
-          photos: inspection.photo_urls ? inspection.photo_urls.split(',').filter(url => url.trim()) : [],
+          photos: inspection.photo_urls || [],
         },
       };
     })
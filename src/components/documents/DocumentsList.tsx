@@ -4,6 +4,7 @@ import {
   fetchDocuments,
   selectDocuments,
   selectDocumentsLoading,
+  selectDocumentsNextCursor,
   setCurrentDocument,
 } from '@/store/slices/documentsSlice';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
@@ -32,6 +33,7 @@ export default function DocumentsList({ workId, onSelectDocument }: DocumentsLis
   const dispatch = useAppDispatch();
   const documents = useAppSelector(selectDocuments);
   const loading = useAppSelector(selectDocumentsLoading);
+  const nextCursor = useAppSelector(selectDocumentsNextCursor);
 
   const [searchQuery, setSearchQuery] = useState('');
   const [statusFilter, setStatusFilter] = useState<string>('all');
@@ -41,6 +43,11 @@ export default function DocumentsList({ workId, onSelectDocument }: DocumentsLis
     dispatch(fetchDocuments(params));
   }, [dispatch, workId]);
 
+  const handleLoadMore = () => {
+    if (!nextCursor) return;
+    dispatch(fetchDocuments({ ...(workId ? { work_id: workId } : {}), cursor: nextCursor }));
+  };
+
   const filteredDocuments = documents.filter((doc) => {
     const matchesSearch = doc.title.toLowerCase().includes(searchQuery.toLowerCase()) ||
                          doc.document_number.toLowerCase().includes(searchQuery.toLowerCase());
@@ -189,6 +196,13 @@ export default function DocumentsList({ workId, onSelectDocument }: DocumentsLis
               ))
             )}
           </div>
+
+          {nextCursor && (
+            <Button variant="outline" className="w-full" disabled={loading} onClick={handleLoadMore}>
+              <Icon name={loading ? 'Loader2' : 'ChevronDown'} size={16} className={loading ? 'mr-2 animate-spin' : 'mr-2'} />
+              Показать ещё
+            </Button>
+          )}
         </CardContent>
       </Card>
     </div>
@@ -33,7 +33,7 @@ export default function InfoTab({
 
   const statusInfo = getStatusInfo();
   const reportEntries = workEntries
-    .filter(entry => !entry.is_work_start && (entry.volume || entry.materials || entry.photo_urls))
+    .filter(entry => !entry.is_work_start && (entry.volume || entry.materials || entry.photo_urls?.length))
     .sort((a, b) => new Date(b.created_at).getTime() - new Date(a.created_at).getTime());
 
   return (
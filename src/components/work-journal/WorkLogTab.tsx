@@ -137,9 +137,9 @@ export default function WorkLogTab({ workId, objectId, onCreateInspection, onCre
                   )}
                 </div>
 
-                {event.data.photo_urls && event.data.photo_urls.split(',').filter(url => url.trim()).length > 0 && (
+                {event.data.photo_urls && event.data.photo_urls.length > 0 && (
                   <div className="grid grid-cols-3 gap-1.5 md:gap-2 mt-2.5">
-                    {event.data.photo_urls.split(',').filter(url => url.trim()).slice(0, 3).map((url, idx) => (
+                    {event.data.photo_urls.slice(0, 3).map((url, idx) => (
                       <img
                         key={idx}
                         src={url.trim()}
@@ -226,7 +226,7 @@ export default function WorkLogTab({ workId, objectId, onCreateInspection, onCre
               description: selectedWorkLog.description,
               timestamp: selectedWorkLog.created_at,
               author: selectedWorkLog.author_name,
-              photoUrls: selectedWorkLog.photo_urls ? selectedWorkLog.photo_urls.split(',').filter((url: string) => url.trim()) : [],
+              photoUrls: selectedWorkLog.photo_urls || [],
               volume: selectedWorkLog.volume,
               materials: selectedWorkLog.materials
             }}
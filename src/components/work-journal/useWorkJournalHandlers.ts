@@ -113,7 +113,7 @@ export function useWorkJournalHandlers(selectedWork: number | null) {
         description: descriptionParts.join(', '),
         status: overallStatus,
         defects: JSON.stringify(defects),
-        photo_urls: allPhotos.length > 0 ? allPhotos.join(',') : null,
+        photo_urls: allPhotos,
       })).unwrap();
 
       await dispatch(fetchUserData());
@@ -154,7 +154,7 @@ export function useWorkJournalHandlers(selectedWork: number | null) {
         progress: data.completion_percentage,
         volume: data.work_volume || null,
         materials: data.materials.map(m => `${m.name} ${m.quantity} ${m.unit}`).join(', ') || null,
-        photo_urls: data.photo_urls.join(',') || null,
+        photo_urls: data.photo_urls,
       })).unwrap();
 
       await dispatch(fetchUserData());
@@ -60,7 +60,7 @@ export interface Remark {
   checkpoint_id?: number;
   description: string;
   normative_ref?: string;
-  photo_urls?: string;
+  photo_urls?: string[];
   status: 'open' | 'resolved' | 'rejected';
   created_at: string;
   resolved_at?: string;
@@ -71,7 +71,7 @@ export interface WorkLog {
   work_id: number;
   volume?: string;
   materials?: string;
-  photo_urls?: string;
+  photo_urls?: string[];
   description: string;
   created_by: number;
   created_at: string;
@@ -322,7 +322,7 @@ const Activity = () => {
             description: selectedWorkLog.description,
             timestamp: selectedWorkLog.created_at,
             author: selectedWorkLog.author_name,
-            photoUrls: selectedWorkLog.photo_urls ? selectedWorkLog.photo_urls.split(',').filter((url: string) => url.trim()) : [],
+            photoUrls: selectedWorkLog.photo_urls || [],
             volume: selectedWorkLog.volume,
             materials: selectedWorkLog.materials
           }}
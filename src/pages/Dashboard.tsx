@@ -256,7 +256,7 @@ const Dashboard = () => {
         description: journalForm.description,
         volume: journalForm.volume || null,
         materials: journalForm.materials || null,
-        photo_urls: JSON.stringify(photoUrls)
+        photo_urls: photoUrls
       })).unwrap();
 
       toast({
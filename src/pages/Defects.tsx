@@ -19,6 +19,7 @@ const Defects = () => {
   const inspections = (userData?.inspections && Array.isArray(userData.inspections)) ? userData.inspections : [];
   const works = (userData?.works && Array.isArray(userData.works)) ? userData.works : [];
   const objects = (userData?.objects && Array.isArray(userData.objects)) ? userData.objects : [];
+  const defectReports = (userData?.defect_reports && Array.isArray(userData.defect_reports)) ? userData.defect_reports : [];
 
   const inspectionsWithContext = inspections.map(inspection => {
     const work = works.find(w => w.id === inspection.work_id);
@@ -33,7 +34,9 @@ const Defects = () => {
       defectsCount = 0;
     }
 
-    return { ...inspection, work, object, defectsCount };
+    const report = defectReports.find(r => r.inspection_id === inspection.id);
+
+    return { ...inspection, work, object, defectsCount, report };
   });
 
   const filteredInspections = inspectionsWithContext.filter(i => {
@@ -70,6 +73,24 @@ const Defects = () => {
     }
   };
 
+  const getReportStatusColor = (status: string) => {
+    switch (status) {
+      case 'active': return 'bg-red-100 text-red-700 border-red-200';
+      case 'remediated': return 'bg-amber-100 text-amber-700 border-amber-200';
+      case 'closed': return 'bg-green-100 text-green-700 border-green-200';
+      default: return 'bg-slate-100 text-slate-700 border-slate-200';
+    }
+  };
+
+  const getReportStatusLabel = (status: string) => {
+    switch (status) {
+      case 'active': return 'Акт: устранение';
+      case 'remediated': return 'Акт: на приёмке';
+      case 'closed': return 'Акт: закрыт';
+      default: return status;
+    }
+  };
+
   const formatDate = (dateStr: string) => {
     return new Date(dateStr).toLocaleDateString('ru-RU', { 
       day: 'numeric', month: 'short', year: 'numeric'
@@ -186,6 +207,11 @@ const Defects = () => {
                       <Badge className={getStatusColor(inspection.status)}>
                         {getStatusLabel(inspection.status)}
                       </Badge>
+                      {inspection.report && (
+                        <Badge className={getReportStatusColor(inspection.report.status)}>
+                          {getReportStatusLabel(inspection.report.status)}
+                        </Badge>
+                      )}
                       {inspection.type && (
                         <span className="text-xs text-slate-500 flex items-center gap-1">
                           <Icon name={inspection.type === 'scheduled' ? 'Calendar' : 'Zap'} size={13} />
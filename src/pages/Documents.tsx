@@ -8,7 +8,7 @@ import Icon from '@/components/ui/icon';
 import { format } from 'date-fns';
 import { ru } from 'date-fns/locale';
 import { useAppDispatch, useAppSelector } from '@/store/hooks';
-import { fetchDocuments, selectDocuments, selectDocumentsLoading } from '@/store/slices/documentsSlice';
+import { fetchDocuments, selectDocuments, selectDocumentsLoading, selectDocumentsNextCursor } from '@/store/slices/documentsSlice';
 import { fetchTemplates, selectTemplates, selectTemplatesLoading } from '@/store/slices/documentTemplatesSlice';
 import { Skeleton } from '@/components/ui/skeleton';
 import {
@@ -28,6 +28,7 @@ const Documents = () => {
   const dispatch = useAppDispatch();
   const documents = useAppSelector(selectDocuments);
   const loading = useAppSelector(selectDocumentsLoading);
+  const nextCursor = useAppSelector(selectDocumentsNextCursor);
   const templates = useAppSelector(selectTemplates);
   const templatesLoading = useAppSelector(selectTemplatesLoading);
   
@@ -262,6 +263,19 @@ const Documents = () => {
           </div>
         )}
 
+        {nextCursor && (
+          <div className="flex justify-center mt-6">
+            <Button
+              variant="outline"
+              disabled={loading}
+              onClick={() => dispatch(fetchDocuments({ cursor: nextCursor }))}
+            >
+              <Icon name={loading ? 'Loader2' : 'ChevronDown'} size={18} className={loading ? 'mr-2 animate-spin' : 'mr-2'} />
+              Показать ещё
+            </Button>
+          </div>
+        )}
+
         <CreateDocumentModal
           isOpen={isCreateModalOpen}
           onClose={() => setIsCreateModalOpen(false)}
@@ -22,7 +22,7 @@ const WorkLog = () => {
     type: log.author_role === 'contractor' ? 'work' : 'message',
     materials: log.materials ? log.materials.split(',').map(m => m.trim()) : [],
     volume: log.volume,
-    photos: log.photo_urls ? log.photo_urls.split(',') : [],
+    photos: log.photo_urls || [],
   }));
 
   const formatTime = (timestamp: string) => {
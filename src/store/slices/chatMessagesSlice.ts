@@ -10,7 +10,7 @@ export interface ChatMessage {
   author_role?: 'contractor' | 'client';
   message: string;
   message_type?: string;
-  photo_urls?: string;
+  photo_urls?: string[];
   created_at: string;
 }
 
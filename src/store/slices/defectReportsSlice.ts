@@ -5,9 +5,13 @@ export interface DefectReport {
   report_number: string;
   work_id: number;
   object_id: number;
-  status: 'active' | 'resolved' | 'closed';
+  inspection_id?: number;
+  status: 'active' | 'remediated' | 'closed';
   total_defects?: number;
   critical_defects?: number;
+  pending_remediations?: number;
+  completed_remediations?: number;
+  verified_remediations?: number;
   created_at: string;
   created_by: number;
   report_data?: {
@@ -176,11 +176,13 @@ const documentTemplatesSlice = createSlice({
       })
       .addCase(updateTemplate.fulfilled, (state, action) => {
         state.loading = false;
-        const index = state.items.findIndex(t => t.id === action.payload.id);
+        // При первом изменении эталона сервер создаёт личную копию с новым id
+        const editedId = action.meta.arg.id;
+        const index = state.items.findIndex(t => t.id === editedId);
         if (index !== -1) {
           state.items[index] = action.payload;
         }
-        if (state.currentTemplate?.id === action.payload.id) {
+        if (state.currentTemplate?.id === editedId) {
           state.currentTemplate = action.payload;
         }
       })
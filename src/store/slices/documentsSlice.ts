@@ -14,6 +14,8 @@ export interface Document {
   title: string;
   contentData?: Record<string, any>;
   htmlContent?: string;
+  renderedHtml?: string;
+  version?: number;
   status: 'draft' | 'pending' | 'signed' | 'archived';
   created_by?: number;
   createdAt: string;
@@ -62,6 +64,7 @@ interface DocumentsState {
   items: Document[];
   currentDocument: Document | null;
   pendingSignatures: DocumentSignature[];
+  nextCursor: string | null;
   loading: boolean;
   error: string | null;
 }
@@ -70,29 +73,40 @@ const initialState: DocumentsState = {
   items: [],
   currentDocument: null,
   pendingSignatures: [],
+  nextCursor: null,
   loading: false,
   error: null,
 };
 
 export const fetchDocuments = createAsyncThunk(
   'documents/fetchAll',
-  async (params?: { work_id?: number; status?: string }, { rejectWithValue }) => {
+  async (
+    params?: {
+      work_id?: number;
+      object_id?: number;
+      template_id?: number;
+      status?: string;
+      limit?: number;
+      cursor?: string;
+    },
+    { rejectWithValue }
+  ) => {
     try {
+      // Backend pages by (created_at, id): one request returns one page, the next is loaded by nextCursor
       const response = await apiClient.get(ENDPOINTS.DOCUMENTS.LIST, { 
         params,
         skipAuthRedirect: true 
       });
       console.log('📥 fetchDocuments response:', response);
-      
-      if (response.data.documents) {
-        return response.data.documents;
-      }
-      
+
       if (Array.isArray(response.data)) {
-        return response.data;
+        return { documents: response.data as Document[], nextCursor: null };
       }
-      
-      return [];
+
+      return {
+        documents: (response.data.documents || []) as Document[],
+        nextCursor: (response.data.nextCursor as string | undefined) ?? null,
+      };
     } catch (error: any) {
       console.error('❌ fetchDocuments error:', error);
       return rejectWithValue(error.message || 'Failed to fetch documents');
@@ -202,6 +216,25 @@ export const signDocument = createAsyncThunk(
   }
 );
 
+export const signDocumentsBatch = createAsyncThunk(
+  'documents/signBatch',
+  async (items: Array<{
+    signature_id: number;
+    action: 'sign' | 'reject';
+    signature_data?: string;
+    rejection_reason?: string;
+  }>, { rejectWithValue }) => {
+    try {
+      const response = await apiClient.put(ENDPOINTS.DOCUMENT_SIGNATURES.SIGN, { items }, {
+        skipAuthRedirect: true
+      });
+      return response.data.results;
+    } catch (error: any) {
+      return rejectWithValue(error.message || 'Failed to sign documents');
+    }
+  }
+);
+
 export const fetchPendingSignatures = createAsyncThunk(
   'documents/fetchPendingSignatures',
   async (_, { rejectWithValue }) => {
@@ -249,7 +282,11 @@ const documentsSlice = createSlice({
       })
       .addCase(fetchDocuments.fulfilled, (state, action) => {
         state.loading = false;
-        state.items = action.payload;
+        // A page requested by cursor continues the list loaded so far
+        state.items = action.meta.arg?.cursor
+          ? [...state.items, ...action.payload.documents]
+          : action.payload.documents;
+        state.nextCursor = action.payload.nextCursor;
       })
       .addCase(fetchDocuments.rejected, (state, action) => {
         state.loading = false;
@@ -310,6 +347,7 @@ export const { clearError, setCurrentDocument } = documentsSlice.actions;
 
 export const selectDocuments = (state: RootState) => state.documents.items;
 export const selectCurrentDocument = (state: RootState) => state.documents.currentDocument;
+export const selectDocumentsNextCursor = (state: RootState) => state.documents.nextCursor;
 export const selectDocumentsLoading = (state: RootState) => state.documents.loading;
 export const selectDocumentsError = (state: RootState) => state.documents.error;
 export const selectPendingSignatures = (state: RootState) => state.documents.pendingSignatures;
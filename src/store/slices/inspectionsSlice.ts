@@ -12,7 +12,7 @@ export interface Inspection {
   notes?: string;
   description?: string;
   defects?: string;
-  photo_urls?: string;
+  photo_urls?: string[];
   created_at: string;
   completed_at?: string;
   scheduled_date?: string;
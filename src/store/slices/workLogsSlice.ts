@@ -8,7 +8,7 @@ export interface WorkLog {
   description: string;
   volume?: string;
   materials?: string;
-  photo_urls?: string;
+  photo_urls?: string[];
   created_by: number;
   created_at: string;
   author_name?: string;
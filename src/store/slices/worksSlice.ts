@@ -15,6 +15,7 @@ export interface WorkEntity {
   planned_start_date?: string;
   planned_end_date?: string;
   completion_percentage?: number;
+  version?: number;
   created_at?: string;
   updated_at?: string;
 }
@@ -64,16 +65,25 @@ export const createWork = createAsyncThunk(
  * Обновление существующей работы
  * @param {Object} params - Параметры обновления
  * @param {number} params.id - ID работы
- * @param {Partial<WorkEntity>} params.data - Новые данные работы
+ * @param {Partial<WorkEntity>} params.data - Изменяемые поля (остальные поля не трогаются)
+ * @param {number} [params.expectedVersion] - Версия работы, на основе которой сделаны изменения (409 при конфликте)
  * @returns {Promise<WorkEntity>} Обновленная работа
  * @example
- * dispatch(updateWork({ id: 1, data: { status: 'completed', completion_percentage: 100 } }))
+ * dispatch(updateWork({ id: 1, data: { status: 'completed', completion_percentage: 100 }, expectedVersion: 3 }))
  */
 export const updateWork = createAsyncThunk(
   'works/update',
-  async ({ id, data }: { id: number; data: Partial<WorkEntity> }, { rejectWithValue }) => {
+  async (
+    { id, data, expectedVersion }: { id: number; data: Partial<WorkEntity>; expectedVersion?: number },
+    { rejectWithValue }
+  ) => {
     try {
-      const response = await apiClient.put(ENDPOINTS.ENTITIES.UPDATE, { type: 'work', id, data });
+      const response = await apiClient.put(ENDPOINTS.ENTITIES.UPDATE, {
+        type: 'work',
+        id,
+        data,
+        expected_version: expectedVersion,
+      });
       
       if (!response.success) {
         throw new Error(response.error || 'Failed to update work');